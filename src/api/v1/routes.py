@@ -1,29 +1,52 @@
 import logging
 import uuid
+from datetime import datetime
+from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 
 from core.db_base import DbResult
 from core.utils import read_config
 from db.pg_core_connect import CustomDbError
+from db.pg_errors import QueryTimeoutError
 from db.pg_source import PgDbSource
 from models.config_models import DbConfig
-from models.request_models import CreateShortLinkModel
-from models.response_models import CreatedLinkModel
+from models.request_models import BatchShortLinkModel, CreateShortLinkModel
+from models.response_models import BatchCreatedLinkModel, CreatedLinkModel
 from services.db import DbService
 
 logger: logging.Logger = logging.getLogger(__name__)
 
 router: APIRouter = APIRouter()
 
-db_source = PgDbSource(db_config=DbConfig(**read_config().get('db')))
-db_srv = DbService(db_source=db_source)
+db_config = DbConfig(**read_config().get('db'))
+db_source = PgDbSource(db_config=db_config)
+db_srv = DbService(db_source=db_source, redirect_timeout=db_config.redirect_timeout)
+
+
+@router.on_event('startup')
+async def start_links_cache():
+    try:
+        await db_srv.start_links_cache()
+    except (CustomDbError, OSError, EOFError) as e:
+        logger.warning(f'кэш ссылок отключен, не удалось подписаться на уведомления: {e}')
+
+
+@router.on_event('shutdown')
+async def close_db_source():
+    await db_source.close()
 
 
 def get_random_uuid() -> str:
     return str(uuid.uuid4())[-4:]
 
 
+def short_link_url(request: Request, url_id: str) -> str:
+    """ Полный адрес короткой ссылки - маршрута редиректа с учетом префикса роутера """
+    return str(request.url_for('redirect_by_short_link', url_id=url_id))
+
+
 @router.get('/ping', summary='Опрос доступности БД')
 async def get_health_db():
     """
@@ -53,7 +76,23 @@ async def create_short_link(
     """
 
     await db_srv.create_link(url_id=get_url_id, original_url=link.original_link)
-    return CreatedLinkModel(url_id=get_url_id, link=f'{str(request.url)}{get_url_id}')
+    return CreatedLinkModel(url_id=get_url_id, link=short_link_url(request, get_url_id))
+
+
+@router.post('/shorten',
+             status_code=status.HTTP_201_CREATED,
+             response_model=list[BatchCreatedLinkModel],
+             summary='Пакетное создание коротких ссылок')
+async def create_short_links(links: list[BatchShortLinkModel], request: Request):
+    """
+    Создание коротких ссылок для списка оригинальных одним запросом к БД
+    """
+
+    url_ids = [get_random_uuid() for _ in links]
+    await db_srv.create_links(list(zip(url_ids, (link.original_url for link in links))))
+
+    return [BatchCreatedLinkModel(url_id=url_id, short_url=short_link_url(request, url_id))
+            for url_id in url_ids]
 
 
 @router.get('/{url_id}',
@@ -67,7 +106,12 @@ async def redirect_by_short_link(    # noqa CCR001
     В противном случае будет ошибка 404
     """
 
-    result: DbResult = await db_srv.get_original_by_short(url_id)
+    try:
+        result: DbResult = await db_srv.get_original_by_short(url_id)
+    except QueryTimeoutError as e:
+        logger.warning(f'редирект {url_id}: {e}')
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                            detail='Link lookup timed out')
 
     if result and isinstance(result, list):
         try:
@@ -122,15 +166,34 @@ async def get_status(
     Получение полной или общей статистики по переходам по коротким ссылкам
     """
 
-    result_count: DbResult = await db_srv.get_stats_count_by_id(url_id)
+    add_info: DbResult = None
+    if full_info:
+        result_count, add_info = await db_srv.get_stats_with_count_by_url_id(url_id=url_id,
+                                                                             limit=limit,
+                                                                             offset=skip)
+    else:
+        result_count = await db_srv.get_stats_count_by_id(url_id)
+
     answer = {}
     if result_count and isinstance(result_count, list):
         answer['url_id'] = url_id
         answer['count'] = result_count[0]['count']
 
     if full_info:
-        add_info: DbResult = await db_srv.get_stats_by_url_id(url_id=url_id,
-                                                              limit=limit,
-                                                              offset=skip)
         answer['add_info'] = add_info
     return answer
+
+
+@router.get('/{url_id}/export', summary='Выгрузка статистики переходов по короткой ссылке в CSV')
+async def export_stats(
+    url_id: str,
+    since: Optional[datetime] = Query(    # noqa B008
+        default=None, description='Переходы начиная с этого момента'),
+    until: Optional[datetime] = Query(    # noqa B008
+        default=None, description='Переходы до этого момента')):
+    """
+    Потоковая выгрузка статистики переходов в формате CSV
+    """
+
+    return StreamingResponse(db_srv.export_stats_by_url_id(url_id, since=since, until=until),
+                             media_type='text/csv')
@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import AsyncContextManager, Callable, Optional
 
 from db.abstract_db_connect import AbstractDbConnect
 
@@ -11,7 +12,16 @@ class AbstractSource(ABC):
         pass
 
     @abstractmethod
-    async def acquire(self) -> AbstractDbConnect:
+    def acquire(self, readonly: bool = False) -> AsyncContextManager[AbstractDbConnect]:
+        pass
+
+    @abstractmethod
+    async def add_listener(self, channel: str, callback: Callable,
+                           on_lost: Optional[Callable] = None) -> None:
+        pass
+
+    @abstractmethod
+    def is_listening(self, channel: str) -> bool:
         pass
 
     @abstractmethod
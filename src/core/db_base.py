@@ -1,10 +1,14 @@
 import logging
-from typing import Any, TypeVar, Union
+from typing import AsyncIterator, Optional, TypeVar, Union
 
 from core.abstract_source import AbstractSource
+from db.abstract_db_connect import AbstractDbConnect
+from db.pg_columnar import ColumnarResult
+from db.pg_record import Record
+from db.query_context import QueryContext
 
 # чета я намутрил с аннотациями, подсвечивается как-то странно в роутерах
-DbResponse = TypeVar('DbResponse', list[dict[str, Any]], int)
+DbResponse = TypeVar('DbResponse', list[Record], int)
 
 DbResult = Union[DbResponse, None]
 
@@ -16,12 +20,67 @@ class DbBase:
         self._db_source = db_source
         self._logger = logging.getLogger(f'{__name__}.{self.__class__.__name__}')
 
-    async def _execute(self, sql: str, *args) -> DbResult:
-        connection_ = await self._db_source.acquire()
-        result = await connection_.run_query(sql, *args)
+    async def _execute(self, sql: str, *args, in_transaction: bool = False,
+                       timeout: Optional[float] = None, readonly: bool = False) -> DbResult:
+        """
+        timeout - при превышении запрос отменяется на сервере, ошибка QueryTimeoutError,
+        readonly - запрос только читает данные и может уйти на реплику
+        """
+        async with self._db_source.acquire(readonly=readonly) as connection_:
+            if in_transaction:
+                result = await self._run_in_transaction(connection_, sql, *args)
+            else:
+                result = await connection_.run_query(sql, *args, timeout=timeout)
+
+        return self._make_result(result)
+
+    async def _execute_columnar(self, sql: str, *args,
+                                readonly: bool = False) -> ColumnarResult:
+        """
+        Результат запроса по колонкам (array.array / numpy) для векторной обработки,
+        readonly - запрос только читает данные и может уйти на реплику
+        """
+        async with self._db_source.acquire(readonly=readonly) as connection_:
+            result = await connection_.run_query(sql, *args, result_format='columnar')
+        return result.columnar
+
+    async def _executemany(self, sql: str, args_seq) -> int:
+        """ Один запрос для множества наборов параметров за один Sync """
+        async with self._db_source.acquire() as connection_:
+            return await connection_.executemany(sql, args_seq)
+
+    async def _execute_pipeline(self, *queries: tuple, readonly: bool = False) -> list[DbResult]:
+        """ queries - кортежи (sql, *args), все запросы уходят на сервер одним пакетом """
+        async with self._db_source.acquire(readonly=readonly) as connection_:
+            async with connection_.pipeline() as pipeline_:
+                futures = [pipeline_.run(sql, *args) for sql, *args in queries]
+
+        return [self._make_result(future.result()) for future in futures]
+
+    async def _iterate(self, sql: str, *args, prefetch: int = 100,
+                       readonly: bool = False) -> AsyncIterator[Record]:
+        """ Построчная выборка большого результата без загрузки его целиком в память """
+        async with self._db_source.acquire(readonly=readonly) as connection_:
+            async with connection_.cursor(sql, *args, prefetch=prefetch) as cursor_:
+                async for row in cursor_:
+                    yield row
+
+    async def _copy_out(self, sql: str, format_: str = 'csv', header: bool = True,
+                        readonly: bool = False) -> AsyncIterator[bytes]:
+        """ Выгрузка результата запроса через COPY TO STDOUT порциями байт """
+        async with self._db_source.acquire(readonly=readonly) as connection_:
+            async with connection_.copy_out_iter(sql, format_, header) as copy_:
+                async for chunk in copy_:
+                    yield chunk
+
+    def _make_result(self, result: QueryContext) -> DbResult:
         if result.rows and result.columns:
-            keys = [col['name'] for col in result.columns]
-            return [dict(zip(keys, row)) for row in result.rows]
+            return result.rows
 
         if result.rows_count and not result.columns:
             return result.rows_count
+
+    async def _run_in_transaction(self, connection_: AbstractDbConnect, sql: str, *args):
+        # BEGIN, запрос и COMMIT уходят на сервер одним пакетом
+        async with connection_.transaction() as transaction_:
+            return await transaction_.run_query(sql, *args, commit=True)
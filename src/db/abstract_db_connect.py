@@ -1,16 +1,29 @@
 from abc import ABC, abstractmethod
+from typing import Callable, Optional, Sequence
 
 from db.query_context import QueryContext
 
 
 class AbstractDbConnect(ABC):
 
+    @property
+    @abstractmethod
+    def closed(self) -> bool:
+        pass
+
+    @property
+    @abstractmethod
+    def idle(self) -> bool:
+        """ Соединение готово к следующему запросу: вне транзакции и ничем не занято """
+        pass
+
     @abstractmethod
     async def connect(self):
         pass
 
     @abstractmethod
-    async def run_query(self, stmt: str, *params) -> QueryContext:
+    async def run_query(self, stmt: str, *params, result_format: str = 'rows',
+                        timeout: Optional[float] = None) -> QueryContext:
         pass
 
     @abstractmethod
@@ -18,8 +31,47 @@ class AbstractDbConnect(ABC):
         pass
 
     @abstractmethod
-    async def run_query_with_params(self, stmt: str, vals: tuple = (),
-                                    oids: tuple = ()) -> QueryContext:
+    async def run_query_with_params(self, stmt: str, vals: tuple = (), oids: tuple = (),
+                                    timeout: Optional[float] = None) -> QueryContext:
+        pass
+
+    @abstractmethod
+    async def executemany(self, stmt: str, params_seq, oids: tuple = ()) -> int:
+        pass
+
+    @abstractmethod
+    async def copy_records_to_table(self, table: str, records, columns: Sequence[str] = (),
+                                    schema: Optional[str] = None, format_: str = 'text') -> int:
+        pass
+
+    @abstractmethod
+    async def copy_out(self, query: str, sink, format_: str = 'text', header: bool = False) -> int:
+        pass
+
+    @abstractmethod
+    def copy_out_iter(self, query: str, format_: str = 'text', header: bool = False):
+        pass
+
+    @abstractmethod
+    def cursor(self, stmt: str, *params, prefetch: int = 100):
+        pass
+
+    @abstractmethod
+    def pipeline(self):
+        pass
+
+    @abstractmethod
+    def transaction(self, isolation: Optional[str] = None, readonly: bool = False,
+                    deferrable: bool = False):
+        pass
+
+    @abstractmethod
+    async def add_listener(self, channel: str, callback: Callable,
+                           on_lost: Optional[Callable] = None) -> None:
+        pass
+
+    @abstractmethod
+    async def remove_listener(self, channel: str, callback: Callable) -> None:
         pass
 
     @abstractmethod
@@ -30,6 +30,7 @@ SYNC = b'S'
 PASSWORD = b'p'
 DESCRIBE = b'D'
 TERMINATE = b'X'
+COPY_FAIL = b'f'
 CLOSE = b'C'
 
 IDLE = b'I'
@@ -37,3 +38,4 @@ IN_TRANSACTION = b'T'
 IN_FAILED_TRANSACTION = b'E'
 
 STATEMENT = b'S'
+PORTAL = b'P'
@@ -0,0 +1,180 @@
+import sys
+from array import array
+from typing import Any, Callable, NamedTuple, Optional, Sequence, Union
+
+import db.pg_types as pt
+from db.pg_converters import PG_EPOCH_ORDINAL, int4_struct
+from db.pg_errors import CustomDbError
+from db.pg_record import PgColumn, make_record_index
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# сдвиг эпохи Postgres (2000-01-01) относительно эпохи Unix
+PG_EPOCH_UNIX_DAYS = PG_EPOCH_ORDINAL - 719163
+PG_EPOCH_UNIX_MICROSECONDS = PG_EPOCH_UNIX_DAYS * 86400 * 1000000
+# 'infinity' / '-infinity' для timestamp
+INT8_MAX = 2 ** 63 - 1
+INT8_MIN = -2 ** 63
+
+# oid -> (код типа array.array, ширина значения в бинарном формате, dtype numpy)
+FIXED_WIDTH_TYPES = {
+    pt.SMALLINT: ('h', 2, '>i2'),
+    pt.INTEGER: ('i', 4, '>i4'),
+    pt.BIGINT: ('q', 8, '>i8'),
+    pt.REAL: ('f', 4, '>f4'),
+    pt.FLOAT: ('d', 8, '>f8'),
+    pt.BOOLEAN: ('b', 1, '?'),
+    pt.TIMESTAMP: ('q', 8, '>i8'),
+    pt.TIMESTAMPTZ: ('q', 8, '>i8'),
+    pt.DATE: ('i', 4, '>i4'),
+}
+
+_NEED_BYTESWAP = sys.byteorder == 'little'
+
+
+class ColumnValues(NamedTuple):
+    """
+    Значения одной колонки.
+    values - array.array / numpy-массив для типов фиксированной ширины, иначе список,
+    nulls - маска NULL (1/True - значение NULL, значение в values на этом месте не определено)
+    """
+    values: Any
+    nulls: Any
+
+
+class ColumnarResult:
+    """ Результат запроса по колонкам: result['col'] или result[0] -> ColumnValues """
+
+    def __init__(self, columns: Sequence[PgColumn], values: list[ColumnValues]) -> None:
+        self.columns = list(columns)
+        self._values = values
+        self._index = make_record_index(columns)
+
+    @property
+    def rows_count(self) -> int:
+        return len(self._values[0].nulls) if self._values else 0
+
+    def keys(self):
+        return self._index.keys()
+
+    def __getitem__(self, key: Union[str, int]) -> ColumnValues:
+        if isinstance(key, str):
+            key = self._index[key]
+        return self._values[key]
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+class _ColumnBuffer:
+    """ Накопление значений одной колонки по мере чтения DataRow """
+
+    __slots__ = ('column', 'fixed', 'zeros', 'data', 'values', 'nulls', 'converter', 'binary')
+
+    def __init__(self, column: PgColumn, converter: Callable, binary: bool) -> None:
+        self.column = column
+        fixed = FIXED_WIDTH_TYPES.get(column.type_oid) if binary else None
+        self.fixed = fixed
+        self.zeros = bytes(fixed[1]) if fixed else b''
+        # для типов фиксированной ширины - сырые big-endian значения подряд,
+        # для остальных - декодированные python-значения
+        self.data = bytearray()
+        self.values: list = []
+        self.nulls = bytearray()
+        self.converter = converter
+        self.binary = binary
+
+
+class ColumnarBuilder:
+    """
+    Разбор DataRow сразу в буферы колонок без создания python-объектов
+    для значений фиксированной ширины (числа, bool, timestamp, date в бинарном формате)
+    """
+
+    def __init__(self, columns: Sequence[PgColumn], type_converters: Sequence[Callable],
+                 result_formats: Sequence[int], encoding: str = 'utf-8',
+                 use_numpy: Optional[bool] = None) -> None:
+        if use_numpy and np is None:
+            raise CustomDbError('для use_numpy=True требуется установленный numpy')
+
+        self._columns = columns
+        self._buffers = [
+            _ColumnBuffer(column, converter, bool(format_))
+            for column, converter, format_ in zip(columns, type_converters, result_formats)
+        ]
+        self._encoding = encoding
+        self._use_numpy = np is not None if use_numpy is None else use_numpy
+
+    def add_row(self, data) -> None:
+        idx = 2
+        unpack_from = int4_struct.unpack_from
+        for buffer in self._buffers:
+            value_len = unpack_from(data, idx)[0]
+            idx += 4
+            if value_len == -1:
+                buffer.nulls.append(1)
+                if buffer.fixed:
+                    buffer.data += buffer.zeros
+                else:
+                    buffer.values.append(None)
+                continue
+
+            buffer.nulls.append(0)
+            if buffer.fixed:
+                buffer.data += data[idx:idx + value_len]
+            elif buffer.binary:
+                buffer.values.append(buffer.converter(data[idx:idx + value_len]))
+            else:
+                buffer.values.append(
+                    buffer.converter(str(data[idx:idx + value_len], encoding=self._encoding)))
+            idx += value_len
+
+    def result(self) -> ColumnarResult:
+        return ColumnarResult(self._columns, [self._finish(buffer) for buffer in self._buffers])
+
+    def _finish(self, buffer: _ColumnBuffer) -> ColumnValues:
+        if self._use_numpy:
+            nulls = np.frombuffer(bytes(buffer.nulls), dtype='?')
+        else:
+            nulls = array('b', buffer.nulls)
+
+        if not buffer.fixed:
+            return ColumnValues(buffer.values, nulls)
+
+        typecode, _, dtype = buffer.fixed
+        oid = buffer.column.type_oid
+        if self._use_numpy:
+            return ColumnValues(_to_numpy(buffer.data, dtype, oid), nulls)
+        return ColumnValues(_to_array(buffer.data, typecode, oid), nulls)
+
+
+def _to_numpy(data: bytearray, dtype: str, oid: int):
+    """ timestamp -> datetime64[us], date -> datetime64[D], остальное - в нативном порядке байт """
+    values = np.frombuffer(bytes(data), dtype=dtype).astype(dtype.replace('>', '='))
+    if oid in (pt.TIMESTAMP, pt.TIMESTAMPTZ):
+        return (values + PG_EPOCH_UNIX_MICROSECONDS).view('datetime64[us]')
+    if oid == pt.DATE:
+        return (values.astype('i8') + PG_EPOCH_UNIX_DAYS).view('datetime64[D]')
+    return values
+
+
+def _to_array(data: bytearray, typecode: str, oid: int) -> array:
+    """ timestamp - микросекунды от эпохи Unix, date - дни от эпохи Unix """
+    values = array(typecode)
+    values.frombytes(data)
+    if _NEED_BYTESWAP and values.itemsize > 1:
+        values.byteswap()
+    if oid in (pt.TIMESTAMP, pt.TIMESTAMPTZ):
+        return array(typecode, map(_shift_timestamp, values))
+    if oid == pt.DATE:
+        return array(typecode, map(PG_EPOCH_UNIX_DAYS.__add__, values))
+    return values
+
+
+def _shift_timestamp(value: int) -> int:
+    if value == INT8_MAX or value == INT8_MIN:
+        return value
+    return value + PG_EPOCH_UNIX_MICROSECONDS
@@ -1,15 +1,23 @@
+import re
 from datetime import date, datetime, time, timedelta, timezone
 from decimal import Decimal
 from enum import Enum
 from ipaddress import ip_address, ip_network
 from json import dumps, loads
-from typing import Callable
+from math import prod
+from struct import Struct
+from typing import Any, Callable, Optional
 from uuid import UUID
+from zoneinfo import ZoneInfo
 
 from dateutil.parser import parse
 
 import db.pg_types as pt
 
+# элементы массива в текстовом формате: "строка в кавычках", значение без кавычек, { и }
+ARRAY_TOKEN = re.compile(r'"((?:[^"\\]|\\.)*)"|([^,{}]+)|([{}])')
+ARRAY_UNESCAPE = re.compile(r'\\(.)')
+
 
 def bool_in(data: str):
     return data == 't'
@@ -36,6 +44,9 @@ def cidr_in(data):
 
 
 def date_in(data):
+    # ISO вывод Postgres: YYYY-MM-DD, остальное (BC, год > 9999, infinity) - медленный путь
+    if len(data) == 10 and data[4] == '-':
+        return date.fromisoformat(data)
     if data in ('infinity', '-infinity'):
         return data
     else:
@@ -114,6 +125,11 @@ def string_out(value: str):
 
 
 def time_in(data):
+    if len(data) == 8 or len(data) == 15:
+        return time.fromisoformat(data)
+    if 8 < len(data) < 15 and data[8] == '.':
+        return time.fromisoformat(data.ljust(15, '0'))
+
     pattern = '%H:%M:%S.%f' if '.' in data else '%H:%M:%S'
     return datetime.strptime(data, pattern).time()
 
@@ -122,26 +138,70 @@ def time_out(value: datetime):
     return value.isoformat()
 
 
-def timestamp_in(data):
+def _pad_fraction(data: str) -> str:
+    """ Postgres отбрасывает нули в конце дробной части секунд, fromisoformat ждет 6 цифр """
+    if 19 < len(data) < 26:
+        return data.ljust(26, '0')
+    return data
+
+
+def _timestamp_in_slow(data):
     if data in ('infinity', '-infinity'):
         return data
+    return parse(data)
 
-    try:
-        pattern = '%Y-%m-%d %H:%M:%S.%f' if '.' in data else '%Y-%m-%d %H:%M:%S'
-        return datetime.strptime(data, pattern)
-    except ValueError:
-        return parse(data)
+
+# смещение часового пояса из вывода Postgres (+03, -04:30, +05:53:28) -> timezone
+_timezones: dict[str, timezone] = {'+00': timezone.utc}
+
+
+def _timezone_by_offset(offset: str) -> timezone:
+    tz = _timezones.get(offset)
+    if tz is None:
+        parts = [int(part) for part in offset[1:].split(':')]
+        seconds = sum(part * mul for part, mul in zip(parts, (3600, 60, 1)))
+        tz = timezone(timedelta(seconds=-seconds if offset[0] == '-' else seconds))
+        _timezones[offset] = tz
+    return tz
+
+
+def _timezone_by_utcoffset(delta: timedelta) -> timezone:
+    """ Смещение -> timezone из того же кэша, что и у текстового вывода Postgres """
+    seconds = int(delta.total_seconds())
+    sign = '-' if seconds < 0 else '+'
+    hours, rest = divmod(abs(seconds), 3600)
+    minutes, seconds = divmod(rest, 60)
+    offset = f'{sign}{hours:02}'
+    if minutes or seconds:
+        offset += f':{minutes:02}'
+    if seconds:
+        offset += f':{seconds:02}'
+    return _timezone_by_offset(offset)
+
+
+def timestamp_in(data):
+    # ISO вывод Postgres: YYYY-MM-DD HH:MM:SS[.ffffff]
+    if len(data) < 19 or data[4] != '-' or data[-1] == 'C':
+        return _timestamp_in_slow(data)
+    return datetime.fromisoformat(_pad_fraction(data))
 
 
 def timestamptz_in(data):
-    if data in ('infinity', '-infinity'):
-        return data
+    # ISO вывод Postgres: YYYY-MM-DD HH:MM:SS[.ffffff]+HH[:MM[:SS]]
+    if len(data) < 22 or data[4] != '-' or data[-1] == 'C':
+        return _timestamp_in_slow(data)
 
-    try:
-        pattern = '%Y-%m-%d %H:%M:%S.%f%z' if '.' in data else '%Y-%m-%d %H:%M:%S%z'
-        return datetime.strptime(f'{data}00', pattern)
-    except ValueError:
-        return parse(data)
+    pos = data.find('+', 19)
+    if pos == -1:
+        pos = data.find('-', 19)
+        if pos == -1:
+            return _timestamp_in_slow(data)
+
+    naive = _pad_fraction(data[:pos])
+    tz = _timezone_by_offset(data[pos:])
+    if tz is timezone.utc:
+        return datetime.fromisoformat(naive + '+00:00')
+    return datetime.fromisoformat(naive).replace(tzinfo=tz)
 
 
 def unknown_out(value):
@@ -160,6 +220,245 @@ def uuid_in(data):
     return UUID(data)
 
 
+# декодеры значений в бинарном формате (результат запроса с format code = 1)
+PG_EPOCH = datetime(2000, 1, 1)
+PG_EPOCH_TZ = datetime(2000, 1, 1, tzinfo=timezone.utc)
+PG_EPOCH_ORDINAL = PG_EPOCH.toordinal()
+
+int2_struct = Struct('!h')
+int4_struct = Struct('!i')
+int8_struct = Struct('!q')
+float4_struct = Struct('!f')
+float8_struct = Struct('!d')
+numeric_header_struct = Struct('!hhHH')
+
+TIMESTAMP_INFINITY = 2**63 - 1
+TIMESTAMP_NEG_INFINITY = -2**63
+DATE_INFINITY = 2**31 - 1
+DATE_NEG_INFINITY = -2**31
+
+NUMERIC_NEG = 0x4000
+NUMERIC_NAN = 0xC000
+NUMERIC_PINF = 0xD000
+NUMERIC_NINF = 0xF000
+
+
+def int2_recv(data: bytes) -> int:
+    return int2_struct.unpack(data)[0]
+
+
+def int4_recv(data: bytes) -> int:
+    return int4_struct.unpack(data)[0]
+
+
+def int8_recv(data: bytes) -> int:
+    return int8_struct.unpack(data)[0]
+
+
+def float4_recv(data: bytes) -> float:
+    return float4_struct.unpack(data)[0]
+
+
+def float8_recv(data: bytes) -> float:
+    return float8_struct.unpack(data)[0]
+
+
+def bool_recv(data: bytes) -> bool:
+    return data != b'\x00'
+
+
+def bytes_recv(data: bytes) -> bytes:
+    return bytes(data)
+
+
+def uuid_recv(data: bytes) -> UUID:
+    return UUID(bytes=bytes(data))
+
+
+def timestamp_from_microseconds(microseconds: int):
+    if microseconds == TIMESTAMP_INFINITY:
+        return 'infinity'
+    if microseconds == TIMESTAMP_NEG_INFINITY:
+        return '-infinity'
+    return PG_EPOCH + timedelta(microseconds=microseconds)
+
+
+def timestamptz_from_microseconds(microseconds: int):
+    if microseconds == TIMESTAMP_INFINITY:
+        return 'infinity'
+    if microseconds == TIMESTAMP_NEG_INFINITY:
+        return '-infinity'
+    return PG_EPOCH_TZ + timedelta(microseconds=microseconds)
+
+
+def date_from_days(days: int):
+    if days == DATE_INFINITY:
+        return 'infinity'
+    if days == DATE_NEG_INFINITY:
+        return '-infinity'
+    return date.fromordinal(PG_EPOCH_ORDINAL + days)
+
+
+def timestamp_recv(data: bytes):
+    return timestamp_from_microseconds(int8_struct.unpack(data)[0])
+
+
+def timestamptz_recv(data: bytes):
+    """ Сервер отдает timestamptz в UTC, значение возвращается с tzinfo=UTC """
+    return timestamptz_from_microseconds(int8_struct.unpack(data)[0])
+
+
+# часовые пояса сессии, в которых текстовый вывод timestamptz совпадает с бинарным (UTC)
+UTC_TIMEZONES = frozenset(('UTC', 'Etc/UTC', 'UCT', 'Etc/UCT', 'GMT', 'Etc/GMT', 'GMT0',
+                           'Etc/GMT0', 'Universal', 'Etc/Universal', 'Zulu', 'Etc/Zulu'))
+
+
+def make_timestamptz_recv(timezone_name: str) -> Optional[Callable[[bytes], Any]]:
+    """
+    Декодер бинарного timestamptz, совпадающий с текстовым выводом сервера в часовом поясе
+    сессии (TimeZone): значение переводится в этот пояс с фиксированным смещением.
+    None - пояс неизвестен zoneinfo, timestamptz нужно читать в текстовом формате
+    """
+    if timezone_name in UTC_TIMEZONES:
+        return timestamptz_recv
+    try:
+        zone = ZoneInfo(timezone_name)
+    except (ValueError, KeyError):    # ZoneInfoNotFoundError - наследник KeyError
+        return None
+
+    def timestamptz_recv_local(data: bytes):
+        value = timestamptz_recv(data)
+        if isinstance(value, str):
+            return value
+        value = value.astimezone(zone)
+        return value.replace(tzinfo=_timezone_by_utcoffset(value.utcoffset()))
+
+    return timestamptz_recv_local
+
+
+def date_recv(data: bytes):
+    return date_from_days(int4_struct.unpack(data)[0])
+
+
+def numeric_recv(data: bytes) -> Decimal:
+    """ numeric: цифры в системе счисления по основанию 10000, weight - степень первой цифры """
+    ndigits, weight, sign, dscale = numeric_header_struct.unpack_from(data)
+    if sign == NUMERIC_NAN:
+        return Decimal('NaN')
+    if sign == NUMERIC_PINF:
+        return Decimal('Infinity')
+    if sign == NUMERIC_NINF:
+        return Decimal('-Infinity')
+
+    digits = Struct(f'!{ndigits}H').unpack_from(data, 8)
+    digits_str = ''.join([f'{digit:04d}' for digit in digits])
+    exponent = (weight + 1 - ndigits) * 4
+
+    # приводим к количеству знаков после запятой, как в текстовом представлении (dscale)
+    if exponent < -dscale:
+        digits_str = digits_str[:len(digits_str) + exponent + dscale]
+    elif exponent > -dscale:
+        digits_str += '0' * (exponent + dscale)
+
+    return Decimal((1 if sign == NUMERIC_NEG else 0, tuple(map(int, digits_str or '0')), -dscale))
+
+
+# кодировщики значений в бинарный формат (COPY ... FORMAT binary)
+def int2_send(value: int) -> bytes:
+    return int2_struct.pack(value)
+
+
+def int4_send(value: int) -> bytes:
+    return int4_struct.pack(value)
+
+
+def int8_send(value: int) -> bytes:
+    return int8_struct.pack(value)
+
+
+def float4_send(value: float) -> bytes:
+    return float4_struct.pack(value)
+
+
+def float8_send(value: float) -> bytes:
+    return float8_struct.pack(value)
+
+
+def bool_send(value: bool) -> bytes:
+    return b'\x01' if value else b'\x00'
+
+
+def bytes_send(value) -> bytes:
+    return bytes(value)
+
+
+def text_send(value) -> bytes:
+    return str(value).encode('utf8')
+
+
+def json_send(value) -> bytes:
+    return (value if isinstance(value, str) else json_out(value)).encode('utf8')
+
+
+def jsonb_send(value) -> bytes:
+    return b'\x01' + json_send(value)
+
+
+def uuid_send(value) -> bytes:
+    return (value if isinstance(value, UUID) else UUID(str(value))).bytes
+
+
+def timestamp_send(value: datetime) -> bytes:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return int8_struct.pack((value - PG_EPOCH) // timedelta(microseconds=1))
+
+
+def timestamptz_send(value: datetime) -> bytes:
+    """ datetime без tzinfo считается временем в UTC """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int8_struct.pack((value - PG_EPOCH_TZ) // timedelta(microseconds=1))
+
+
+def date_send(value: date) -> bytes:
+    return int4_struct.pack(value.toordinal() - PG_EPOCH_ORDINAL)
+
+
+def numeric_send(value) -> bytes:
+    value = value if isinstance(value, Decimal) else Decimal(str(value))
+    if value.is_nan():
+        return numeric_header_struct.pack(0, 0, NUMERIC_NAN, 0)
+    if value.is_infinite():
+        return numeric_header_struct.pack(0, 0, NUMERIC_NINF if value < 0 else NUMERIC_PINF, 0)
+
+    sign, digits, exponent = value.as_tuple()
+    digits_str = ''.join(map(str, digits))
+    if exponent >= 0:    # type: ignore
+        int_part, frac_part = digits_str + '0' * exponent, ''    # type: ignore
+    else:
+        int_part, frac_part = digits_str[:exponent], digits_str[exponent:].rjust(-exponent, '0')
+
+    # целая часть выравнивается по группам из 4 цифр влево, дробная - вправо
+    int_part = int_part.lstrip('0')
+    int_part = int_part.rjust((len(int_part) + 3) // 4 * 4, '0')
+    frac_part = frac_part.ljust((len(frac_part) + 3) // 4 * 4, '0')
+    groups = [int(part[i:i + 4]) for part in (int_part, frac_part) for i in range(0, len(part), 4)]
+    weight = len(int_part) // 4 - 1
+
+    while groups and groups[0] == 0:
+        groups.pop(0)
+        weight -= 1
+    while groups and groups[-1] == 0:
+        groups.pop()
+    if not groups:
+        weight = 0
+
+    return numeric_header_struct.pack(len(groups), weight, NUMERIC_NEG if sign else 0,
+                                      max(0, -exponent)) \
+        + Struct(f'!{len(groups)}H').pack(*groups)    # type: ignore
+
+
 PY_PG = {
     date: pt.DATE,
     Decimal: pt.NUMERIC,
@@ -175,6 +474,119 @@ PY_PG = {
     str: pt.TEXT,
 }
 
+
+def array_out(value) -> str:
+    """ list/tuple -> литерал массива '{"a","b",NULL}', вложенные списки - многомерный массив """
+    items = []
+    for item in value:
+        if isinstance(item, (list, tuple)):
+            items.append(array_out(item))
+            continue
+        text = None if item is None else make_param(item)
+        if text is None:
+            items.append('NULL')
+        else:
+            items.append('"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"')
+    return '{' + ','.join(items) + '}'
+
+
+def make_array_in(element_in: Callable) -> Callable[[str], list]:
+    """ Разбор текстового представления массива с конвертацией каждого элемента """
+
+    def array_in(data: str) -> list:
+        if data[0] == '[':
+            # явно заданные границы размерностей: [0:1]={1,2}
+            data = data[data.index('=') + 1:]
+
+        stack: list[list] = []
+        current: list = []
+        for quoted, unquoted, brace in ARRAY_TOKEN.findall(data):
+            if brace == '{':
+                stack.append(current)
+                current = []
+            elif brace == '}':
+                parent = stack.pop()
+                parent.append(current)
+                current = parent
+            elif unquoted:
+                current.append(None if unquoted == 'NULL' else element_in(unquoted))
+            else:
+                if '\\' in quoted:
+                    quoted = ARRAY_UNESCAPE.sub(r'\1', quoted)
+                current.append(element_in(quoted))
+        return current[0]
+
+    return array_in
+
+
+array_header_struct = Struct('!iiI')
+array_dimension_struct = Struct('!ii')
+
+
+def text_recv(data: bytes) -> str:
+    return str(data, 'utf8')
+
+
+def array_recv(data: bytes) -> list:
+    """ Массив в бинарном формате: размерности, oid элемента и элементы подряд """
+    ndim, _, element_oid = array_header_struct.unpack_from(data)
+    if ndim == 0:
+        return []
+
+    dimensions = [array_dimension_struct.unpack_from(data, 12 + 8 * dim)[0]
+                  for dim in range(ndim)]
+    element_recv = ARRAY_ELEMENT_DECODERS[element_oid]
+    idx = 12 + 8 * ndim
+    items: list = []
+    for _ in range(prod(dimensions)):
+        item_len = int4_struct.unpack_from(data, idx)[0]
+        idx += 4
+        if item_len == -1:
+            items.append(None)
+        else:
+            items.append(element_recv(data[idx:idx + item_len]))
+            idx += item_len
+
+    # плоский список -> вложенные списки, начиная с последней размерности
+    for size in reversed(dimensions[1:]):
+        items = [items[pos:pos + size] for pos in range(0, len(items), size)]
+    return items
+
+
+def _flatten_array(value, dimensions: list, depth: int = 0) -> list:
+    if depth == len(dimensions):
+        dimensions.append(len(value))
+    elif dimensions[depth] != len(value):
+        raise ValueError('многомерный массив должен иметь одинаковую длину вложенных списков')
+
+    if value and isinstance(value[0], (list, tuple)):
+        return [item for sub in value for item in _flatten_array(sub, dimensions, depth + 1)]
+    return list(value)
+
+
+def make_array_send(element_oid: int, element_send: Callable) -> Callable[[Any], bytes]:
+
+    def array_send(value) -> bytes:
+        dimensions: list[int] = []
+        items = _flatten_array(value, dimensions)
+        if not items:
+            return array_header_struct.pack(0, 0, element_oid)
+
+        has_nulls = any(item is None for item in items)
+        parts = [array_header_struct.pack(len(dimensions), int(has_nulls), element_oid)]
+        parts.extend(array_dimension_struct.pack(size, 1) for size in dimensions)
+        for item in items:
+            if item is None:
+                parts.append(int4_struct.pack(-1))
+            else:
+                item_ = element_send(item)
+                parts.append(int4_struct.pack(len(item_)))
+                parts.append(item_)
+        return b''.join(parts)
+
+    return array_send
+
+
 PY_TYPES = {
     date: date_out,    # date
     datetime: datetime_out,
@@ -191,6 +603,8 @@ PY_TYPES = {
     bytes: bytes_out,    # bytea
     str: string_out,    # unknown
     int: int_out,
+    list: array_out,    # array
+    tuple: array_out,    # array
 }
 
 PG_TYPES = {
@@ -224,23 +638,130 @@ PG_TYPES = {
 }
 
 
-def make_param(value):    # noqa CCF001
-    py_types = dict(PY_TYPES)
+PG_BINARY_TYPES = {
+    pt.BIGINT: int8_recv,    # int8
+    pt.BOOLEAN: bool_recv,    # bool
+    pt.BYTES: bytes_recv,    # bytea
+    pt.DATE: date_recv,    # date
+    pt.FLOAT: float8_recv,    # float8
+    pt.INTEGER: int4_recv,    # int4
+    pt.NUMERIC: numeric_recv,    # numeric
+    pt.REAL: float4_recv,    # float4
+    pt.SMALLINT: int2_recv,    # int2
+    pt.TIMESTAMP: timestamp_recv,    # timestamp
+    pt.TIMESTAMPTZ: timestamptz_recv,    # timestamptz
+    pt.UUID_TYPE: uuid_recv,    # uuid
+}
+
+
+PG_BINARY_ENCODERS = {
+    pt.BIGINT: int8_send,    # int8
+    pt.BOOLEAN: bool_send,    # bool
+    pt.BYTES: bytes_send,    # bytea
+    pt.CHAR: text_send,    # char
+    pt.DATE: date_send,    # date
+    pt.FLOAT: float8_send,    # float8
+    pt.INTEGER: int4_send,    # int4
+    pt.JSON: json_send,    # json
+    pt.JSONB: jsonb_send,    # jsonb
+    pt.NAME: text_send,    # name
+    pt.NUMERIC: numeric_send,    # numeric
+    pt.REAL: float4_send,    # float4
+    pt.SMALLINT: int2_send,    # int2
+    pt.TEXT: text_send,    # text
+    pt.TIMESTAMP: timestamp_send,    # timestamp
+    pt.TIMESTAMPTZ: timestamptz_send,    # timestamptz
+    pt.UUID_TYPE: uuid_send,    # uuid
+    pt.VARCHAR: text_send,    # varchar
+}
+
+
+# oid массива -> oid элемента
+ARRAY_TYPES = {
+    pt.BIGINT_ARRAY: pt.BIGINT,
+    pt.BOOLEAN_ARRAY: pt.BOOLEAN,
+    pt.BYTES_ARRAY: pt.BYTES,
+    pt.CHAR_ARRAY: pt.CHAR,
+    pt.DATE_ARRAY: pt.DATE,
+    pt.FLOAT_ARRAY: pt.FLOAT,
+    pt.INET_ARRAY: pt.INET,
+    pt.INTEGER_ARRAY: pt.INTEGER,
+    pt.JSON_ARRAY: pt.JSON,
+    pt.JSONB_ARRAY: pt.JSONB,
+    pt.NAME_ARRAY: pt.NAME,
+    pt.NUMERIC_ARRAY: pt.NUMERIC,
+    pt.REAL_ARRAY: pt.REAL,
+    pt.SMALLINT_ARRAY: pt.SMALLINT,
+    pt.TEXT_ARRAY: pt.TEXT,
+    pt.TIME_ARRAY: pt.TIME,
+    pt.TIMESTAMP_ARRAY: pt.TIMESTAMP,
+    pt.TIMESTAMPTZ_ARRAY: pt.TIMESTAMPTZ,
+    pt.UUID_ARRAY: pt.UUID_TYPE,
+    pt.VARCHAR_ARRAY: pt.VARCHAR,
+}
+
+# декодеры элементов бинарного массива: строковые элементы приходят в utf8
+ARRAY_ELEMENT_DECODERS = {
+    **PG_BINARY_TYPES,
+    pt.CHAR: text_recv,
+    pt.NAME: text_recv,
+    pt.TEXT: text_recv,
+    pt.VARCHAR: text_recv,
+}
+
+PG_TYPES.update({
+    array_oid: make_array_in(PG_TYPES[element_oid])
+    for array_oid, element_oid in ARRAY_TYPES.items() if element_oid in PG_TYPES
+})
+# бинарный формат результата - для массивов, элементы которых и так читаются в бинарном
+PG_BINARY_TYPES.update({
+    array_oid: array_recv
+    for array_oid, element_oid in ARRAY_TYPES.items() if element_oid in PG_BINARY_TYPES
+})
+PG_BINARY_ENCODERS.update({
+    array_oid: make_array_send(element_oid, PG_BINARY_ENCODERS[element_oid])
+    for array_oid, element_oid in ARRAY_TYPES.items() if element_oid in PG_BINARY_ENCODERS
+})
+
+
+# кодировщик параметра по точному типу значения, заполняется по MRO при первой встрече типа
+_param_encoders: dict[type, Callable] = {}
+
+
+def register_param_encoder(py_type: type, encoder: Callable[[Any], Optional[str]]) -> None:
+    """
+    Регистрация функции перевода значений py_type (и его наследников) в текстовый параметр.
+    encoder возвращает строку или None (NULL)
+    """
+    PY_TYPES[py_type] = encoder
+    _param_encoders.clear()
+
+
+def _resolve_param_encoder(py_type: type) -> Callable:
+    mro = py_type.__mro__
+    if issubclass(py_type, Enum):
+        # IntEnum и перечисления-строки передаются значением, а не как int / str
+        mro = tuple(base for base in mro if issubclass(base, Enum))
+
+    for base in mro:
+        encoder = PY_TYPES.get(base)
+        if encoder is not None:
+            break
+    else:
+        encoder = str
+
+    _param_encoders[py_type] = encoder
+    return encoder
 
-    try:
-        converter: Callable = py_types[type(value)]
-    except KeyError:
-        converter: Callable = str
-        for key_, value_ in py_types.items():
-            try:
-                if isinstance(value, key_):
-                    converter: Callable = value_
-                    break
-            except TypeError:
-                pass
 
-    return converter(value)
+def make_param(value):
+    encoder = _param_encoders.get(type(value)) or _resolve_param_encoder(type(value))
+    return encoder(value)
 
 
 def python_types_convert_to_pg_params(values: tuple):
-    return tuple([make_param(value) for value in values])
+    encoders = _param_encoders
+    return tuple([
+        (encoders.get(type(value)) or _resolve_param_encoder(type(value)))(value)
+        for value in values
+    ])
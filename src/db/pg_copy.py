@@ -0,0 +1,166 @@
+from struct import Struct
+from typing import TYPE_CHECKING, Callable, Iterable, Optional
+
+from db.pg_converters import make_param
+from db.query_context import QueryContext
+
+if TYPE_CHECKING:
+    from db.pg_core_connect import PgCoreConnect
+    from db.pg_dispatcher import PgResponse
+
+COPY_BINARY_HEADER = b'PGCOPY\n\xff\r\n\x00' + Struct('!ii').pack(0, 0)
+COPY_BINARY_TRAILER = Struct('!h').pack(-1)
+
+field_count_struct = Struct('!h')
+field_len_struct = Struct('!i')
+
+NULL_FIELD = field_len_struct.pack(-1)
+COPY_TEXT_NULL = '\\N'
+
+# спецсимволы текстового формата COPY
+COPY_TEXT_ESCAPES = str.maketrans({
+    '\\': '\\\\',
+    '\t': '\\t',
+    '\n': '\\n',
+    '\r': '\\r',
+})
+
+
+def quote_ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def qualified_name(table: str, schema: Optional[str] = None) -> str:
+    return quote_ident(table) if schema is None else f'{quote_ident(schema)}.{quote_ident(table)}'
+
+
+def copy_from_stdin_stmt(table: str, columns: Iterable[str] = (), schema: Optional[str] = None,
+                         format_: str = 'text') -> str:
+    table_name = qualified_name(table, schema)
+    columns_ = ', '.join(quote_ident(column) for column in columns)
+    columns_ = f' ({columns_})' if columns_ else ''
+    return f'COPY {table_name}{columns_} FROM STDIN (FORMAT {format_})'
+
+
+def copy_to_stdout_stmt(query: str, format_: str = 'text', header: bool = False) -> str:
+    if format_ not in ('text', 'csv', 'binary'):
+        raise ValueError(f'неподдерживаемый формат COPY: {format_}')
+    header_ = ', HEADER' if header else ''
+    return f'COPY ({query}) TO STDOUT (FORMAT {format_}{header_})'
+
+
+def quote_literal(value) -> str:
+    """ Значение в виде SQL-литерала (COPY не поддерживает параметры запроса) """
+    if value is None:
+        return 'NULL'
+    value_ = make_param(value)
+    return "E'" + value_.replace('\\', '\\\\').replace("'", "''") + "'"
+
+
+def encode_text_row(record: Iterable, encoding: str = 'utf8') -> bytes:
+    """ Строка в текстовом формате COPY: значения через табуляцию, NULL - \\N """
+    values = []
+    for value in record:
+        if value is None:
+            values.append(COPY_TEXT_NULL)
+        else:
+            values.append(make_param(value).translate(COPY_TEXT_ESCAPES))
+    return ('\t'.join(values) + '\n').encode(encoding)
+
+
+def make_binary_row_encoder(encoders: list[Callable]) -> Callable[[Iterable], bytes]:
+    """ Кодировщик строки в бинарном формате COPY по списку кодировщиков колонок """
+    field_count = field_count_struct.pack(len(encoders))
+
+    def encode_binary_row(record: Iterable) -> bytes:
+        record = tuple(record)
+        if len(record) != len(encoders):
+            raise ValueError(
+                f'ожидалось {len(encoders)} значений в строке, получено {len(record)}')
+
+        row = bytearray(field_count)
+        for encoder, value in zip(encoders, record):
+            if value is None:
+                row.extend(NULL_FIELD)
+            else:
+                value_ = encoder(value)
+                row.extend(field_len_struct.pack(len(value_)))
+                row.extend(value_)
+        return bytes(row)
+
+    return encode_binary_row
+
+
+class PgCopyOut:
+    """
+    Потоковое чтение результата COPY ... TO STDOUT.
+    Сообщения CopyData, пришедшие одним чтением из сокета, склеиваются в одну порцию
+    """
+
+    def __init__(self, connection: 'PgCoreConnect', stmt: str,
+                 chunk_size: int = 64 * 1024) -> None:
+        self._connection = connection
+        self._query_context = QueryContext(stmt)
+        self._chunk_size = chunk_size
+        # ключ монопольного режима соединения и ответ, читаемый частями до close()
+        self._exclusive: Optional[object] = None
+        self._response: Optional['PgResponse'] = None
+        self._started = False
+        self._done = False
+        self._closed = False
+
+    @property
+    def rows_count(self) -> int:
+        return max(self._query_context.rows_count, 0)
+
+    def __aiter__(self) -> 'PgCopyOut':
+        return self
+
+    async def __anext__(self) -> bytes:
+        if not self._started:
+            self._exclusive, self._response = \
+                await self._connection._start_copy_out(self._query_context)
+            self._connection._active_reader = self
+            self._started = True
+
+        if self._closed or self._done:
+            await self.close()
+            raise StopAsyncIteration
+
+        query_context = self._query_context
+        self._done = not await self._connection._read_copy_data(query_context, self._chunk_size)
+        chunk_ = b''.join(query_context.rows)    # type: ignore
+        query_context.rows = []
+
+        if not chunk_:
+            await self.close()
+            raise StopAsyncIteration
+        return chunk_
+
+    async def close(self) -> None:
+        """ Дочитывает (и отбрасывает) оставшиеся данные, иначе соединение не освободить """
+        if self._closed:
+            return
+        self._closed = True
+
+        connection_ = self._connection
+        if connection_._active_reader is self:
+            connection_._active_reader = None
+        if not self._started:
+            return
+
+        query_context = self._query_context
+        try:
+            while not self._done:
+                self._done = not await connection_._read_copy_data(query_context,
+                                                                   self._chunk_size)
+                query_context.rows = []
+            await connection_._handle_query_result_messages(query_context=query_context)
+        finally:
+            connection_._dispatcher.end_stream(self._response, self._exclusive)    # type: ignore
+
+    async def __aenter__(self) -> 'PgCopyOut':
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback) -> None:
+        await self.close()
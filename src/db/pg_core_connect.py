@@ -1,20 +1,48 @@
 import asyncio
+import inspect
 import logging
 from asyncio.streams import StreamReader, StreamWriter
 from collections import defaultdict
 from enum import Enum
+from functools import partial
 from hashlib import md5
 from struct import Struct
-from typing import Callable, Optional, Union
+from time import perf_counter
+from typing import (Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable, Optional,
+                    Sequence, Union)
 
 import db.db_messages as dbm
+import db.pg_types as pt
 from db.abstract_db_connect import AbstractDbConnect
-from db.pg_converters import PG_TYPES, python_types_convert_to_pg_params, string_in
+from db.pg_columnar import ColumnarBuilder
+from db.pg_converters import (PG_BINARY_ENCODERS, PG_BINARY_TYPES, PG_TYPES,
+                              make_timestamptz_recv, python_types_convert_to_pg_params,
+                              string_in)
+from db.pg_copy import (COPY_BINARY_HEADER, COPY_BINARY_TRAILER, PgCopyOut,
+                        copy_from_stdin_stmt, copy_to_stdout_stmt, encode_text_row,
+                        make_binary_row_encoder, qualified_name, quote_ident)
+from db.pg_cursor import PgCursor
+from db.pg_dispatcher import PgDispatcher, PgResponse
+from db.pg_errors import CustomDbError, PgServerError, QueryTimeoutError
+from db.pg_message_reader import PgMessageReader
+from db.pg_metrics import QueryEvent, QueryHook, current_query_event
+from db.pg_pipeline import PgPipeline
+from db.pg_record import PgColumn, Record, make_record_index
+from db.pg_row_decoder import make_row_decoder
+from db.pg_scram import SCRAM_SHA_256, ScramClient
+from db.pg_socket import SocketOptions, unix_socket_path
+from db.pg_transaction import PgTransaction
 from db.query_context import QueryContext
+from db.statement_cache import PreparedStatement, StatementCache
 
 logger = logging.getLogger(__name__)
 
 NULL_BYTE = b'\x00'
+CANCEL_REQUEST_CODE = 80877102
+# сколько ждать ответа сервера после отправки CancelRequest, прежде чем разорвать соединение
+CANCEL_GRACE_PERIOD = 5.0
+QUERY_CANCELED = '57014'
+ROW_DESCRIPTIONS_CACHE_SIZE = 256
 
 
 class CharType(Enum):
@@ -26,10 +54,7 @@ class CharType(Enum):
     ci = 'ci'
     cccc = 'cccc'
     bh = 'bh'
-
-
-class CustomDbError(Exception):
-    pass
+    iiii = 'iiii'
 
 
 class CPack:
@@ -41,8 +66,8 @@ class CPack:
 
         self._c_struct: Struct = Struct(f'!{type_marker.value}')
 
-    def pack(self, data) -> bytes:
-        return self._c_struct.pack(data)
+    def pack(self, *data) -> bytes:
+        return self._c_struct.pack(*data)
 
     def unpack(self, data, offset: Optional[int] = None):
         if offset:
@@ -67,23 +92,82 @@ class PgCoreConnect(AbstractDbConnect):
         password: str,
         application_name=None,
         replication=None,
+        statement_cache_size: int = 100,
+        unix_socket: Optional[str] = None,
+        socket_options: Optional[SocketOptions] = None,
+        query_hooks: Optional[list[QueryHook]] = None,
     ) -> None:
-        """ Инициализация подключения к БД (без непосредственного подключения) """
+        """
+        Инициализация подключения к БД (без непосредственного подключения).
+        unix_socket - каталог сокетов сервера или путь к файлу сокета: подключение
+        без TCP, host при этом не используется; host, начинающийся с '/', - тоже каталог сокетов.
+        socket_options - настройки TCP-сокета (TCP_NODELAY, keepalive, размеры буферов).
+        query_hooks - обработчики событий запросов, список может быть общим для нескольких
+        соединений (например, всего пула), см. add_query_hook
+        """
 
         self._client_encoding = 'utf8'
         self._host = host
         self._port = port
+        if unix_socket is None and host.startswith('/'):
+            unix_socket = host
+        self._unix_socket = unix_socket
+        self._socket_options = socket_options or SocketOptions()
         self._db = db_name
         self._user = user
         self._password = password
 
+        self._reader: Optional[StreamReader] = None
+        self._writer: Optional[StreamWriter] = None
+        self._messages: Optional[PgMessageReader] = None
+        # сообщения, еще не переданные транспорту
+        self._write_buffer = bytearray()
+
         self._query_context = QueryContext(None)
 
         self._postgres_types = defaultdict(lambda: string_in, PG_TYPES)
+        self._postgres_binary_types = dict(PG_BINARY_TYPES)
+        # часовой пояс сессии (ParameterStatus TimeZone), в нем возвращаются значения timestamptz
+        self._session_timezone: Optional[str] = None
+        # разобранные RowDescription по сырым байтам сообщения
+        self._row_descriptions: dict[bytes, tuple] = {}
+
+        # недочитанный курсор или COPY TO STDOUT, занимающий соединение
+        self._active_reader: Optional[Union[PgCursor, PgCopyOut]] = None
+        self._portal_suspended = False
+
+        # подписки LISTEN: канал -> функции обратного вызова
+        self._listeners: dict[str, list[Callable]] = {}
+        # чтение уведомлений, пока выделенное под LISTEN соединение простаивает
+        self._listen_task: Optional[asyncio.Task] = None
+        # вызывается при разрыве соединения, выделенного под LISTEN
+        self._on_listen_lost: Optional[Callable] = None
+
+        self._statements = StatementCache(statement_cache_size)
+        self._statements_to_close: list[bytes] = []
 
         self._encoded_password = self._encode_password(password)
 
         self._transaction_status = None
+        # счетчики для QueryHook: отправлено байт, получено ReadyForQuery, разобрано DataRow
+        self._query_hooks: list[QueryHook] = query_hooks if query_hooks is not None else []
+        self._bytes_sent = 0
+        self._round_trips = 0
+        self._rows_decoded = 0
+        self._decode_time = 0.0
+        # количество выполняющихся запросов с QueryHook (на время которых DataRow замеряется)
+        self._instrumented = 0
+        # очередь одновременных запросов разных корутин
+        self._dispatcher = PgDispatcher(self)
+        # текущая (самая вложенная) транзакция и еще не отправленные команды управления ею:
+        # они уходят на сервер в одном пакете со следующим запросом
+        self._transaction: Optional[PgTransaction] = None
+        self._transaction_commands: list[str] = []
+        # COMMIT / RELEASE SAVEPOINT, отправляемый вместе с запросом (PgTransaction.run_query)
+        self._transaction_epilogue: Optional[str] = None
+        # BackendKeyData: pid серверного процесса и ключ для CancelRequest
+        self._backend_pid: Optional[int] = None
+        self._backend_secret: Optional[int] = None
 
         self._encoded_init_params = self._encode_init_params({
             'user': user,
@@ -106,93 +190,886 @@ class PgCoreConnect(AbstractDbConnect):
             dbm.BIND_COMPLETE: self._handle_BIND_COMPLETE,
             dbm.PARAMETER_DESCRIPTION: self._handle_PARAMETER_DESCRIPTION,
             dbm.NO_DATA: self._handle_NO_DATA,
+            dbm.CLOSE_COMPLETE: self._handle_CLOSE_COMPLETE,
+            dbm.PORTAL_SUSPENDED: self._handle_PORTAL_SUSPENDED,
+            dbm.EMPTY_QUERY_RESPONSE: self._handle_EMPTY_QUERY_RESPONSE,
+            dbm.COPY_IN_RESPONSE: self._handle_COPY_IN_RESPONSE,
+            dbm.COPY_OUT_RESPONSE: self._handle_COPY_OUT_RESPONSE,
+            dbm.COPY_DATA: self._handle_COPY_DATA,
+            dbm.COPY_DONE: self._handle_COPY_DONE,
+            dbm.ERROR_RESPONSE: self._handle_ERROR_RESPONSE,
+            dbm.NOTICE_RESPONSE: self._handle_NOTICE_RESPONSE,
+            dbm.NOTIFICATION_RESPONSE: self._handle_NOTIFICATION_RESPONSE,
         }
 
         self._authenticate_handlers = {
             0: self._authenticate_nope,
             3: self._authenticate_by_plain_password,    # обработчик просто по-паролю
             5: self._authenticate_by_md5_password,    # обработчик по паролю (пароль+логин)
+            10: self._authenticate_by_sasl,    # SASL: выбор механизма (SCRAM-SHA-256)
+            11: self._authenticate_by_sasl_continue,
+            12: self._authenticate_by_sasl_final,
         }
+        self._scram: Optional[ScramClient] = None
+
+    @property
+    def idle(self) -> bool:
+        """ Соединение вне транзакции, не занято курсором, COPY, LISTEN и другими запросами """
+        return not self.closed and self._transaction_status == dbm.IDLE \
+            and self._active_reader is None and self._listen_task is None \
+            and self._transaction is None and not self._dispatcher.busy
+
+    @property
+    def closed(self) -> bool:
+        """ Признак закрытого (или разорванного сервером) соединения """
+        if self._writer is None or self._reader is None:
+            return True
+        return self._writer.is_closing() or self._reader.at_eof()
 
     async def connect(self):
         """ Подключение к БД """
         self._reader, self._writer = await self._create_connection()
+        self._messages = PgMessageReader(self._reader)
+        self._write_buffer = bytearray()
         await self._prepare_auth()
         await self.__run_while_not_command_in((dbm.CONNECTION_READY, dbm.ERROR_RESPONSE))
 
-    async def run_query(self, stmt: str, *params):
+    async def run_query(self, stmt: str, *params, result_format: str = 'rows',
+                        timeout: Optional[float] = None):
+        """
+        result_format='rows' - строки Record в query_context.rows,
+        result_format='columnar' - значения по колонкам в query_context.columnar (ColumnarResult).
+        timeout - ограничение времени выполнения в секундах, см. run_with_timeout
+        """
+        if self._query_hooks:
+            return await self._run_with_hooks(
+                stmt, self._run_query(stmt, *params, result_format=result_format, timeout=timeout))
+        return await self._run_query(stmt, *params, result_format=result_format, timeout=timeout)
+
+    async def _run_query(self, stmt: str, *params, result_format: str = 'rows',
+                         timeout: Optional[float] = None):
+        if result_format == 'columnar':
+            return await self.run_with_timeout(self.run_query_columnar(stmt, params), timeout)
+        if result_format != 'rows':
+            raise ValueError(f'неизвестный формат результата: {result_format}')
+
         if len(params) == 0:
-            query_context = await self.run_simple_query(stmt)
+            query_context = await self.run_with_timeout(self.run_simple_query(stmt), timeout)
             return query_context
         else:
             params_ = params
-            query_context = await self.run_query_with_params(stmt, params_)
+            query_context = await self._run_query_with_params(stmt, params_, timeout=timeout)
             return query_context
 
     async def run_simple_query(self, stmt: str):
         """ Запуск на выполнение SQL-запроса """
+        await self._before_request()
         query_context: QueryContext = QueryContext(stmt)
-        self._send_command_QUERY(stmt)
-        await self._writer.drain()
-        await self._handle_query_result_messages(query_context=query_context)
+        async with self._dispatcher.writing() as dispatcher_:
+            self._send_command_QUERY(stmt)
+            response_ = dispatcher_.enqueue()
+        async with response_:
+            await self._drain()
+            await self._handle_query_result_messages(query_context=query_context)
 
         return query_context
 
-    async def run_query_with_params(self, stmt: str, vals: tuple = (), oids: tuple = ()):
-        packer = CPack(CharType.i)
+    async def run_query_with_params(self, stmt: str, vals: tuple = (), oids: tuple = (),
+                                    timeout: Optional[float] = None):
+        if self._query_hooks:
+            return await self._run_with_hooks(
+                stmt, self._run_query_with_params(stmt, vals, oids, timeout))
+        return await self._run_query_with_params(stmt, vals, oids, timeout)
+
+    async def _run_query_with_params(self, stmt: str, vals: tuple = (), oids: tuple = (),
+                                     timeout: Optional[float] = None):
+        if timeout is not None:
+            return await self.run_with_timeout(self._run_query_with_params(stmt, vals, oids),
+                                               timeout)
+        try:
+            return await self._run_prepared(stmt, vals, oids)
+        except PgServerError as e:
+            # план закэшированного statement'а устарел (например, поменяли таблицу) -
+            # выкидываем его из кэша и, если транзакция не прервана, повторяем запрос
+            if not self._is_stale_statement_error(e):
+                raise
+            if self._transaction_status != dbm.IDLE:
+                raise
+            return await self._run_prepared(stmt, vals, oids)
+
+    async def run_query_columnar(self, stmt: str, vals: tuple = (), oids: tuple = (),
+                                 use_numpy: Optional[bool] = None) -> QueryContext:
+        """
+        Выполнение запроса с разбором результата сразу по колонкам: числа, bool, timestamp и date
+        копируются в array.array (или numpy-массивы, если numpy установлен) без создания
+        python-объекта на каждое значение. Результат - query_context.columnar (ColumnarResult)
+        """
+        try:
+            return await self._run_prepared(stmt, vals, oids, columnar=True, use_numpy=use_numpy)
+        except PgServerError as e:
+            if not self._is_stale_statement_error(e) or self._transaction_status != dbm.IDLE:
+                raise
+            return await self._run_prepared(stmt, vals, oids, columnar=True, use_numpy=use_numpy)
+
+    async def _run_prepared(self, stmt: str, vals: tuple, oids: tuple, columnar: bool = False,
+                            use_numpy: Optional[bool] = None) -> QueryContext:
+        """ Выполнение запроса с параметрами за один round trip """
+        await self._before_request()
         query_context = QueryContext(stmt)
+        params = python_types_convert_to_pg_params(vals)
 
-        self._send_command_PARSE(NULL_BYTE, stmt, oids)
-        self._writer.write(dbm.SYNC + packer.pack(len(b'') + 4) + b'')
-        await self._writer.drain()
+        described = None
+        if columnar:
+            # бинарный формат нужен уже на первом выполнении - описываем statement заранее
+            described = await self._prepare_described(stmt, oids)
+            query_context.columnar = ColumnarBuilder(
+                described.columns or [], described.type_converters, described.result_formats,
+                self._client_encoding, use_numpy)
+
+        async with self._dispatcher.writing() as dispatcher_:
+            statement, is_new = self._send_prepared(query_context, params, oids,
+                                                    statement=described)
+            response_ = dispatcher_.enqueue()
+        async with response_:
+            await self._drain()
+            await self._read_prepared(query_context, statement, is_new)
+
+        if query_context.columnar is not None:
+            query_context.columnar = query_context.columnar.result()
+        return query_context
 
-        await self.__run_while_not_command_in((dbm.CONNECTION_READY, ),
-                                              query_context=query_context)
+    async def _prepare_described(self, stmt: str, oids: tuple) -> PreparedStatement:
+        """ Parse + Describe statement + Sync для еще не описанного statement'а """
+        statement, is_new = self._get_statement(stmt, oids)
+        if statement.described:
+            return statement
 
-        self._send_command_DESCRIBE_STATEMENT(NULL_BYTE)
+        query_context = QueryContext(stmt)
+        async with self._dispatcher.writing() as dispatcher_:
+            self._send_pending_CLOSE()
+            self._send_transaction_commands()
+            if is_new:
+                self._send_command_PARSE(statement.name, statement.stmt, statement.oids)
+            self._send_command_DESCRIBE_STATEMENT(statement.name)
+            self._send_command_SYNC()
+            response_ = dispatcher_.enqueue()
 
-        self._writer.write(dbm.SYNC + packer.pack(len(b'') + 4) + b'')
+        try:
+            async with response_:
+                await self._drain()
+                await self._handle_query_result_messages(query_context=query_context)
+        except PgServerError:
+            self._invalidate_statement(statement)
+            raise
+        self._describe_statement(statement, query_context)
+        return statement
+
+    def _send_prepared(self, query_context: QueryContext, params: tuple, oids: tuple = (),
+                       max_rows: int = 0, sync: bool = True,
+                       statement: Optional[PreparedStatement] = None
+                       ) -> tuple[PreparedStatement, bool]:
+        """
+        Запись в сокет (без отправки) [Parse] + Bind + [Describe portal] + Execute + Sync.
+        Parse и Describe отправляются только для еще не описанного statement'а,
+        отложенные команды транзакции - перед запросом, COMMIT (если задан) - перед Sync.
+        Для построчной выборки (курсор) вместо Sync отправляется Flush - портал остается открытым.
+        statement - уже созданный на сервере statement (например, безымянный после Describe)
+        """
+        if statement is None:
+            statement, is_new = self._get_statement(query_context.stmt, oids)
+        else:
+            is_new = False
+
+        self._send_pending_CLOSE()
+        self._send_transaction_commands()
+        if is_new:
+            self._send_command_PARSE(statement.name, statement.stmt, statement.oids)
+        self._send_command_BIND(statement.name, params, statement.result_formats)
+        if statement.described:
+            self._apply_description(statement, query_context)
+        else:
+            self._send_command_DESCRIBE_PORTAL()
+        self._send_command_EXECUTE(max_rows)
+        if sync:
+            if self._transaction_epilogue is not None:
+                self._send_transaction_commands([self._transaction_epilogue])
+                self._transaction_epilogue = None
+            self._send_command_SYNC()
+        else:
+            self._send_command_FLUSH()
 
-        await self._writer.drain()
+        return statement, is_new
 
-        params = python_types_convert_to_pg_params(vals)
+    async def _read_prepared(self, query_context: QueryContext, statement: PreparedStatement,
+                             is_new: bool) -> None:
+        """ Чтение ответа на отправленный _send_prepared запрос """
+        try:
+            await self._handle_query_result_messages(query_context=query_context)
+        except PgServerError as e:
+            if is_new or self._is_stale_statement_error(e):
+                self._invalidate_statement(statement)
+            raise
+
+        self._describe_statement(statement, query_context)
+
+    def _apply_description(self, statement: PreparedStatement, query_context: QueryContext):
+        """ Описание результата из кэша вместо RowDescription от сервера """
+        query_context.columns = statement.columns
+        query_context.type_converters = statement.type_converters
+        query_context.result_formats = statement.result_formats
+        query_context.record_index = statement.record_index
+        query_context.row_decoder = statement.row_decoder
+        if statement.columns:
+            query_context.rows = []
 
-        self._send_command_BIND(NULL_BYTE, params)
-        await self.__run_while_not_command_in((dbm.CONNECTION_READY, ),
-                                              query_context=query_context)
+    def _describe_statement(self, statement: PreparedStatement, query_context: QueryContext):
+        if not statement.described:
+            # первое выполнение идет в текстовом формате, дальше - бинарный формат
+            # для колонок, у которых есть бинарный декодер
+            statement.columns = query_context.columns
+            statement.record_index = query_context.record_index
+            statement.result_formats, statement.type_converters = \
+                self._make_result_decoders(query_context.columns)
+            statement.row_decoder = make_row_decoder(
+                statement.type_converters, statement.result_formats, self._client_encoding)
+            statement.described = True
+
+    def _make_result_decoders(self, columns: Optional[list]) -> tuple[tuple, list[Callable]]:
+        """ Форматы результата для Bind и соответствующие им функции конвертации """
+        if not columns:
+            return (), []
+
+        result_formats = []
+        type_converters = []
+        for column in columns:
+            binary_converter = self._postgres_binary_types.get(column.type_oid)
+            if binary_converter is None:
+                result_formats.append(0)
+                type_converters.append(self._postgres_types[column.type_oid])
+            else:
+                result_formats.append(1)
+                type_converters.append(binary_converter)
+
+        return tuple(result_formats), type_converters
+
+    def _get_statement(self, stmt: str, oids: tuple) -> tuple[PreparedStatement, bool]:
+        """ Возвращает prepared statement из кэша и признак того, что его нужно создать """
+        if self._statements.capacity <= 0:
+            return PreparedStatement(b'', stmt, oids), True
+
+        statement = self._statements.get(stmt, oids)
+        if statement is not None:
+            return statement, False
+
+        statement, evicted = self._statements.add(stmt, oids)
+        self._statements_to_close.extend(evicted_.name for evicted_ in evicted)
+        return statement, True
+
+    def _invalidate_statement(self, statement: PreparedStatement) -> None:
+        self._statements.remove(statement)
+        if statement.name:
+            self._statements_to_close.append(statement.name)
+
+    @staticmethod
+    def _is_stale_statement_error(error: PgServerError) -> bool:
+        """ cached plan must not change result type / prepared statement does not exist """
+        return error.sqlstate == '26000' \
+            or error.sqlstate == '0A000' and 'cached plan' in error.message
+
+    async def executemany(self, stmt: str, params_seq: Union[Iterable, AsyncIterable],
+                          oids: tuple = (), batch_size: int = 1000) -> int:
+        if self._query_hooks:
+            return await self._run_with_hooks(
+                stmt, self._executemany(stmt, params_seq, oids, batch_size))
+        return await self._executemany(stmt, params_seq, oids, batch_size)
+
+    async def _executemany(self, stmt: str, params_seq: Union[Iterable, AsyncIterable],
+                           oids: tuple = (), batch_size: int = 1000) -> int:
+        """
+        Выполнение одного запроса для множества наборов параметров.
+        Statement парсится один раз, на каждый набор уходит пара Bind/Execute,
+        Sync - один на весь пакет (весь пакет выполняется в одной неявной транзакции).
+        Ответы на очередную порцию из batch_size наборов читаются после отправки следующей,
+        чтобы ни клиент, ни сервер не блокировались на переполненном буфере сокета.
+        Возвращает суммарное количество затронутых строк
+        """
+        await self._before_request()
+        # ответы на Execute пакета считаются по CommandComplete - BEGIN отправляем заранее
+        await self._flush_transaction_commands()
+        # пакет пишется порциями - право записи удерживается до конца пакета
+        async with self._dispatcher.writing() as dispatcher_:
+            response_ = dispatcher_.enqueue()
+            # прерванный (отменой задачи) пакет завершается Sync, откатывающим его целиком
+            response_.abort = self._send_command_SYNC
+            async with response_:
+                return await self._send_many(stmt, params_seq, oids, batch_size, response_)
+
+    async def _send_many(self, stmt: str, params_seq: Union[Iterable, AsyncIterable],
+                         oids: tuple, batch_size: int, response_: PgResponse) -> int:
+        query_context = QueryContext(stmt)
+        statement, is_new = self._get_statement(stmt, oids)
 
-        self._send_command_EXECUTE()
+        self._send_pending_CLOSE()
+        if is_new:
+            self._send_command_PARSE(statement.name, statement.stmt, statement.oids)
+        if statement.described:
+            self._apply_description(statement, query_context)
+        describe = not statement.described
 
-        self._writer.write(dbm.SYNC + packer.pack(len(b'') + 4) + b'')
-        await self._writer.drain()
+        unread = 0    # количество Execute, ответы на которые еще не прочитаны
+        try:
+            async for params in self._iter_params_batches(params_seq, batch_size):
+                describe = self._send_many_batch(statement, params, describe)
+                await self._drain()
+
+                unread = await self._read_command_results(query_context, unread)
+                unread += len(params)
+                if query_context.error is not None:
+                    break
+        except (ValueError, TypeError, KeyError, AttributeError):
+            await self._abort_many(statement, response_)
+            raise
+
+        await self._finish_many(statement, is_new, query_context, response_)
+        if not describe:
+            self._describe_statement(statement, query_context)
+        return max(query_context.rows_count, 0)
+
+    def _send_many_batch(self, statement: PreparedStatement, params: list[tuple],
+                         describe: bool) -> bool:
+        """ Bind + Execute на каждый набор параметров порции, возвращает, нужен ли еще Describe """
+        for params_ in params:
+            self._send_command_BIND(statement.name, params_, statement.result_formats)
+            if describe:
+                self._send_command_DESCRIBE_PORTAL()
+                describe = False
+            self._send_command_EXECUTE()
+        self._send_command_FLUSH()
+        return describe
+
+    async def _abort_many(self, statement: PreparedStatement, response_: PgResponse) -> None:
+        """
+        Ошибка конвертации параметров: часть пакета уже на сервере,
+        заведомо ошибочный Parse прерывает неявную транзакцию, и Sync ее откатывает
+        """
+        self._send_command_PARSE(b'', 'executemany aborted by client')
+        self._send_command_SYNC()
+        response_.abort = None
+        await self._drain()
         await self.__run_while_not_command_in((dbm.CONNECTION_READY, ),
+                                              query_context=QueryContext())
+        self._invalidate_statement(statement)
+
+    async def _finish_many(self, statement: PreparedStatement, is_new: bool,
+                           query_context: QueryContext, response_: PgResponse) -> None:
+        """ Sync пакета и чтение ответов до ReadyForQuery """
+        self._send_command_SYNC()
+        response_.abort = None
+        await self._drain()
+        try:
+            await self._handle_query_result_messages(query_context=query_context)
+        except PgServerError as e:
+            if is_new or self._is_stale_statement_error(e):
+                self._invalidate_statement(statement)
+            raise
+
+    async def _iter_params_batches(self, params_seq: Union[Iterable, AsyncIterable],
+                                   batch_size: int) -> AsyncIterator[list[tuple]]:
+        """ Наборы параметров, сконвертированные в текст, порциями по batch_size """
+        batch_ = []
+        if isinstance(params_seq, AsyncIterable):
+            async for params in params_seq:
+                batch_.append(python_types_convert_to_pg_params(params))
+                if len(batch_) >= batch_size:
+                    yield batch_
+                    batch_ = []
+        else:
+            for params in params_seq:
+                batch_.append(python_types_convert_to_pg_params(params))
+                if len(batch_) >= batch_size:
+                    yield batch_
+                    batch_ = []
+        if batch_:
+            yield batch_
+
+    async def _read_command_results(self, query_context: QueryContext, count: int) -> int:
+        """ Чтение ответов на count отправленных Execute, возвращает количество недочитанных """
+        while count and query_context.error is None:
+            await self.__run_while_not_command_in(
+                (dbm.COMMAND_COMPLETE, dbm.EMPTY_QUERY_RESPONSE, dbm.ERROR_RESPONSE),
+                query_context=query_context)
+            count -= 1
+        return count
+
+    async def copy_records_to_table(    # noqa: CFQ002
+        self,
+        table: str,
+        records: Union[Iterable, AsyncIterable],
+        columns: Sequence[str] = (),
+        schema: Optional[str] = None,
+        format_: str = 'text',
+        chunk_size: int = 256 * 1024,
+    ) -> int:
+        """
+        Загрузка строк в таблицу через COPY ... FROM STDIN.
+        Строки копятся в буфере и уходят в сокет порциями по chunk_size байт,
+        после каждой порции ждем drain(), чтобы не раздувать буфер отправки.
+        Возвращает количество загруженных строк
+        """
+        copy_ = self._copy_records_to_table(table, records, columns, schema, format_, chunk_size)
+        if self._query_hooks:
+            return await self._run_with_hooks(
+                copy_from_stdin_stmt(table, columns, schema, format_), copy_)
+        return await copy_
+
+    async def _copy_records_to_table(    # noqa: CFQ002
+        self,
+        table: str,
+        records: Union[Iterable, AsyncIterable],
+        columns: Sequence[str],
+        schema: Optional[str],
+        format_: str,
+        chunk_size: int,
+    ) -> int:
+        if format_ == 'binary':
+            encode_row = await self._make_copy_binary_encoder(table, columns, schema)
+        elif format_ == 'text':
+            encode_row = partial(encode_text_row, encoding=self._client_encoding)
+        else:
+            raise ValueError(f'неподдерживаемый формат COPY: {format_}')
+
+        await self._before_request()
+        query_context = QueryContext(copy_from_stdin_stmt(table, columns, schema, format_))
+        async with self._dispatcher.writing() as dispatcher_:
+            self._send_command_QUERY(query_context.stmt)
+            response_ = dispatcher_.enqueue()
+            # прерванный COPY отменяется CopyFail (вне режима COPY сервер его игнорирует)
+            response_.abort = partial(self._send_copy_fail, 'COPY aborted by client')
+            async with response_:
+                return await self._send_copy_rows(query_context, records, encode_row, format_,
+                                                  chunk_size, response_)
+
+    async def _send_copy_rows(    # noqa: CFQ002
+        self,
+        query_context: QueryContext,
+        records: Union[Iterable, AsyncIterable],
+        encode_row: Callable,
+        format_: str,
+        chunk_size: int,
+        response_: PgResponse,
+    ) -> int:
+        await self._drain()
+        await self.__run_while_not_command_in((dbm.COPY_IN_RESPONSE, dbm.CONNECTION_READY),
                                               query_context=query_context)
+        if query_context.error is not None:
+            response_.abort = None
+            raise query_context.error
 
-        return query_context
+        try:
+            buffer_ = bytearray(COPY_BINARY_HEADER if format_ == 'binary' else b'')
+            if isinstance(records, AsyncIterable):
+                async for record in records:
+                    buffer_.extend(encode_row(record))
+                    if len(buffer_) >= chunk_size:
+                        await self._send_copy_data(buffer_)
+            else:
+                for record in records:
+                    buffer_.extend(encode_row(record))
+                    if len(buffer_) >= chunk_size:
+                        await self._send_copy_data(buffer_)
+
+            if format_ == 'binary':
+                buffer_.extend(COPY_BINARY_TRAILER)
+            await self._send_copy_data(buffer_)
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            # ошибка в данных клиента: сообщаем серверу об отмене COPY и дочитываем ответ
+            self._send_copy_fail(str(e))
+            response_.abort = None
+            await self._drain()
+            await self.__run_while_not_command_in((dbm.CONNECTION_READY, ),
+                                                  query_context=QueryContext())
+            raise
+
+        self._write_message(dbm.COPY_DONE, b'')
+        response_.abort = None
+        await self._drain()
+        await self._handle_query_result_messages(query_context=query_context)
+
+        return max(query_context.rows_count, 0)
+
+    def _send_copy_fail(self, message: str) -> None:
+        self._write_message(dbm.COPY_FAIL, message.encode(self._client_encoding) + NULL_BYTE)
+
+    async def _send_copy_data(self, buffer_: bytearray):
+        if buffer_:
+            self._write_message(dbm.COPY_DATA, bytes(buffer_))
+            buffer_.clear()
+            await self._drain()
+
+    async def _make_copy_binary_encoder(self, table: str, columns: Sequence[str],
+                                        schema: Optional[str]) -> Callable:
+        """ Бинарный COPY требует точных типов колонок - берем их из pg_attribute """
+        table_name = qualified_name(table, schema)
+        table_columns = await self._run_query_with_params(
+            'SELECT attname::text, atttypid::int8 FROM pg_catalog.pg_attribute '
+            'WHERE attrelid = $1::regclass AND attnum > 0 AND NOT attisdropped ORDER BY attnum',
+            (table_name, ))
+        column_types = dict(table_columns.rows or [])
+
+        encoders = []
+        for column in columns or list(column_types):
+            try:
+                type_oid = column_types[column]
+            except KeyError:
+                raise CustomDbError(f'колонка {column} не найдена в таблице {table_name}')
+            try:
+                encoders.append(PG_BINARY_ENCODERS[type_oid])
+            except KeyError:
+                raise CustomDbError(
+                    f'нет бинарного кодировщика для колонки {column} (oid {type_oid}), '
+                    'используйте текстовый формат COPY')
+
+        return make_binary_row_encoder(encoders)
+
+    def copy_out_iter(self, query: str, format_: str = 'text', header: bool = False) -> PgCopyOut:
+        """
+        Выгрузка результата запроса через COPY (query) TO STDOUT порциями байт:
+
+            async for chunk in connection.copy_out_iter('select * from links.stats', 'csv'):
+                ...
+
+        Данные не разбираются на строки и значения, порции отдаются как есть
+        """
+        return PgCopyOut(self, copy_to_stdout_stmt(query, format_, header))
+
+    async def copy_out(self, query: str, sink: Any, format_: str = 'text',
+                       header: bool = False) -> int:
+        """
+        Выгрузка результата запроса в sink - файл (или любой объект с методом write)
+        либо функцию/корутину, принимающую порцию байт. Возвращает количество строк
+        """
+        if self._query_hooks:
+            return await self._run_with_hooks(copy_to_stdout_stmt(query, format_, header),
+                                              self._copy_out(query, sink, format_, header))
+        return await self._copy_out(query, sink, format_, header)
+
+    async def _copy_out(self, query: str, sink: Any, format_: str, header: bool) -> int:
+        write = getattr(sink, 'write', sink)
+        async with self.copy_out_iter(query, format_, header) as copy_:
+            async for chunk in copy_:
+                written = write(chunk)
+                if inspect.isawaitable(written):
+                    await written
+        return copy_.rows_count
+
+    async def _start_copy_out(self, query_context: QueryContext
+                              ) -> tuple[Optional[object], PgResponse]:
+        """ Возвращает ключ монопольного режима и ответ, которые держит PgCopyOut до close() """
+        exclusive_ = await self._start_stream()
+        bytes_sent_ = self._bytes_sent
+        try:
+            self._send_command_QUERY(query_context.stmt)
+            # запись в монопольном режиме идет мимо _Writing - учитываем ее здесь
+            event_ = current_query_event.get()
+            if event_ is not None:
+                event_.bytes_sent += self._bytes_sent - bytes_sent_
+        except BaseException:
+            self._dispatcher.unlock_write()
+            self._dispatcher.release(exclusive_)
+            raise
+        response_ = self._dispatcher.enqueue()
+
+        try:
+            await response_.wait()
+            await self._drain()
+            await self.__run_while_not_command_in((dbm.COPY_OUT_RESPONSE, dbm.CONNECTION_READY),
+                                                  query_context=query_context)
+            if query_context.error is not None:
+                raise query_context.error
+        except BaseException:
+            self._dispatcher.end_stream(response_, exclusive_)
+            raise
+        query_context.rows = []
+        return exclusive_, response_
+
+    async def _start_stream(self, flush_transaction: bool = False) -> Optional[object]:
+        """
+        Монопольный режим и право записи на все время чтения курсора (COPY TO STDOUT):
+        ответ читается частями между вызовами, чужие запросы ждут закрытия курсора
+        """
+        exclusive_ = await self._dispatcher.acquire()
+        try:
+            await self._before_request()
+            if flush_transaction:
+                await self._flush_transaction_commands()
+            await self._dispatcher.lock_write()
+        except BaseException:
+            self._dispatcher.release(exclusive_)
+            raise
+        return exclusive_
+
+    async def _read_copy_data(self, query_context: QueryContext, chunk_size: int) -> bool:
+        """
+        Чтение CopyData в query_context.rows: все сообщения, уже лежащие в буфере,
+        но не больше chunk_size байт. Возвращает False, когда данные закончились
+        """
+        size_ = 0
+        while size_ < chunk_size:
+            message_ = self._messages.next_message()
+            if message_ is None:
+                if size_:
+                    return True
+                message_ = await self._messages.read_message()
+            code_, payload_ = message_
+
+            await self._message_handlers[code_](payload_, query_context=query_context)
+            if code_ != dbm.COPY_DATA:
+                return code_ not in (dbm.COPY_DONE, dbm.ERROR_RESPONSE, dbm.CONNECTION_READY)
+            size_ += len(payload_)
+
+        return True
+
+    def cursor(self, stmt: str, *params, prefetch: int = 100, oids: tuple = ()) -> PgCursor:
+        """
+        Построчная выборка результата порциями по prefetch строк:
+
+            async for row in connection.cursor('select * from t where id=$1', 1, prefetch=500):
+                ...
+
+        Пока курсор не дочитан, соединение занято им, следующий запрос сначала закрывает курсор
+        """
+        return PgCursor(self, stmt, params, oids=oids, prefetch=prefetch)
+
+    def transaction(self, isolation: Optional[str] = None, readonly: bool = False,
+                    deferrable: bool = False) -> PgTransaction:
+        """
+        Явная транзакция, вложенный вызов создает точку сохранения:
+
+            async with connection.transaction(isolation='serializable') as transaction_:
+                await connection.run_query('update t set x=1 where id=$1', 1)
+                await transaction_.run_query('insert into log values($1)', 1, commit=True)
+
+        isolation - read_committed / repeatable_read / serializable
+        """
+        return PgTransaction(self, isolation, readonly, deferrable)
+
+    def pipeline(self) -> PgPipeline:
+        """
+        Пакетное выполнение запросов за один round trip:
+
+            async with connection.pipeline() as pipeline_:
+                count_ = pipeline_.run('select count(*) from t where id=$1', 1)
+                rows_ = pipeline_.run('select * from t where id=$1', 1)
+            count_.result(), rows_.result()
+        """
+        return PgPipeline(self)
+
+    def add_query_hook(self, hook: QueryHook) -> None:
+        """ Без обработчиков запросы выполняются без замеров и счетчиков времени """
+        self._query_hooks.append(hook)
+
+    def remove_query_hook(self, hook: QueryHook) -> None:
+        self._query_hooks.remove(hook)
+
+    async def _run_with_hooks(self, stmt: str, query: Awaitable):
+        """ Выполнение запроса с замерами для QueryHook """
+        hooks_ = tuple(self._query_hooks)
+        for hook in hooks_:
+            self._call_hook(hook.before_query, stmt)
+
+        # счетчики события копят запись и чтение этого запроса (см. PgResponse, _Writing):
+        # разница общих счетчиков соединения учла бы и одновременные запросы других задач
+        event = QueryEvent(stmt)
+        event_token_ = current_query_event.set(event)
+        self._instrumented += 1
+        self._message_handlers[dbm.DATA_ROW] = self._handle_DATA_ROW_timed
+        started_ = perf_counter()
+        try:
+            return await query
+        except BaseException as e:
+            event.error = e
+            raise
+        finally:
+            event.duration = perf_counter() - started_
+            current_query_event.reset(event_token_)
+            self._instrumented -= 1
+            if not self._instrumented:
+                self._message_handlers[dbm.DATA_ROW] = self._handle_DATA_ROW
+            for hook in hooks_:
+                self._call_hook(hook.after_query, event)
+
+    def _read_counters(self) -> tuple[int, float, int]:
+        """ Строки, время их разбора и байты разобранных сообщений - для QueryEvent """
+        messages_ = self._messages
+        return self._rows_decoded, self._decode_time, \
+            messages_.bytes_consumed if messages_ is not None else 0
+
+    def _call_hook(self, callback: Callable, *args) -> None:
+        try:
+            callback(self, *args)
+        except Exception:    # noqa B902
+            # ошибка в обработчике метрик не должна ломать запрос
+            logger.exception('ошибка в обработчике запроса')
+
+    async def run_with_timeout(self, query: Awaitable, timeout: Optional[float]):
+        """
+        Выполнение запроса с ограничением времени. По истечении timeout серверу уходит
+        CancelRequest, ответ (ошибка 57014) дочитывается до ReadyForQuery,
+        поэтому соединение остается пригодным для следующих запросов.
+        Если сервер не ответил и через CANCEL_GRACE_PERIOD, соединение разрывается
+        """
+        if timeout is None:
+            return await query
+
+        # CancelRequest отменяет то, что сервер выполняет в данный момент, - на время запроса
+        # соединение захватывается монопольно, иначе отмена может попасть в чужой запрос
+        try:
+            exclusive_ = await self._dispatcher.acquire()
+        except BaseException:
+            if inspect.iscoroutine(query):
+                query.close()
+            raise
+
+        loop = asyncio.get_running_loop()
+        cancel_task: Optional[asyncio.Task] = None
+
+        def on_timeout():
+            nonlocal cancel_task
+            cancel_task = loop.create_task(self.cancel())
+
+        timer = loop.call_later(timeout, on_timeout)
+        try:
+            return await asyncio.wait_for(query, timeout + CANCEL_GRACE_PERIOD)
+        except asyncio.TimeoutError:
+            # состояние протокола неизвестно - соединение больше не используется
+            self._writer.close()
+            raise QueryTimeoutError(f'запрос не завершился за {timeout} сек. и после отмены')
+        except PgServerError as e:
+            if cancel_task is not None and e.sqlstate == QUERY_CANCELED:
+                raise QueryTimeoutError(f'запрос отменен по таймауту {timeout} сек.') from e
+            raise
+        finally:
+            timer.cancel()
+            try:
+                if cancel_task is not None:
+                    # отмена должна дойти до сервера до следующего запроса, иначе прервет его
+                    try:
+                        await cancel_task
+                    except (OSError, CustomDbError) as e:
+                        logger.warning(f'не удалось отправить CancelRequest: {e}')
+            finally:
+                self._dispatcher.release(exclusive_)
+
+    async def cancel(self) -> None:
+        """ Отмена выполняющегося запроса через отдельное соединение (CancelRequest) """
+        if self._backend_pid is None:
+            raise CustomDbError('сервер не передал BackendKeyData, отмена запроса невозможна')
+
+        reader, writer = await self._create_connection()
+        try:
+            writer.write(CPack(CharType.iiii).pack(
+                16, CANCEL_REQUEST_CODE, self._backend_pid, self._backend_secret))
+            await writer.drain()
+            # сервер закрывает соединение, обработав запрос
+            await reader.read()
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+    async def add_listener(self, channel: str, callback: Callable,
+                           on_lost: Optional[Callable] = None) -> None:
+        """
+        Подписка на уведомления NOTIFY канала channel.
+        callback(connection, pid, channel, payload) - обычная функция или корутина.
+        Пока есть подписки, соединение выделено под них: уведомления читаются в фоне
+        и доставляются сразу, а обычные запросы через такое соединение не выполняются.
+        on_lost(connection, error) вызывается при разрыве соединения: подписки теряются,
+        восстанавливать их нужно на новом соединении
+        """
+        if on_lost is not None:
+            self._on_listen_lost = on_lost
+        await self._stop_listening()
+        try:
+            if channel not in self._listeners:
+                await self.run_simple_query(f'LISTEN {quote_ident(channel)}')
+                self._listeners[channel] = []
+            self._listeners[channel].append(callback)
+        finally:
+            self._start_listening()
+
+    async def remove_listener(self, channel: str, callback: Callable) -> None:
+        callbacks = self._listeners.get(channel)
+        if not callbacks or callback not in callbacks:
+            return
+
+        await self._stop_listening()
+        try:
+            callbacks.remove(callback)
+            if not callbacks:
+                del self._listeners[channel]
+                await self.run_simple_query(f'UNLISTEN {quote_ident(channel)}')
+        finally:
+            self._start_listening()
+
+    def _start_listening(self) -> None:
+        if self._listeners and self._listen_task is None and not self.closed:
+            self._listen_task = asyncio.get_running_loop().create_task(self._listen())
+
+    async def _stop_listening(self) -> None:
+        task, self._listen_task = self._listen_task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _listen(self) -> None:
+        """ Фоновое чтение сообщений простаивающего соединения (уведомления, notice) """
+        try:
+            while True:
+                code_, data_ = await self._messages.read_message()
+                await self._message_handlers[code_](data_, query_context=self._query_context)
+        except (CustomDbError, OSError, EOFError) as e:
+            logger.error(f'соединение для LISTEN прервано: {e!r}')
+            # дальнейшее чтение невозможно: соединение закрывается, чтобы closed отражал это
+            self._writer.close()
+            if self._on_listen_lost is not None:
+                try:
+                    self._on_listen_lost(self, e)
+                except Exception:
+                    logger.exception('ошибка обработчика разрыва LISTEN')
 
     async def close(self):
         """ Закртыие TCP-соединения с БД """
+        await self._stop_listening()
         self._writer.close()
         await self._writer.wait_closed()
 
     async def _create_connection(self) -> tuple[StreamReader, StreamWriter]:
+        if self._unix_socket is not None:
+            return await asyncio.open_unix_connection(
+                unix_socket_path(self._unix_socket, self._port))
+
         reader, writer = await asyncio.open_connection(self._host, self._port)
+        self._socket_options.apply(writer.get_extra_info('socket'))
 
         return reader, writer
 
     async def __run_while_not_command_in(self, quit_commands: tuple, **kwarg):
         """ Выполняет комманды, пока не встретит указанные в агргументах """
 
-        packer_ = CPack(CharType.ci)
-
         code_ = None
         while code_ not in quit_commands:    # крутим, пока не получим статус ГОТОВ или ОШИБКА
 
-            code_, data_len_ = packer_.unpack(await self._reader.read(5))
-            logger.debug(f'code: {code_}, data_len:{data_len_} ')
+            # сначала разбираем то, что уже прочитано из сокета, и только потом ждем новые данные
+            message_ = self._messages.next_message()
+            if message_ is None:
+                message_ = await self._messages.read_message()
+            code_, payload_ = message_
 
-            payload_ = await self._reader.read(data_len_ - 4)
-            logger.debug(f'payload:{payload_}')
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f'code: {code_}, data_len:{len(payload_)} ')
 
             await self._message_handlers[code_](payload_, **kwarg)
 
@@ -226,14 +1103,31 @@ class PgCoreConnect(AbstractDbConnect):
 
         return encoded_init_params
 
+    async def _drain(self) -> None:
+        self._flush_writes()
+        await self._writer.drain()
+
     def _write_message(self, type_: bytes, data: bytes):
-        """ Запись бинарных данных в сокет (без отправки) """
+        """ Запись сообщения в буфер соединения (без отправки), см. _flush_writes """
 
+        if self._writer is None:
+            raise CustomDbError('connection is closed')
+        self._write_buffer += type_
+        self._write_buffer += packer_i.pack(len(data) + 4)
+        self._write_buffer += data
+        self._bytes_sent += len(data) + 5
+
+    def _flush_writes(self) -> None:
+        """
+        Передача накопленных сообщений транспорту одной записью: каждая запись
+        в пустой буфер транспорта - отдельный send(), а запрос - это несколько сообщений
+        """
+        if not self._write_buffer:
+            return
+        # транспорт может держать ссылку на переданный буфер - не очищаем его, а заменяем
+        data_, self._write_buffer = self._write_buffer, bytearray()
         try:
-            self._writer.write(type_)
-            packed_data_ = CPack(CharType.i).pack(len(data) + 4)
-            self._writer.write(packed_data_)
-            self._writer.write(data)
+            self._writer.write(data_)
         except ValueError as e:
             if str(e) == 'write to closed file':
                 raise CustomDbError('connection is closed')
@@ -261,16 +1155,43 @@ class PgCoreConnect(AbstractDbConnect):
         pwd = b'md5' + md5(string=md5_user_password + salt).hexdigest().encode('ascii')
 
         self._write_message(dbm.PASSWORD, pwd + NULL_BYTE)
-        await self._writer.drain()
+        await self._drain()
 
-    async def _authenticate_by_plain_password(self):
+    async def _authenticate_by_plain_password(self, data):
         """ Аутентификация по паролю в открытом текстовом виде """
 
         if self._password is None:
             raise CustomDbError('Тербуется пароль, но отсутствует')
 
         self._write_message(dbm.PASSWORD, self._encoded_password + NULL_BYTE)
-        await self._writer.drain()
+        await self._drain()
+
+    async def _authenticate_by_sasl(self, data):
+        """ Начало обмена SCRAM-SHA-256: сервер перечисляет поддерживаемые механизмы """
+
+        mechanisms = [name.decode('ascii') for name in bytes(data[4:]).split(NULL_BYTE) if name]
+        if SCRAM_SHA_256 not in mechanisms:
+            raise CustomDbError(f'не поддерживаемые механизмы SASL: {", ".join(mechanisms)}')
+        if self._encoded_password is None:
+            raise CustomDbError('сервер требует SCRAM аутентификацию, но пароль не задан')
+
+        self._scram = ScramClient(self._encoded_password)
+        client_first = self._scram.client_first()
+        self._write_message(dbm.PASSWORD, SCRAM_SHA_256.encode('ascii') + NULL_BYTE
+                            + packer_i.pack(len(client_first)) + client_first)
+        await self._drain()
+
+    async def _authenticate_by_sasl_continue(self, data):
+        if self._scram is None:
+            raise CustomDbError('SCRAM: неожиданное сообщение сервера')
+        self._write_message(dbm.PASSWORD, self._scram.client_final(data[4:]))
+        await self._drain()
+
+    async def _authenticate_by_sasl_final(self, data):
+        if self._scram is None:
+            raise CustomDbError('SCRAM: неожиданное сообщение сервера')
+        self._scram.verify_server_final(data[4:])
+        self._scram = None
 
     async def _handle_AUTHENTICATION_REQUEST(self, data):
         """ Обработка запросов на аутентификацию """
@@ -280,13 +1201,37 @@ class PgCoreConnect(AbstractDbConnect):
         logger.debug(f'auth_code: {auth_type}')
 
         # на основании типа выбираем обработчик из словаря и запускаем связанный метод
-        await self._authenticate_handlers[auth_type](data)
+        handler_ = self._authenticate_handlers.get(auth_type)
+        if handler_ is None:
+            raise CustomDbError(f'не поддерживаемый способ аутентификации: {auth_type}')
+        await handler_(data)
 
     async def _handle_CONNECTION_READY(self, data, **kwargs):
-        self._transaction_status = data
+        self._transaction_status = bytes(data)
+        self._round_trips += 1
 
     async def _handle_ROW_DESCRIPTION(self, data, query_context: QueryContext):
         """ Функция-обработчика метаданных результата запроса """
+        data = bytes(data)
+        description = self._row_descriptions.get(data)
+        if description is None:
+            description = self._parse_row_description(data)
+            if len(self._row_descriptions) >= ROW_DESCRIPTIONS_CACHE_SIZE:
+                del self._row_descriptions[next(iter(self._row_descriptions))]
+            self._row_descriptions[data] = description
+
+        columns, type_converters, result_formats, record_index, row_decoder = description
+        query_context.columns = columns
+        query_context.type_converters = type_converters
+        query_context.result_formats = result_formats
+        query_context.record_index = record_index
+        query_context.row_decoder = row_decoder
+
+        if columns and query_context.rows is None:
+            query_context.rows = []
+
+    def _parse_row_description(self, data: bytes) -> tuple:
+        """ Колонки, конвертеры, форматы, индекс колонок и функция разбора DataRow """
         packer_h = CPack(CharType.h)
         packer_ihihih = CPack(CharType.ihihih)
 
@@ -298,63 +1243,110 @@ class PgCoreConnect(AbstractDbConnect):
         for _ in range(columns_count):
             name = data[idx:data.find(NULL_BYTE, idx)]
             idx += len(name) + 1
-            field = dict(
-                zip(
-                    (
-                        'table_oid',
-                        'column_attrnum',
-                        'type_oid',
-                        'type_size',
-                        'type_modifier',
-                        'format',
-                    ),
-                    packer_ihihih.unpack(data, idx),
-                ))
-
-            field['name'] = name.decode(self._client_encoding)    # type: ignore
-
+            column = PgColumn(name.decode(self._client_encoding),
+                              *packer_ihihih.unpack(data, idx))
             idx += 18
 
-            columns.append(field)
+            columns.append(column)
 
-            oid = field['type_oid']
-            convert_func = self._postgres_types[oid]
+            if column.format:
+                convert_func = self._postgres_binary_types[column.type_oid]
+            else:
+                convert_func = self._postgres_types[column.type_oid]
             type_convert_functions.append(convert_func)
 
-        query_context.columns = columns
-        query_context.type_converters = type_convert_functions
-
-        if columns and query_context.rows is None:
-            query_context.rows = []
+        result_formats = tuple(column.format for column in columns)
+        return (columns, type_convert_functions, result_formats, make_record_index(columns),
+                make_row_decoder(type_convert_functions, result_formats, self._client_encoding))
 
     def _send_command_QUERY(self, stmt: str):
         """ запись запроса в поток (сокет) """
+        if self._transaction_commands:
+            stmt = ';'.join(self._transaction_commands) + ';' + stmt
+            self._transaction_commands.clear()
+        if self._transaction_epilogue is not None:
+            # перевод строки завершает возможный однострочный комментарий в конце запроса
+            stmt = f'{stmt}\n;{self._transaction_epilogue}'
+            self._transaction_epilogue = None
 
         self._write_message(dbm.QUERY, stmt.encode(self._client_encoding) + NULL_BYTE)
 
-    async def _handle_DATA_ROW(self, data, query_context: QueryContext):
-        logger.debug(data)
-
-        idx = 2
-        row = []
-        packer = CPack(CharType.i)
-
-        for type_converter in query_context.type_converters:
-            value_len = packer.unpack(data, idx)[0]
-            idx += 4
-            if value_len == -1:
-                value = None
-            else:
-
-                value = type_converter(
-                    str(data[idx:idx + value_len], encoding=self._client_encoding))
-                idx += value_len
-            row.append(value)
+    def _send_transaction_commands(self, commands: Optional[list[str]] = None):
+        """
+        Parse + Bind + Execute безымянного statement'а для каждой команды управления
+        транзакцией, без Sync: они выполняются в одном пакете с соседним запросом
+        """
+        if commands is None:
+            commands, self._transaction_commands = self._transaction_commands, []
+        for command_ in commands:
+            self._send_command_PARSE(b'', command_)
+            self._send_command_BIND(b'', ())
+            self._send_command_EXECUTE()
+
+    async def _flush_transaction_commands(self):
+        """ Отдельная отправка отложенных команд транзакции """
+        if self._transaction_commands:
+            # список забирается до отправки: иначе _send_command_QUERY добавит его еще раз
+            commands_, self._transaction_commands = self._transaction_commands, []
+            await self.run_simple_query(';'.join(commands_))
 
-        query_context.rows.append(row)    # type: ignore
-
-    async def _handle_query_result_messages(self, **kwarg):
-        await self.__run_while_not_command_in((dbm.CONNECTION_READY, ), **kwarg)
+    async def _handle_DATA_ROW(self, data, query_context: QueryContext):
+        if query_context.columnar is not None:
+            query_context.columnar.add_row(data)
+            return
+
+        query_context.rows.append(    # type: ignore
+            Record(query_context.row_decoder(data), query_context.record_index))
+
+    async def _handle_DATA_ROW_timed(self, data, query_context: QueryContext):
+        """ Обработчик DataRow на время запроса с QueryHook: считает строки и время разбора """
+        started_ = perf_counter()
+        await self._handle_DATA_ROW(data, query_context)
+        self._decode_time += perf_counter() - started_
+        self._rows_decoded += 1
+
+    async def _read_portal_rows(self, query_context: QueryContext) -> bool:
+        """
+        Чтение очередной порции строк портала.
+        Возвращает True, если портал дочитан (CommandComplete) или запрос завершился ошибкой
+        """
+        self._portal_suspended = False
+        await self.__run_while_not_command_in(
+            (dbm.PORTAL_SUSPENDED, dbm.COMMAND_COMPLETE, dbm.EMPTY_QUERY_RESPONSE,
+             dbm.ERROR_RESPONSE),
+            query_context=query_context)
+        return self._portal_suspended is False
+
+    async def _before_request(self):
+        """ Ожидание конца чужого монопольного режима и закрытие своего недочитанного курсора """
+        await self._dispatcher.wait_exclusive()
+        await self._close_active_reader()
+
+    async def _skip_response(self) -> None:
+        """ Дочитывание (без разбора) ответа прерванного запроса до ReadyForQuery """
+        self._flush_writes()
+        while True:
+            message_ = self._messages.next_message()
+            if message_ is None:
+                message_ = await self._messages.read_message()
+            code_, payload_ = message_
+            if code_ == dbm.CONNECTION_READY:
+                await self._handle_CONNECTION_READY(payload_)
+                return
+
+    async def _close_active_reader(self):
+        """ Закрытие недочитанного курсора (или COPY TO STDOUT) перед следующим запросом """
+        if self._listen_task is not None:
+            raise CustomDbError('соединение выделено под LISTEN, запросы через него недоступны')
+        if self._active_reader is not None:
+            await self._active_reader.close()
+
+    async def _handle_query_result_messages(self, query_context: QueryContext):
+        """ Чтение ответа сервера до ReadyForQuery, ошибка сервера пробрасывается после него """
+        await self.__run_while_not_command_in((dbm.CONNECTION_READY, ),
+                                              query_context=query_context)
+        if query_context.error is not None:
+            raise query_context.error
 
     async def _handle_command_COMPLITE(self, data, query_context: QueryContext):
         if self._transaction_status == dbm.IN_FAILED_TRANSACTION and query_context.stmt:
@@ -362,7 +1354,7 @@ class PgCoreConnect(AbstractDbConnect):
             if sql != 'ROLLBACK':
                 raise CustomDbError('Не верный блок транзакций')
 
-        values = data[:-1].split(b' ')
+        values = bytes(data[:-1]).split(b' ')
         try:
             rows_count = int(values[-1])
             if query_context.rows_count == -1:
@@ -372,25 +1364,25 @@ class PgCoreConnect(AbstractDbConnect):
         except ValueError:
             pass
 
-    def _send_command_PARSE(self, statement_name_bin, statement, oids=()):
+    def _send_command_PARSE(self, statement_name_bin: bytes, statement: str, oids=()):
         packer_i = CPack(CharType.i)
         packer_h = CPack(CharType.h)
 
-        value = bytearray(statement_name_bin)
+        value = bytearray(statement_name_bin + NULL_BYTE)
         value.extend(statement.encode(self._client_encoding) + NULL_BYTE)
         value.extend(packer_h.pack(len(oids)))
         for oid in oids:
             value.extend(packer_i.pack(0 if oid == -1 else oid))
 
         self._write_message(dbm.PARSE, value)
-        self._writer.write(dbm.FLUSH + packer_i.pack(len(b'') + 4) + b'')
 
-    def _send_command_BIND(self, stmt_name: bytes, params: tuple):
+    def _send_command_BIND(self, stmt_name: bytes, params: tuple, result_formats: tuple = ()):
 
         packer_h = CPack(CharType.h)
         packer_i = CPack(CharType.i)
         """ https://www.postgresql.org/docs/current/protocol-message-formats.html """
-        retval = bytearray(NULL_BYTE + stmt_name + packer_h.pack(0) + packer_h.pack(len(params)))
+        retval = bytearray(NULL_BYTE + stmt_name + NULL_BYTE + packer_h.pack(0)
+                           + packer_h.pack(len(params)))
 
         for param in params:
             if param is None:
@@ -400,25 +1392,47 @@ class PgCoreConnect(AbstractDbConnect):
                 retval.extend(packer_i.pack(len(param)))
                 retval.extend(param)
 
-        retval.extend(packer_h.pack(0))
+        # без бинарных колонок достаточно одного нулевого счетчика - весь результат в тексте
+        if any(result_formats):
+            retval.extend(packer_h.pack(len(result_formats)))
+            for format_ in result_formats:
+                retval.extend(packer_h.pack(format_))
+        else:
+            retval.extend(packer_h.pack(0))
 
         self._write_message(dbm.BIND, retval)
-        self._writer.write(dbm.FLUSH + packer_i.pack(len(b'') + 4) + b'')
 
     def _send_command_DESCRIBE_STATEMENT(self, stmt_name: bytes):
-        packer_i = CPack(CharType.i)
+        self._write_message(dbm.DESCRIBE, dbm.STATEMENT + stmt_name + NULL_BYTE)
+
+    def _send_command_DESCRIBE_PORTAL(self, portal_name: bytes = b''):
+        self._write_message(dbm.DESCRIBE, dbm.PORTAL + portal_name + NULL_BYTE)
 
-        self._write_message(dbm.DESCRIBE, dbm.STATEMENT + stmt_name)
-        self._writer.write(dbm.FLUSH + packer_i.pack(len(b'') + 4) + b'')
+    def _send_command_CLOSE_STATEMENT(self, stmt_name: bytes):
+        self._write_message(dbm.CLOSE, dbm.STATEMENT + stmt_name + NULL_BYTE)
 
-    def _send_command_EXECUTE(self):
+    def _send_pending_CLOSE(self):
+        """ Закрытие вытесненных из кэша statement'ов, уходит вместе со следующим запросом """
+        for stmt_name in self._statements_to_close:
+            self._send_command_CLOSE_STATEMENT(stmt_name)
+        self._statements_to_close.clear()
+
+    def _send_command_SYNC(self):
+        self._write_message(dbm.SYNC, b'')
+
+    def _send_command_EXECUTE(self, max_rows: int = 0):
         """ https://www.postgresql.org/docs/current/protocol-message-formats.html """
 
         packer_i = CPack(CharType.i)
 
         data_ = packer_i.pack(len(NULL_BYTE + packer_i.pack(0)) + 4)
-        self._writer.write(dbm.EXECUTE + data_ + NULL_BYTE + packer_i.pack(0))
-        self._writer.write(dbm.FLUSH + packer_i.pack(len(b'') + 4) + b'')
+        if self._writer is None:
+            raise CustomDbError('connection is closed')
+        self._write_buffer += dbm.EXECUTE + data_ + NULL_BYTE + packer_i.pack(max_rows)
+        self._bytes_sent += 10
+
+    def _send_command_FLUSH(self):
+        self._write_message(dbm.FLUSH, b'')
 
     async def _handle_PARAMETER_DESCRIPTION(self, *args, **kwarg):
         pass
@@ -432,12 +1446,97 @@ class PgCoreConnect(AbstractDbConnect):
     async def _handle_PARSE_COMPLETE(self, *args, **kwarg):
         pass
 
-    async def _handle_PARAMETER_STATUS(self, *args):
+    async def _handle_CLOSE_COMPLETE(self, *args, **kwarg):
         pass
 
-    async def _handle_BACKEND_KEY_DATA(self, *args):
+    async def _handle_PORTAL_SUSPENDED(self, *args, **kwarg):
+        self._portal_suspended = True
+
+    async def _handle_EMPTY_QUERY_RESPONSE(self, *args, **kwarg):
         pass
 
+    async def _handle_COPY_IN_RESPONSE(self, *args, **kwarg):
+        pass
+
+    async def _handle_COPY_OUT_RESPONSE(self, *args, **kwarg):
+        pass
+
+    async def _handle_COPY_DATA(self, data, query_context: QueryContext):
+        query_context.rows.append(data)    # type: ignore
+
+    async def _handle_COPY_DONE(self, *args, **kwarg):
+        pass
+
+    async def _handle_ERROR_RESPONSE(self, data, query_context: Optional[QueryContext] = None):
+        """ Ошибка запоминается в контексте запроса и пробрасывается после ReadyForQuery """
+        fields = {}
+        for field_ in bytes(data).split(NULL_BYTE):
+            if field_:
+                fields[chr(field_[0])] = field_[1:].decode(self._client_encoding, 'replace')
+
+        error = PgServerError(fields)
+        if query_context is None:
+            raise error
+        if query_context.error is None:
+            query_context.error = error
+
+    async def _handle_NOTICE_RESPONSE(self, data, **kwarg):
+        logger.info(f'notice: {bytes(data).decode(self._client_encoding, "replace")}')
+
+    async def _handle_NOTIFICATION_RESPONSE(self, data, **kwarg):
+        """ Асинхронное уведомление: pid отправителя, канал, payload """
+        data = bytes(data)
+        pid = CPack(CharType.i).unpack(data)[0]
+        channel, payload = data[4:].split(NULL_BYTE)[:2]
+        channel_ = channel.decode(self._client_encoding)
+        payload_ = payload.decode(self._client_encoding)
+
+        loop = asyncio.get_running_loop()
+        for callback in list(self._listeners.get(channel_, ())):
+            if inspect.iscoroutinefunction(callback):
+                loop.create_task(callback(self, pid, channel_, payload_))
+            else:
+                loop.call_soon(callback, self, pid, channel_, payload_)
+
+    async def _handle_PARAMETER_STATUS(self, data, **kwarg):
+        name_, value_, _ = bytes(data).split(NULL_BYTE, 2)
+        if name_ == b'TimeZone':
+            self._set_session_timezone(value_.decode(self._client_encoding))
+
+    def _set_session_timezone(self, timezone_name: str) -> None:
+        """
+        timestamptz в текстовом формате приходит в часовом поясе сессии, а в бинарном - в UTC.
+        Первое выполнение prepared statement'а идет в текстовом формате, следующие - в бинарном,
+        поэтому бинарный декодер переводит значения в пояс сессии, а если пояс неизвестен
+        zoneinfo - timestamptz читается только в текстовом формате
+        """
+        if timezone_name == self._session_timezone:
+            return
+        changed_ = self._session_timezone is not None
+        self._session_timezone = timezone_name
+
+        binary_types_ = self._postgres_binary_types
+        recv_ = make_timestamptz_recv(timezone_name)
+        if recv_ is None:
+            logger.warning(f'часовой пояс {timezone_name} не найден, '
+                           f'timestamptz читается в текстовом формате')
+            binary_types_.pop(pt.TIMESTAMPTZ, None)
+        else:
+            binary_types_[pt.TIMESTAMPTZ] = recv_
+        # элементы бинарных массивов декодируются общими декодерами (в UTC)
+        if recv_ is PG_BINARY_TYPES[pt.TIMESTAMPTZ]:
+            binary_types_[pt.TIMESTAMPTZ_ARRAY] = PG_BINARY_TYPES[pt.TIMESTAMPTZ_ARRAY]
+        else:
+            binary_types_.pop(pt.TIMESTAMPTZ_ARRAY, None)
+
+        if changed_:
+            # SET TIME ZONE посреди сессии: описания результатов собраны со старыми декодерами
+            self._row_descriptions.clear()
+            self._statements.reset_descriptions()
+
+    async def _handle_BACKEND_KEY_DATA(self, data, **kwarg):
+        self._backend_pid, self._backend_secret = CPack(CharType.ii).unpack(data)
+
     async def __aenter__(self):
         await asyncio.sleep(0)
         return self
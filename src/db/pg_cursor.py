@@ -0,0 +1,134 @@
+from typing import TYPE_CHECKING, Optional
+
+from db.pg_converters import python_types_convert_to_pg_params
+from db.pg_errors import PgServerError
+from db.query_context import QueryContext
+from db.statement_cache import PreparedStatement
+
+if TYPE_CHECKING:
+    from db.pg_core_connect import PgCoreConnect
+    from db.pg_dispatcher import PgResponse
+
+
+class PgCursor:
+    """
+    Построчная выборка результата через портал с ограничением количества строк (Execute max_rows).
+    В памяти одновременно держится не больше prefetch строк.
+    Открытый курсор держит соединение монопольно: запросы других задач ждут его закрытия
+    """
+
+    def __init__(self, connection: 'PgCoreConnect', stmt: str, params: tuple = (),
+                 oids: tuple = (), prefetch: int = 100) -> None:
+        if prefetch <= 0:
+            raise ValueError('prefetch должен быть больше 0')
+
+        self._connection = connection
+        self._query_context = QueryContext(stmt)
+        self._params = python_types_convert_to_pg_params(params)
+        self._oids = oids
+        self._prefetch = prefetch
+
+        self._statement: Optional[PreparedStatement] = None
+        self._is_new = False
+        # ключ монопольного режима соединения и ответ, читаемый частями до close()
+        self._exclusive: Optional[object] = None
+        self._response: Optional['PgResponse'] = None
+        self._rows: list = []
+        self._pos = 0
+        self._started = False
+        self._portal_done = False
+        self._closed = False
+
+    @property
+    def columns(self) -> Optional[list]:
+        return self._query_context.columns
+
+    def __aiter__(self) -> 'PgCursor':
+        return self
+
+    async def __anext__(self):
+        while self._pos >= len(self._rows):
+            if self._portal_done or self._closed:
+                await self.close()
+                raise StopAsyncIteration
+            await self._fetch()
+
+        row = self._rows[self._pos]
+        self._pos += 1
+        return row
+
+    async def fetch(self) -> list:
+        """ Следующая порция строк (пустой список - строк больше нет) """
+        if self._pos >= len(self._rows) and not (self._portal_done or self._closed):
+            await self._fetch()
+
+        rows_ = self._rows[self._pos:]
+        self._rows, self._pos = [], 0
+        if not rows_:
+            await self.close()
+        return rows_
+
+    async def close(self) -> None:
+        """ Sync: закрывает портал и завершает неявную транзакцию запроса """
+        if self._closed:
+            return
+        self._closed = True
+
+        connection_ = self._connection
+        if connection_._active_reader is self:
+            connection_._active_reader = None
+
+        if not self._started:
+            return
+
+        try:
+            connection_._send_command_SYNC()
+            await self._response.wait()    # type: ignore
+            await connection_._drain()
+            await connection_._handle_query_result_messages(query_context=self._query_context)
+        except PgServerError as e:
+            if self._is_new or connection_._is_stale_statement_error(e):
+                connection_._invalidate_statement(self._statement)    # type: ignore
+            raise
+        finally:
+            connection_._dispatcher.end_stream(self._response, self._exclusive)    # type: ignore
+
+    async def _fetch(self) -> None:
+        connection_ = self._connection
+        query_context = self._query_context
+
+        if not self._started:
+            # портал читается до первого CommandComplete - BEGIN должен уйти раньше
+            self._exclusive = await connection_._start_stream(flush_transaction=True)
+            try:
+                self._statement, self._is_new = connection_._send_prepared(
+                    query_context, self._params, self._oids, max_rows=self._prefetch,
+                    sync=False)
+            except BaseException:
+                connection_._dispatcher.unlock_write()
+                connection_._dispatcher.release(self._exclusive)
+                raise
+            self._response = connection_._dispatcher.enqueue()
+            connection_._active_reader = self
+            self._started = True
+            await self._response.wait()
+        else:
+            connection_._send_command_EXECUTE(self._prefetch)
+            connection_._send_command_FLUSH()
+        await connection_._drain()
+
+        self._portal_done = await connection_._read_portal_rows(query_context)
+        if query_context.error is not None:
+            await self.close()
+
+        connection_._describe_statement(self._statement, query_context)    # type: ignore
+
+        self._rows, self._pos = query_context.rows or [], 0
+        if query_context.columns:
+            query_context.rows = []
+
+    async def __aenter__(self) -> 'PgCursor':
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback) -> None:
+        await self.close()
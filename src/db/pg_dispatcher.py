@@ -0,0 +1,243 @@
+import asyncio
+import logging
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Callable, Optional
+
+from db.pg_errors import CustomDbError
+from db.pg_metrics import QueryEvent, current_query_event
+
+if TYPE_CHECKING:
+    from db.pg_core_connect import PgCoreConnect
+
+logger = logging.getLogger(__name__)
+
+# монопольные режимы соединений, которыми владеет текущий контекст (задача и ее дочерние задачи)
+_exclusive_owners: ContextVar[frozenset] = ContextVar('pg_exclusive_owners', default=frozenset())
+
+
+class PgResponse:
+    """
+    Место в очереди на чтение ответа сервера. Ответ на каждый запрос заканчивается
+    одним ReadyForQuery, ответы читаются строго в порядке отправки запросов.
+    abort - синхронная запись, завершающая прерванный запрос (Sync, CopyFail),
+    если ответ не дочитан из-за исключения (отмены задачи).
+    event - запрос с QueryHook, которому засчитывается прочитанное за время своей очереди
+    """
+
+    __slots__ = ('_dispatcher', '_previous', '_future', '_round_trips', '_counters', 'abort',
+                 'event')
+
+    def __init__(self, dispatcher: 'PgDispatcher', previous: Optional[asyncio.Future],
+                 future: asyncio.Future) -> None:
+        self._dispatcher = dispatcher
+        self._previous = previous
+        self._future = future
+        self._round_trips = 0
+        self._counters: Optional[tuple] = None
+        self.abort: Optional[Callable[[], None]] = None
+        self.event: Optional[QueryEvent] = current_query_event.get()
+
+    async def wait(self) -> None:
+        """ Ожидание, пока дочитаны ответы на все запросы, отправленные раньше """
+        previous = self._previous
+        if previous is not None:
+            if not previous.done():
+                # shield: отмена ожидающего не должна отменять чужую future
+                await asyncio.shield(previous)
+            self._previous = None
+        connection = self._dispatcher.connection
+        self._round_trips = connection._round_trips
+        if self.event is not None:
+            self._counters = connection._read_counters()
+
+    def done(self) -> None:
+        """ Ответ дочитан, очередь переходит к следующему запросу """
+        if not self._future.done():
+            self._future.set_result(None)
+        if self._dispatcher._tail is self._future:
+            self._dispatcher._tail = None
+
+    def abandon(self) -> None:
+        """ Ответ не нужен: он дочитывается (и отбрасывается) в фоне, чтобы не сбить очередь """
+        if self.abort is not None:
+            abort, self.abort = self.abort, None
+            try:
+                abort()
+                self._dispatcher.connection._flush_writes()
+            except CustomDbError:
+                pass
+        self._dispatcher._skip(self)
+
+    async def __aenter__(self) -> 'PgResponse':
+        try:
+            await self.wait()
+        except BaseException:
+            self.abandon()
+            raise
+        return self
+
+    def _account(self) -> None:
+        """ Прочитанное с начала своей очереди - в счетчики запроса """
+        if self._counters is None:
+            return
+        connection = self._dispatcher.connection
+        rows_, decode_time_, received_ = self._counters
+        rows, decode_time, received = connection._read_counters()
+        self._counters = None
+        event = self.event
+        event.rows += rows - rows_    # type: ignore
+        event.decode_time += decode_time - decode_time_    # type: ignore
+        event.bytes_received += received - received_    # type: ignore
+        event.round_trips += connection._round_trips - self._round_trips    # type: ignore
+
+    def finish(self) -> None:
+        self._account()
+        if self._previous is None \
+                and self._dispatcher.connection._round_trips > self._round_trips:
+            # ReadyForQuery получен (ошибка сервера пробрасывается уже после него)
+            self.done()
+        else:
+            self.abandon()
+
+    async def __aexit__(self, exc_type, exc, traceback) -> None:
+        self.finish()
+
+
+class PgDispatcher:
+    """
+    Очередь запросов одного соединения: корутины, работающие с соединением одновременно,
+    пишут запросы в сокет по очереди (без ожидания ответов на предыдущие - конвейером),
+    а ответы читают в порядке отправки.
+    Транзакция, курсор, COPY TO STDOUT и запрос с таймаутом захватывают соединение
+    монопольно (exclusive): запросы других задач ждут окончания монопольного режима,
+    а задачи, созданные внутри него (например, asyncio.gather), считаются его владельцами
+    """
+
+    def __init__(self, connection: 'PgCoreConnect') -> None:
+        self.connection = connection
+        # future чтения ответа на последний отправленный запрос
+        self._tail: Optional[asyncio.Future] = None
+        # запись, растянутая на несколько шагов (executemany, COPY, курсор), держит блокировку
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._owner: Optional[object] = None
+        self._released: Optional[asyncio.Event] = None
+        self._skip_tasks: set[asyncio.Task] = set()
+
+    @property
+    def busy(self) -> bool:
+        """ Есть недочитанные ответы, идет запись или соединение захвачено монопольно """
+        return self._tail is not None or self._owner is not None \
+            or self._write_lock is not None and self._write_lock.locked()
+
+    @property
+    def owned(self) -> bool:
+        """ Соединение захвачено монопольно текущим контекстом """
+        return self._owner is not None and self._owner in _exclusive_owners.get()
+
+    def enqueue(self) -> PgResponse:
+        """ Место в очереди на чтение ответа: вызывается вместе с записью запроса в сокет """
+        future = asyncio.get_running_loop().create_future()
+        response = PgResponse(self, self._tail, future)
+        self._tail = future
+        return response
+
+    async def wait_exclusive(self) -> None:
+        """ Ожидание окончания монопольного режима другого контекста """
+        while self._owner is not None and not self.owned:
+            await self._released.wait()    # type: ignore
+
+    async def lock_write(self) -> None:
+        while True:
+            await self.wait_exclusive()
+            if self._write_lock is None:
+                # блокировка создается при первом обращении, чтобы попасть в работающий loop
+                self._write_lock = asyncio.Lock()
+            await self._write_lock.acquire()
+            if self._owner is None or self.owned:
+                return
+            self._write_lock.release()
+
+    def unlock_write(self) -> None:
+        self._write_lock.release()    # type: ignore
+
+    def writing(self) -> '_Writing':
+        """ Право записи в сокет: async with dispatcher.writing(): ... """
+        return _Writing(self)
+
+    async def acquire(self) -> Optional[object]:
+        """
+        Монопольный режим: ждет окончания чужого монопольного режима, записи и чтения
+        ответов на уже отправленные запросы. Возвращает ключ для release
+        (None - текущий контекст уже владеет соединением)
+        """
+        await self.wait_exclusive()
+        if self.owned:
+            return None
+
+        token = self._owner = object()
+        self._released = asyncio.Event()
+        _exclusive_owners.set(_exclusive_owners.get() | {token})
+        try:
+            await self.lock_write()
+            self.unlock_write()
+            while self._tail is not None:
+                await asyncio.shield(self._tail)
+        except BaseException:
+            self.release(token)
+            raise
+        return token
+
+    def release(self, token: Optional[object]) -> None:
+        if token is None or self._owner is not token:
+            return
+        self._owner = None
+        self._released.set()    # type: ignore
+        _exclusive_owners.set(_exclusive_owners.get() - {token})
+
+    def end_stream(self, response: PgResponse, token: Optional[object]) -> None:
+        """ Конец чтения курсора (COPY TO STDOUT): освобождает очередь, запись и соединение """
+        try:
+            response.finish()
+        finally:
+            self.unlock_write()
+            self.release(token)
+
+    def _skip(self, response: PgResponse) -> None:
+        task = asyncio.get_running_loop().create_task(self._skip_response(response))
+        self._skip_tasks.add(task)
+        task.add_done_callback(self._skip_tasks.discard)
+
+    async def _skip_response(self, response: PgResponse) -> None:
+        try:
+            await response.wait()
+            await self.connection._skip_response()
+        except (CustomDbError, OSError) as e:
+            logger.warning(f'не удалось дочитать ответ прерванного запроса: {e}')
+        finally:
+            response.done()
+
+
+class _Writing:
+
+    __slots__ = ('_dispatcher', '_event', '_bytes_sent')
+
+    def __init__(self, dispatcher: PgDispatcher) -> None:
+        self._dispatcher = dispatcher
+        self._event = current_query_event.get()
+        self._bytes_sent = 0
+
+    async def __aenter__(self) -> PgDispatcher:
+        await self._dispatcher.lock_write()
+        # пока запись у этого запроса, в сокет пишет только он
+        self._bytes_sent = self._dispatcher.connection._bytes_sent
+        return self._dispatcher
+
+    async def __aexit__(self, exc_type, exc, traceback) -> None:
+        connection = self._dispatcher.connection
+        if self._event is not None:
+            self._event.bytes_sent += connection._bytes_sent - self._bytes_sent
+        # записанное уходит в сокет сразу, не дожидаясь очереди на чтение ответа
+        try:
+            connection._flush_writes()
+        finally:
+            self._dispatcher.unlock_write()
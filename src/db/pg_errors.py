@@ -0,0 +1,17 @@
+class CustomDbError(Exception):
+    pass
+
+
+class QueryTimeoutError(CustomDbError):
+    """ Запрос не уложился в timeout и был отменен (CancelRequest) """
+    pass
+
+
+class PgServerError(CustomDbError):
+    """ Ошибка, которую вернул сервер БД (ErrorResponse) """
+
+    def __init__(self, fields: dict[str, str]) -> None:
+        self.fields = fields
+        self.sqlstate = fields.get('C', '')
+        self.message = fields.get('M', '')
+        super().__init__(f'{fields.get("S", "ERROR")} {self.sqlstate}: {self.message}')
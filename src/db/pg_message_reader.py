@@ -0,0 +1,83 @@
+from asyncio.streams import StreamReader
+from struct import Struct
+from typing import Optional
+
+from db.pg_errors import CustomDbError
+
+header_struct = Struct('!ci')
+
+
+class PgMessageReader:
+    """
+    Буферизованное чтение сообщений протокола из сокета.
+    Данные читаются большими кусками, сообщения нарезаются из буфера через memoryview
+    без копирования, поэтому за одно чтение из сокета разбирается сразу много сообщений.
+    Буфер не переиспользуется: StreamReader на каждое чтение и так отдает новый bytes,
+    он и становится буфером, а копируется только недоразобранный хвост предыдущего.
+    Перезаписывать общий bytearray нельзя - выданные memoryview сообщений могут быть
+    еще в работе (а изменить размер bytearray с живыми memoryview не дает сам python)
+    """
+
+    def __init__(self, reader: StreamReader, chunk_size: int = 64 * 1024) -> None:
+        self._reader = reader
+        self._chunk_size = chunk_size
+        self._buffer = b''
+        self._view = memoryview(self._buffer)
+        self._pos = 0
+        # всего прочитано из сокета
+        self.bytes_received = 0
+
+    @property
+    def bytes_consumed(self) -> int:
+        """ Прочитано из сокета за вычетом еще не разобранного остатка буфера """
+        return self.bytes_received - len(self._buffer) + self._pos
+
+    def next_message(self) -> Optional[tuple[bytes, memoryview]]:
+        """ Следующее сообщение из уже прочитанных данных или None, если его еще нет в буфере """
+        pos_ = self._pos
+        if len(self._buffer) - pos_ < 5:
+            return None
+
+        code_, data_len_ = header_struct.unpack_from(self._buffer, pos_)
+        end_ = pos_ + 1 + data_len_
+        if end_ > len(self._buffer):
+            return None
+
+        self._pos = end_
+        return code_, self._view[pos_ + 5:end_]
+
+    async def read_message(self) -> tuple[bytes, memoryview]:
+        """ Следующее сообщение, при необходимости дочитывает данные из сокета """
+        message_ = self.next_message()
+        while message_ is None:
+            await self._fill()
+            message_ = self.next_message()
+        return message_
+
+    async def _fill(self) -> None:
+        """ Очередной кусок из сокета в буфер, хвост прежнего буфера копируется в начало """
+        missing_ = self._missing_bytes()
+        if missing_ > self._chunk_size:
+            # большое сообщение (например, DataRow на несколько мегабайт) дочитываем целиком
+            chunk_ = await self._reader.readexactly(missing_)
+        else:
+            chunk_ = await self._reader.read(self._chunk_size)
+
+        if not chunk_:
+            raise CustomDbError('connection is closed')
+        self.bytes_received += len(chunk_)
+
+        # в новый буфер копируется только недочитанный хвост предыдущего
+        if self._pos < len(self._buffer):
+            self._buffer = self._buffer[self._pos:] + chunk_
+        else:
+            self._buffer = chunk_
+        self._view = memoryview(self._buffer)
+        self._pos = 0
+
+    def _missing_bytes(self) -> int:
+        available_ = len(self._buffer) - self._pos
+        if available_ < 5:
+            return 5 - available_
+        _, data_len_ = header_struct.unpack_from(self._buffer, self._pos)
+        return 1 + data_len_ - available_
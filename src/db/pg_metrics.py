@@ -0,0 +1,165 @@
+import re
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import TYPE_CHECKING, Iterable, Optional
+
+if TYPE_CHECKING:
+    from db.pg_core_connect import PgCoreConnect
+
+# границы корзин гистограммы времени запроса, сек.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                   5.0, 10.0)
+NORMALIZED_SQL_MAX_LENGTH = 200
+
+SQL_LITERAL = re.compile(r"'(?:[^']|'')*'|(?<![\w$])\d+(?:\.\d+)?\b")
+SQL_SPACES = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(stmt: str) -> str:
+    """ Текст запроса без литералов и лишних пробелов - ключ метрик """
+    normalized = SQL_SPACES.sub(' ', SQL_LITERAL.sub('?', stmt)).strip()
+    return normalized[:NORMALIZED_SQL_MAX_LENGTH]
+
+
+class QueryEvent:
+    """
+    Выполненный запрос.
+    round_trips - количество ReadyForQuery (завершенных Sync / простых запросов),
+    decode_time - время разбора DataRow в python-значения, сек.
+    """
+
+    __slots__ = ('stmt', 'duration', 'rows', 'bytes_sent', 'bytes_received', 'round_trips',
+                 'decode_time', 'error')
+
+    def __init__(self, stmt: str) -> None:
+        self.stmt = stmt
+        self.duration = 0.0
+        self.rows = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.round_trips = 0
+        self.decode_time = 0.0
+        self.error: Optional[BaseException] = None
+
+
+# запрос с QueryHook, выполняемый в текущем контексте: запросы разных задач на одном соединении
+# идут одновременно, поэтому счетчики копятся отдельно по каждому запросу (см. PgDispatcher)
+current_query_event: ContextVar[Optional[QueryEvent]] = ContextVar('pg_current_query_event',
+                                                                   default=None)
+
+
+class QueryHook:
+    """
+    Обработчик событий соединения: вызывается до и после запроса, выполненного через
+    run_query, run_query_with_params, executemany, copy_records_to_table или copy_out.
+    Запросы pipeline, курсоры и copy_out_iter не отслеживаются: их ответ читается по частям
+    в темпе вызывающего кода, и длительность запроса включала бы время его обработки
+    """
+
+    def before_query(self, connection: 'PgCoreConnect', stmt: str) -> None:
+        pass
+
+    def after_query(self, connection: 'PgCoreConnect', event: QueryEvent) -> None:
+        pass
+
+
+class Histogram:
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        # последняя корзина - значения больше всех границ (+Inf)
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> Iterable[tuple[str, int]]:
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield repr(bound), total
+        yield '+Inf', total + self.counts[-1]
+
+
+class QueryStats:
+
+    __slots__ = ('errors', 'rows', 'bytes_sent', 'bytes_received', 'round_trips', 'decode_time',
+                 'latency')
+
+    def __init__(self) -> None:
+        self.errors = 0
+        self.rows = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.round_trips = 0
+        self.decode_time = 0.0
+        self.latency = Histogram()
+
+
+class QueryMetrics(QueryHook):
+    """ Счетчики и гистограммы времени запросов по нормализованному тексту запроса """
+
+    def __init__(self, prefix: str = 'pg_client') -> None:
+        self._prefix = prefix
+        self._queries: dict[str, QueryStats] = {}
+
+    def __getitem__(self, stmt: str) -> QueryStats:
+        return self._queries[normalize_sql(stmt)]
+
+    def after_query(self, connection: 'PgCoreConnect', event: QueryEvent) -> None:
+        key_ = normalize_sql(event.stmt)
+        stats_ = self._queries.get(key_)
+        if stats_ is None:
+            stats_ = self._queries[key_] = QueryStats()
+
+        stats_.latency.observe(event.duration)
+        if event.error is not None:
+            stats_.errors += 1
+        stats_.rows += event.rows
+        stats_.bytes_sent += event.bytes_sent
+        stats_.bytes_received += event.bytes_received
+        stats_.round_trips += event.round_trips
+        stats_.decode_time += event.decode_time
+
+    def render(self) -> str:
+        """ Метрики в текстовом формате Prometheus """
+        prefix = self._prefix
+        lines = []
+        counters = (
+            ('query_errors_total', 'Queries finished with an error', 'errors'),
+            ('rows_total', 'Rows decoded', 'rows'),
+            ('sent_bytes_total', 'Bytes sent to the server', 'bytes_sent'),
+            ('received_bytes_total', 'Bytes received from the server', 'bytes_received'),
+            ('round_trips_total', 'Server round trips (ReadyForQuery)', 'round_trips'),
+            ('decode_seconds_total', 'Time spent decoding rows', 'decode_time'),
+        )
+        for name, help_, attr in counters:
+            lines.append(f'# HELP {prefix}_{name} {help_}')
+            lines.append(f'# TYPE {prefix}_{name} counter')
+            for key_, stats_ in self._queries.items():
+                lines.append(f'{prefix}_{name}{{query="{escape_label(key_)}"}} '
+                             f'{getattr(stats_, attr)}')
+
+        name = f'{prefix}_query_duration_seconds'
+        lines.append(f'# HELP {name} Query latency')
+        lines.append(f'# TYPE {name} histogram')
+        for key_, stats_ in self._queries.items():
+            label_ = f'query="{escape_label(key_)}"'
+            for bound, count in stats_.latency.cumulative():
+                lines.append(f'{name}_bucket{{{label_},le="{bound}"}} {count}')
+            lines.append(f'{name}_sum{{{label_}}} {stats_.latency.sum}')
+            lines.append(f'{name}_count{{{label_}}} {stats_.latency.count}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,106 @@
+import asyncio
+from typing import TYPE_CHECKING, Optional
+
+from db.pg_converters import python_types_convert_to_pg_params
+from db.pg_errors import PgServerError
+from db.query_context import QueryContext
+
+if TYPE_CHECKING:
+    from db.pg_core_connect import PgCoreConnect
+    from db.statement_cache import PreparedStatement
+
+
+class PgPipeline:
+    """
+    Пакетное выполнение запросов на одном соединении.
+    Сообщения всех запросов пишутся в сокет подряд (у каждого запроса свой Sync,
+    поэтому ошибка одного запроса не влияет на остальные), ответы читаются по порядку
+    и передаются в future соответствующего запроса.
+    Запросы других корутин в пакет не вклиниваются, но могут идти в очереди до и после него
+    """
+
+    def __init__(self, connection: 'PgCoreConnect') -> None:
+        self._connection = connection
+        self._queries: list[tuple[QueryContext, Optional[tuple], tuple]] = []
+        self._futures: list[asyncio.Future] = []
+
+    def run(self, stmt: str, *params, oids: tuple = ()) -> asyncio.Future:
+        """ Постановка запроса в очередь, результат (QueryContext) будет в возвращенной future """
+        # параметры кодируются сразу, чтобы ошибка конвертации не оставила в сокете половину пакета
+        params_ = python_types_convert_to_pg_params(params) if params or oids else None
+        future = asyncio.get_running_loop().create_future()
+
+        self._queries.append((QueryContext(stmt), params_, oids))
+        self._futures.append(future)
+
+        return future
+
+    async def execute(self) -> None:
+        """ Отправка накопленных запросов одним пакетом и разбор ответов """
+        queries, futures = self._queries, self._futures
+        self._queries, self._futures = [], []
+        if not queries:
+            return
+
+        await self._connection._before_request()
+        sent = await self._send(queries)
+
+        for idx, (query_context, statement, is_new, response_) in enumerate(sent):
+            try:
+                async with response_:
+                    await self._read(query_context, statement, is_new)
+            except PgServerError as e:
+                futures[idx].set_exception(e)
+            except BaseException as e:
+                # ответы на остальные запросы дочитываются в фоне и отбрасываются
+                for *_, unread_response in sent[idx + 1:]:
+                    unread_response.abandon()
+                self._fail(futures[idx:], e)
+                raise
+            else:
+                futures[idx].set_result(query_context)
+
+    async def _send(self, queries: list[tuple[QueryContext, Optional[tuple], tuple]]) -> list:
+        """ Запись всех запросов пакета, для каждого - его место в очереди на чтение ответа """
+        connection_ = self._connection
+        sent = []
+        async with connection_._dispatcher.writing() as dispatcher_:
+            for query_context, params, oids in queries:
+                if params is None:
+                    connection_._send_command_QUERY(query_context.stmt)
+                    sent.append((query_context, None, False, dispatcher_.enqueue()))
+                else:
+                    statement, is_new = connection_._send_prepared(query_context, params, oids)
+                    sent.append((query_context, statement, is_new, dispatcher_.enqueue()))
+        return sent
+
+    async def _read(self, query_context: QueryContext, statement: Optional['PreparedStatement'],
+                    is_new: bool) -> None:
+        connection_ = self._connection
+        await connection_._drain()
+        if statement is None:
+            await connection_._handle_query_result_messages(query_context=query_context)
+        else:
+            await connection_._read_prepared(query_context, statement, is_new)
+
+    @staticmethod
+    def _fail(futures: list[asyncio.Future], error: BaseException) -> None:
+        for future in futures:
+            if isinstance(error, Exception):
+                future.set_exception(error)
+            else:
+                future.cancel()
+
+    def cancel(self) -> None:
+        for future in self._futures:
+            future.cancel()
+        self._queries, self._futures = [], []
+
+    async def __aenter__(self) -> 'PgPipeline':
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback) -> None:
+        if exc_type is None:
+            await self.execute()
+        else:
+            self.cancel()
@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Optional
+
+from db.abstract_db_connect import AbstractDbConnect
+from db.pg_errors import CustomDbError, PgServerError, QueryTimeoutError
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(CustomDbError):
+    pass
+
+
+class PgPool:
+    """
+    Пул подключений к БД.
+    Держит не меньше min_size и не больше max_size открытых соединений,
+    свободные соединения переиспользуются, простаивающие дольше max_idle_time закрываются
+    """
+
+    def __init__(    # noqa: CFQ002
+        self,
+        connection_factory: Callable[[], AbstractDbConnect],
+        min_size: int = 1,
+        max_size: int = 10,
+        acquire_timeout: float = 10.0,
+        max_idle_time: float = 300.0,
+        health_check_interval: float = 30.0,
+    ) -> None:
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f'некорректный размер пула: min_size={min_size}, max_size={max_size}')
+
+        self._connection_factory = connection_factory
+        self._min_size = min_size
+        self._max_size = max_size
+        self._acquire_timeout = acquire_timeout
+        self._max_idle_time = max_idle_time
+        self._health_check_interval = health_check_interval
+
+        # свободные соединения вместе со временем возврата в пул
+        self._idle: deque[tuple[AbstractDbConnect, float]] = deque()
+        self._size = 0
+        self._closed = False
+
+        # семафор создается при первом обращении, чтобы попасть в работающий event loop
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    @property
+    def size(self) -> int:
+        """ Количество открытых соединений (свободных и выданных) """
+        return self._size
+
+    @property
+    def idle_count(self) -> int:
+        return len(self._idle)
+
+    async def open(self) -> None:
+        """ Создание минимального количества соединений """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._max_size)
+            self._closed = False
+
+        while self._size < self._min_size:
+            connection_ = await self._connect()
+            self._idle.append((connection_, time.monotonic()))
+
+    @asynccontextmanager
+    async def acquire(self, timeout: Optional[float] = None) -> AsyncIterator[AbstractDbConnect]:
+        """
+        Выдает соединение из пула и возвращает его обратно по выходу из контекста.
+        timeout - ожидание свободного места в пуле (None - acquire_timeout пула, 0 - без ожидания)
+        """
+        connection_ = await self._acquire(self._acquire_timeout if timeout is None else timeout)
+        try:
+            yield connection_
+        except (PgServerError, QueryTimeoutError):
+            # ошибка запроса дочитана до ReadyForQuery - соединение можно переиспользовать
+            await self._release(connection_, discard=not connection_.idle)
+            raise
+        except BaseException:
+            # состояние протокола после ошибки неизвестно - такое соединение не переиспользуем
+            await self._release(connection_, discard=True)
+            raise
+        else:
+            await self._release(connection_)
+
+    async def close(self) -> None:
+        self._closed = True
+        while self._idle:
+            connection_, _ = self._idle.pop()
+            await self._discard(connection_)
+
+    async def _acquire(self, timeout: float) -> AbstractDbConnect:
+        if self._closed:
+            raise CustomDbError('пул подключений закрыт')
+
+        if self._slots is None:
+            await self.open()
+
+        slots: asyncio.Semaphore = self._slots    # type: ignore
+        if timeout <= 0 and slots.locked():
+            raise PoolTimeoutError('в пуле нет свободных подключений')
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout=timeout or None)
+        except asyncio.TimeoutError:
+            raise PoolTimeoutError(f'не удалось получить подключение из пула за {timeout} сек.')
+
+        try:
+            return await self._take_connection()
+        except BaseException:
+            slots.release()
+            raise
+
+    async def _take_connection(self) -> AbstractDbConnect:
+        while self._idle:
+            # LIFO: берем последнее возвращенное соединение, старые успевают "остыть" и закрыться
+            connection_, released_at = self._idle.pop()
+            idle_time = time.monotonic() - released_at
+
+            if connection_.closed or idle_time > self._max_idle_time:
+                await self._discard(connection_)
+                continue
+
+            if idle_time > self._health_check_interval:
+                try:
+                    healthy_ = await self._is_healthy(connection_)
+                except BaseException:
+                    # отмена во время проверки: соединение уже не в _idle, иначе слот потеряется
+                    await self._discard(connection_)
+                    raise
+                if not healthy_:
+                    await self._discard(connection_)
+                    continue
+
+            return connection_
+
+        return await self._connect()
+
+    async def _release(self, connection_: AbstractDbConnect, discard: bool = False) -> None:
+        try:
+            if discard or self._closed or connection_.closed:
+                await self._discard(connection_)
+            else:
+                self._idle.append((connection_, time.monotonic()))
+                await self._recycle_idle()
+        finally:
+            self._slots.release()    # type: ignore
+
+    async def _recycle_idle(self) -> None:
+        """ Закрытие соединений, простаивающих дольше max_idle_time (сверх min_size) """
+        now_ = time.monotonic()
+        while self._idle and self._size > self._min_size:
+            connection_, released_at = self._idle[0]
+            if now_ - released_at <= self._max_idle_time:
+                break
+            self._idle.popleft()
+            await self._discard(connection_)
+
+    async def _connect(self) -> AbstractDbConnect:
+        self._size += 1
+        try:
+            connection_ = self._connection_factory()
+            await connection_.connect()
+        except BaseException:
+            self._size -= 1
+            raise
+        logger.debug(f'открыто новое соединение, размер пула: {self._size}')
+        return connection_
+
+    async def _discard(self, connection_: AbstractDbConnect) -> None:
+        self._size -= 1
+        try:
+            await connection_.close()
+        except (OSError, CustomDbError) as e:
+            logger.debug(f'ошибка при закрытии соединения: {e}')
+
+    async def _is_healthy(self, connection_: AbstractDbConnect) -> bool:
+        try:
+            await connection_.run_simple_query('SELECT 1')
+        except (OSError, EOFError, CustomDbError) as e:
+            # EOFError (asyncio.IncompleteReadError) - сервер закрыл сокет
+            logger.warning(f'соединение не прошло проверку и будет закрыто: {e}')
+            return False
+        return True
@@ -0,0 +1,75 @@
+from types import MappingProxyType
+from typing import Any, Iterator, Mapping, NamedTuple, Sequence
+
+
+class PgColumn(NamedTuple):
+    """ Описание колонки результата из RowDescription """
+    name: str
+    table_oid: int
+    column_attrnum: int
+    type_oid: int
+    type_size: int
+    type_modifier: int
+    format: int
+
+
+def make_record_index(columns: Sequence[PgColumn]) -> Mapping[str, int]:
+    """
+    Неизменяемое отображение имя колонки -> позиция, одно на весь результат.
+    При повторяющихся именах берется первая колонка
+    """
+    index: dict[str, int] = {}
+    for pos, column in enumerate(columns):
+        index.setdefault(column.name, pos)
+    return MappingProxyType(index)
+
+
+class Record:
+    """
+    Строка результата запроса: кортеж значений и общий для всех строк результата индекс колонок.
+    Доступ по имени (rec['col']) и по позиции (rec[0]), итерация идет по значениям,
+    dict(rec) дает словарь колонка -> значение
+    """
+
+    __slots__ = ('_values', '_index')
+
+    def __init__(self, values: tuple, index: Mapping[str, int]) -> None:
+        self._values = values
+        self._index = index
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self._values[self._index[key]]
+        return self._values[key]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        pos = self._index.get(key)
+        return default if pos is None else self._values[pos]
+
+    def keys(self):
+        return self._index.keys()
+
+    def values(self) -> tuple:
+        return self._values
+
+    def items(self) -> Iterator[tuple[str, Any]]:
+        values = self._values
+        return ((name, values[pos]) for name, pos in self._index.items())
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._values)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Record):
+            return self._values == other._values and self._index == other._index
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self._values)
+
+    def __repr__(self) -> str:
+        fields = ' '.join(f'{name}={value!r}' for name, value in self.items())
+        return f'<Record {fields}>'
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from db.pg_errors import CustomDbError
+from db.pg_pool import PgPool
+
+logger = logging.getLogger(__name__)
+
+# отставание реплики в секундах: 0, если все полученные WAL уже применены,
+# на не-реплике (pg_is_in_recovery() = false) lsn - NULL, отставание тоже 0
+REPLICA_LAG_STMT = 'SELECT COALESCE(CASE ' \
+    'WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 ' \
+    'ELSE extract(epoch from now() - pg_last_xact_replay_timestamp()) END, 0) AS lag'
+
+
+def parse_host(host: str, default_port: int) -> tuple[str, int]:
+    """ 'host' или 'host:port' """
+    host_, _, port_ = host.rpartition(':')
+    if not host_ or not port_.isdigit():
+        return host, default_port
+    return host_, int(port_)
+
+
+class PgReplica:
+    """ Пул соединений к реплике и ее состояние для маршрутизации запросов на чтение """
+
+    def __init__(self, name: str, pool: PgPool) -> None:
+        self.name = name
+        self.pool = pool
+        # количество выданных и еще не возвращенных соединений
+        self.in_flight = 0
+        self.lag: Optional[float] = None
+        self.available = False
+        self.checked_at: Optional[float] = None
+        self.check_task: Optional[asyncio.Task] = None
+
+    def mark_unavailable(self, reason: Exception) -> None:
+        if self.available:
+            logger.warning(f'реплика {self.name} исключена из маршрутизации: {reason}')
+        self.available = False
+        self.checked_at = time.monotonic()
+
+
+class PgReplicaRouter:
+    """
+    Выбор реплики для запроса на чтение: из доступных реплик с допустимым отставанием
+    берется та, у которой меньше всего выполняющихся запросов (при равенстве - по кругу).
+    Отставание проверяется не чаще check_interval, проверка идет в фоне и запросы не ждет:
+    до первой успешной проверки реплика считается недоступной, запросы идут на primary
+    """
+
+    def __init__(self, replicas: list[PgReplica], max_lag: float = 10.0,
+                 check_interval: float = 5.0) -> None:
+        self._replicas = replicas
+        self._max_lag = max_lag
+        self._check_interval = check_interval
+        self._next = 0
+
+    @property
+    def replicas(self) -> list[PgReplica]:
+        return self._replicas
+
+    def choose(self) -> Optional[PgReplica]:
+        """ Реплика для очередного запроса или None - запрос надо отправить на primary """
+        now_ = time.monotonic()
+        chosen: Optional[PgReplica] = None
+        count_ = len(self._replicas)
+        for idx in range(count_):
+            replica = self._replicas[(self._next + idx) % count_]
+            if replica.checked_at is None or now_ - replica.checked_at > self._check_interval:
+                self._start_check(replica)
+            if not replica.available:
+                continue
+            if chosen is None or replica.in_flight < chosen.in_flight:
+                chosen = replica
+
+        if count_:
+            self._next = (self._next + 1) % count_
+        return chosen
+
+    async def check(self, replica: PgReplica) -> None:
+        try:
+            async with replica.pool.acquire() as connection_:
+                result = await connection_.run_query(REPLICA_LAG_STMT)
+            lag_ = float(result.rows[0]['lag'])
+        except (OSError, CustomDbError) as e:
+            replica.mark_unavailable(e)
+            return
+
+        replica.lag = lag_
+        replica.checked_at = time.monotonic()
+        if lag_ > self._max_lag:
+            replica.mark_unavailable(CustomDbError(f'отставание {lag_:.1f} сек.'))
+        elif not replica.available:
+            logger.info(f'реплика {replica.name} доступна, отставание {lag_:.1f} сек.')
+            replica.available = True
+
+    async def close(self) -> None:
+        for replica in self._replicas:
+            if replica.check_task is not None:
+                replica.check_task.cancel()
+            await replica.pool.close()
+
+    def _start_check(self, replica: PgReplica) -> None:
+        if replica.check_task is not None and not replica.check_task.done():
+            return
+        replica.checked_at = time.monotonic()
+        replica.check_task = asyncio.get_running_loop().create_task(self.check(replica))
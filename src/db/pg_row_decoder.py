@@ -0,0 +1,106 @@
+from functools import lru_cache
+from struct import Struct
+from typing import Callable, Sequence
+
+from db.pg_converters import (bool_recv, date_from_days, date_recv, float4_recv, float8_recv,
+                              int2_recv, int4_recv, int8_recv, string_in,
+                              timestamp_from_microseconds, timestamp_recv,
+                              timestamptz_from_microseconds, timestamptz_recv)
+
+RowDecoder = Callable[[bytes], tuple]
+
+# бинарные декодеры значений фиксированной ширины:
+# формат struct и преобразование распакованного числа (None - значение используется как есть)
+FIXED_WIDTH_DECODERS = {
+    int2_recv: ('h', None),
+    int4_recv: ('i', None),
+    int8_recv: ('q', None),
+    float4_recv: ('f', None),
+    float8_recv: ('d', None),
+    bool_recv: ('?', None),
+    timestamp_recv: ('q', timestamp_from_microseconds),
+    timestamptz_recv: ('q', timestamptz_from_microseconds),
+    date_recv: ('i', date_from_days),
+}
+
+
+def make_row_decoder(type_converters: Sequence[Callable], result_formats: Sequence[int],
+                     encoding: str = 'utf-8') -> RowDecoder:
+    """
+    Функция разбора DataRow в кортеж значений для конкретного набора колонок.
+    Одинаковые наборы (типы, форматы, кодировка) получают одну и ту же функцию
+    """
+    return _compile_row_decoder(tuple(type_converters), tuple(result_formats), encoding)
+
+
+@lru_cache(maxsize=256)
+def _compile_row_decoder(type_converters: tuple, result_formats: tuple,
+                         encoding: str) -> RowDecoder:
+    """
+    Собирает разбор строки из замыканий над конвертерами колонок: Struct для длин
+    и значений фиксированной ширины создаются один раз на набор колонок.
+    Если все колонки фиксированной ширины в бинарном формате, строка без NULL
+    распаковывается одним вызовом struct целиком
+    """
+    field_decoders = tuple(_make_field_decoder(converter, format_, encoding)
+                           for converter, format_ in zip(type_converters, result_formats))
+    unpack_len = Struct('!i').unpack_from
+
+    def decode_row(data) -> tuple:
+        idx = 2
+        values = []
+        for decode in field_decoders:
+            n = unpack_len(data, idx)[0]
+            idx += 4
+            if n == -1:
+                values.append(None)
+            else:
+                values.append(decode(data, idx, n))
+                idx += n
+        return tuple(values)
+
+    fixed = [FIXED_WIDTH_DECODERS.get(converter) if format_ else None
+             for converter, format_ in zip(type_converters, result_formats)]
+    if not fixed or None in fixed:
+        return decode_row
+    return _make_fixed_row_decoder(fixed, decode_row)
+
+
+def _make_field_decoder(converter: Callable, format_: int, encoding: str) -> Callable:
+    """ Разбор непустого значения колонки: (data, начало значения, длина) -> значение """
+    fixed = FIXED_WIDTH_DECODERS.get(converter) if format_ else None
+    if fixed is not None:
+        struct_format, post = fixed
+        unpack = Struct(f'!{struct_format}').unpack_from
+        if post is None:
+            return lambda data, idx, n: unpack(data, idx)[0]
+        return lambda data, idx, n: post(unpack(data, idx)[0])
+    if format_:
+        return lambda data, idx, n: converter(data[idx:idx + n])
+    if converter is string_in:
+        return lambda data, idx, n: str(data[idx:idx + n], encoding)
+    return lambda data, idx, n: converter(str(data[idx:idx + n], encoding))
+
+
+def _make_fixed_row_decoder(fixed: list, decode_row: RowDecoder) -> RowDecoder:
+    """ Строка из колонок фиксированной ширины без NULL имеет известную длину """
+    # число колонок, затем пары (длина, значение)
+    row_struct = Struct('!h' + ''.join(f'i{struct_format}' for struct_format, _ in fixed))
+    row_size, unpack_row = row_struct.size, row_struct.unpack
+    posts = tuple((pos, post) for pos, (_, post) in enumerate(fixed) if post is not None)
+
+    if not posts:
+        def decode_fixed_row(data) -> tuple:
+            if len(data) == row_size:
+                return unpack_row(data)[2::2]
+            return decode_row(data)
+        return decode_fixed_row
+
+    def decode_converted_row(data) -> tuple:
+        if len(data) != row_size:
+            return decode_row(data)
+        values = list(unpack_row(data)[2::2])
+        for pos, post in posts:
+            values[pos] = post(values[pos])
+        return tuple(values)
+    return decode_converted_row
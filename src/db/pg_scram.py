@@ -0,0 +1,123 @@
+import base64
+import hmac
+import os
+import stringprep
+import unicodedata
+from functools import lru_cache
+from hashlib import pbkdf2_hmac, sha256
+from typing import NamedTuple, Optional
+
+from db.pg_errors import CustomDbError
+
+SCRAM_SHA_256 = 'SCRAM-SHA-256'
+# gs2-заголовок без channel binding и без authzid (имя пользователя сервер берет из startup)
+GS2_HEADER = b'n,,'
+NONCE_LENGTH = 18
+
+
+class ScramKeys(NamedTuple):
+    """ Ключи, полученные из пароля через PBKDF2 (RFC 5802) """
+    client_key: bytes
+    stored_key: bytes
+    server_key: bytes
+
+
+@lru_cache(maxsize=64)
+def derive_keys(password: bytes, salt: bytes, iterations: int) -> ScramKeys:
+    """
+    PBKDF2 - тысячи итераций HMAC на каждое соединение. Соль и число итераций сервер
+    хранит вместе с паролем пользователя, поэтому для всех соединений пула они одинаковы
+    и ключи достаточно вычислить один раз на процесс
+    """
+    salted_password = pbkdf2_hmac('sha256', password, salt, iterations)
+    client_key = hmac.digest(salted_password, b'Client Key', 'sha256')
+    return ScramKeys(client_key, sha256(client_key).digest(),
+                     hmac.digest(salted_password, b'Server Key', 'sha256'))
+
+
+def saslprep(password: str) -> bytes:
+    """
+    SASLprep (RFC 4013) пароля. Как и сервер, пароль, который SASLprep не проходит,
+    используется как есть
+    """
+    chars = []
+    for char in password:
+        if stringprep.in_table_c12(char):
+            chars.append(' ')
+        elif not stringprep.in_table_b1(char):
+            chars.append(char)
+    prepared = unicodedata.normalize('NFKC', ''.join(chars))
+
+    prohibited = (stringprep.in_table_c12, stringprep.in_table_c21_c22, stringprep.in_table_c3,
+                  stringprep.in_table_c4, stringprep.in_table_c5, stringprep.in_table_c6,
+                  stringprep.in_table_c7, stringprep.in_table_c8, stringprep.in_table_c9,
+                  stringprep.in_table_a1)
+    if not prepared or any(check(char) for char in prepared for check in prohibited):
+        return password.encode('utf8')
+
+    if any(stringprep.in_table_d1(char) for char in prepared):
+        # текст справа налево должен начинаться и заканчиваться RandALCat-символом
+        if not (stringprep.in_table_d1(prepared[0]) and stringprep.in_table_d1(prepared[-1])) \
+                or any(stringprep.in_table_d2(char) for char in prepared):
+            return password.encode('utf8')
+
+    return prepared.encode('utf8')
+
+
+class ScramClient:
+    """
+    Клиентская сторона обмена SCRAM-SHA-256.
+    user - имя в сообщении клиента: Postgres его не проверяет, libpq отправляет пустое
+    """
+
+    def __init__(self, password: bytes, user: bytes = b'', nonce: Optional[bytes] = None) -> None:
+        try:
+            self._password = saslprep(password.decode('utf8'))
+        except UnicodeDecodeError:
+            self._password = password
+        self._nonce = nonce or base64.b64encode(os.urandom(NONCE_LENGTH))
+        self._client_first_bare = b'n=' + user + b',r=' + self._nonce
+        self._auth_message = b''
+        self._server_key = b''
+
+    def client_first(self) -> bytes:
+        return GS2_HEADER + self._client_first_bare
+
+    def client_final(self, server_first: bytes) -> bytes:
+        attributes = self._parse(server_first)
+        server_nonce = attributes.get(b'r', b'')
+        if not server_nonce.startswith(self._nonce) or len(server_nonce) == len(self._nonce):
+            raise CustomDbError('SCRAM: сервер вернул некорректный nonce')
+        try:
+            salt = base64.b64decode(attributes[b's'])
+            iterations = int(attributes[b'i'])
+        except (KeyError, ValueError) as e:
+            raise CustomDbError(f'SCRAM: некорректное сообщение сервера: {e}')
+
+        keys = derive_keys(self._password, salt, iterations)
+        client_final_without_proof = b'c=' + base64.b64encode(GS2_HEADER) + b',r=' + server_nonce
+        self._auth_message = b','.join(
+            (self._client_first_bare, bytes(server_first), client_final_without_proof))
+        self._server_key = keys.server_key
+
+        client_signature = hmac.digest(keys.stored_key, self._auth_message, 'sha256')
+        proof = bytes(key ^ sign for key, sign in zip(keys.client_key, client_signature))
+        return client_final_without_proof + b',p=' + base64.b64encode(proof)
+
+    def verify_server_final(self, server_final: bytes) -> None:
+        attributes = self._parse(server_final)
+        if b'e' in attributes:
+            raise CustomDbError(f'SCRAM: ошибка сервера: {attributes[b"e"].decode()}')
+
+        expected = hmac.digest(self._server_key, self._auth_message, 'sha256')
+        try:
+            signature = base64.b64decode(attributes.get(b'v', b''))
+        except ValueError:
+            signature = b''
+        if not hmac.compare_digest(expected, signature):
+            raise CustomDbError('SCRAM: подпись сервера не совпала')
+
+    @staticmethod
+    def _parse(message: bytes) -> dict[bytes, bytes]:
+        return dict(
+            (item[:1], item[2:]) for item in bytes(message).split(b',') if item[1:2] == b'=')
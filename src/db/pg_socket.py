@@ -0,0 +1,46 @@
+import os
+import socket
+from dataclasses import dataclass
+from typing import Optional
+
+# имя сокета сервера в каталоге unix_socket_directories
+UNIX_SOCKET_NAME = '.s.PGSQL.{port}'
+
+
+@dataclass(frozen=True)
+class SocketOptions:
+    """
+    Настройки TCP-сокета соединения.
+    keepalive_* и размеры буферов None - остаются системные значения
+    """
+    nodelay: bool = True
+    keepalive: bool = True
+    keepalive_idle: Optional[int] = None
+    keepalive_interval: Optional[int] = None
+    keepalive_count: Optional[int] = None
+    send_buffer_size: Optional[int] = None
+    receive_buffer_size: Optional[int] = None
+
+    def apply(self, sock: socket.socket) -> None:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, int(self.nodelay))
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, int(self.keepalive))
+        if self.keepalive:
+            # на macOS время простоя до первой проверки задается опцией TCP_KEEPALIVE
+            idle_option = getattr(socket, 'TCP_KEEPIDLE', getattr(socket, 'TCP_KEEPALIVE', None))
+            for option, value in ((idle_option, self.keepalive_idle),
+                                  (getattr(socket, 'TCP_KEEPINTVL', None),
+                                   self.keepalive_interval),
+                                  (getattr(socket, 'TCP_KEEPCNT', None), self.keepalive_count)):
+                if option is not None and value is not None:
+                    sock.setsockopt(socket.IPPROTO_TCP, option, value)
+        if self.send_buffer_size is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.send_buffer_size)
+        if self.receive_buffer_size is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.receive_buffer_size)
+
+
+def unix_socket_path(path: str, port: int) -> str:
+    """ Как в libpq: каталог сокетов сервера или полный путь к файлу сокета """
+    if os.path.isdir(path):
+        return os.path.join(path, UNIX_SOCKET_NAME.format(port=port))
+    return path
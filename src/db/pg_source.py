@@ -1,34 +1,232 @@
-from typing import Optional
+import asyncio
+import logging
+from contextlib import AsyncExitStack, asynccontextmanager
+from functools import partial
+from itertools import chain, repeat
+from typing import AsyncContextManager, AsyncIterator, Callable, Optional
 
 from core.abstract_source import AbstractSource
 from db.abstract_db_connect import AbstractDbConnect
 from db.pg_core_connect import PgCoreConnect
+from db.pg_errors import CustomDbError
+from db.pg_metrics import QueryHook, QueryMetrics, escape_label
+from db.pg_pool import PgPool, PoolTimeoutError
+from db.pg_replicas import PgReplica, PgReplicaRouter, parse_host
+from db.pg_socket import SocketOptions
 from models.config_models import DbConfig
 
+logger = logging.getLogger(__name__)
+
+# паузы перед попытками восстановить соединение для LISTEN, сек; дальше - последняя
+LISTEN_RECONNECT_DELAYS = (0.0, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+
 
 class PgDbSource(AbstractSource):
 
     def __init__(self, db_config: DbConfig):
         self._db_cfg = db_config
+        self._socket_options = SocketOptions(
+            nodelay=db_config.tcp_nodelay,
+            keepalive=db_config.tcp_keepalive,
+            keepalive_idle=db_config.tcp_keepalive_idle,
+            keepalive_interval=db_config.tcp_keepalive_interval,
+            keepalive_count=db_config.tcp_keepalive_count,
+            send_buffer_size=db_config.socket_send_buffer,
+            receive_buffer_size=db_config.socket_receive_buffer)
+        # общий список обработчиков запросов для всех соединений (primary и реплик)
+        self._query_hooks: list[QueryHook] = []
+        self._metrics: Optional[QueryMetrics] = None
+        if db_config.metrics:
+            self._metrics = QueryMetrics()
+            self._query_hooks.append(self._metrics)
 
-        self._connection: Optional[AbstractDbConnect] = None
+        self._pool = self._create_pool(self._create_connection)
+        self._router = PgReplicaRouter(
+            [self._create_replica(host) for host in self._db_cfg.replicas],
+            max_lag=self._db_cfg.max_replica_lag,
+            check_interval=self._db_cfg.replica_check_interval)
+        # отдельное от пула соединение под LISTEN
+        self._listener: Optional[AbstractDbConnect] = None
+        # канал -> обработчики: после разрыва подписки повторяются на новом соединении
+        self._channels: dict[str, list[Callable]] = {}
+        self._on_listen_lost: list[Callable] = []
+        self._relisten_task: Optional[asyncio.Task] = None
 
     @property
     def schema(self):
         return self._db_cfg.schema
 
-    async def acquire(self) -> AbstractDbConnect:
-        if not self._connection:
-            self._connection = PgCoreConnect(host=self._db_cfg.host,
-                                             port=self._db_cfg.port,
-                                             db_name=self._db_cfg.db,
-                                             user=self._db_cfg.user,
-                                             password=self._db_cfg.password,
-                                             application_name='link-cutter')
-            await self._connection.connect()
+    @property
+    def metrics(self) -> Optional[QueryMetrics]:
+        return self._metrics
+
+    def add_query_hook(self, hook: QueryHook) -> None:
+        """ Обработчик запросов всех соединений источника, в том числе уже открытых """
+        self._query_hooks.append(hook)
+
+    def remove_query_hook(self, hook: QueryHook) -> None:
+        self._query_hooks.remove(hook)
+
+    def render_metrics(self) -> Optional[str]:
+        """ Метрики запросов и пулов в формате Prometheus, None - метрики выключены """
+        if self._metrics is None:
+            return None
+
+        pools_ = [('primary', self._pool)] + [
+            (replica.name, replica.pool) for replica in self._router.replicas]
+        lines = []
+        for name, help_, attr in (('pool_size', 'Open connections', 'size'),
+                                  ('pool_idle', 'Idle connections', 'idle_count')):
+            lines.append(f'# HELP pg_client_{name} {help_}')
+            lines.append(f'# TYPE pg_client_{name} gauge')
+            for pool_name, pool in pools_:
+                lines.append(f'pg_client_{name}{{pool="{escape_label(pool_name)}"}} '
+                             f'{getattr(pool, attr)}')
+        return self._metrics.render() + '\n'.join(lines) + '\n'
+
+    def acquire(self, readonly: bool = False) -> AsyncContextManager[AbstractDbConnect]:
+        """ readonly=True - соединение с репликой, если есть доступная, иначе с primary """
+        if readonly and self._router.replicas:
+            return self._acquire_replica()
+        return self._pool.acquire()
+
+    @asynccontextmanager
+    async def _acquire_replica(self) -> AsyncIterator[AbstractDbConnect]:
+        replica = self._router.choose()
+        async with AsyncExitStack() as stack:
+            connection_ = None
+            if replica is not None:
+                try:
+                    # без ожидания: пока свободна primary, ждать места в пуле реплики незачем
+                    connection_ = await stack.enter_async_context(
+                        replica.pool.acquire(timeout=0))
+                except PoolTimeoutError as e:
+                    # пул реплики исчерпан - запрос уходит на primary, реплика остается в работе
+                    logger.debug(f'реплика {replica.name} занята: {e}')
+                except (CustomDbError, OSError, EOFError) as e:
+                    replica.mark_unavailable(e)
+                else:
+                    replica.in_flight += 1
+                    stack.callback(self._release_replica, replica)
+            if connection_ is None:
+                connection_ = await stack.enter_async_context(self._pool.acquire())
+            yield connection_
 
-        return self._connection
+    @staticmethod
+    def _release_replica(replica: PgReplica) -> None:
+        replica.in_flight -= 1
+
+    async def add_listener(self, channel: str, callback: Callable,
+                           on_lost: Optional[Callable] = None) -> None:
+        """
+        Подписка на NOTIFY через выделенное соединение, не занимающее место в пуле.
+        При разрыве соединения вызывается on_lost(connection, error), а подписки
+        восстанавливаются на новом соединении в фоне
+        """
+        self._channels.setdefault(channel, []).append(callback)
+        if on_lost is not None:
+            self._on_listen_lost.append(on_lost)
+        if self._relisten_task is not None:
+            # подписка будет выполнена вместе с остальными при переподключении
+            return
+
+        try:
+            if self._listener is None or self._listener.closed:
+                self._listener = await self._connect_listener()
+            else:
+                await self._listener.add_listener(channel, callback,
+                                                  on_lost=self._listener_lost)
+        except BaseException:
+            self._channels[channel].remove(callback)
+            if not self._channels[channel]:
+                del self._channels[channel]
+            if on_lost is not None:
+                self._on_listen_lost.remove(on_lost)
+            raise
+
+    def is_listening(self, channel: str) -> bool:
+        """ Подписка на канал активна (соединение для LISTEN не разорвано) """
+        return channel in self._channels and self._listener is not None \
+            and not self._listener.closed
+
+    async def _connect_listener(self) -> AbstractDbConnect:
+        """ Новое соединение с подписками на все зарегистрированные каналы """
+        connection_ = self._create_connection()
+        await connection_.connect()
+        try:
+            for channel, callbacks in list(self._channels.items()):
+                for callback in list(callbacks):
+                    await connection_.add_listener(channel, callback,
+                                                   on_lost=self._listener_lost)
+        except BaseException:
+            await connection_.close()
+            raise
+        return connection_
+
+    def _listener_lost(self, connection: AbstractDbConnect, error: BaseException) -> None:
+        if connection is not self._listener:
+            return
+        self._listener = None
+        for on_lost in list(self._on_listen_lost):
+            try:
+                on_lost(connection, error)
+            except Exception:
+                logger.exception('ошибка обработчика разрыва LISTEN')
+        if self._relisten_task is None:
+            self._relisten_task = asyncio.get_running_loop().create_task(self._relisten())
+
+    async def _relisten(self) -> None:
+        """ Переподключение с нарастающей паузой, пока подписки не восстановятся """
+        try:
+            for delay_ in chain(LISTEN_RECONNECT_DELAYS, repeat(LISTEN_RECONNECT_DELAYS[-1])):
+                await asyncio.sleep(delay_)
+                try:
+                    self._listener = await self._connect_listener()
+                except (CustomDbError, OSError, EOFError) as e:
+                    logger.warning(f'не удалось восстановить подписки LISTEN: {e!r}')
+                else:
+                    logger.info('подписки LISTEN восстановлены')
+                    return
+        finally:
+            self._relisten_task = None
 
     async def close(self):
-        if self._connection:
-            await self._connection.close()
+        task, self._relisten_task = self._relisten_task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if self._listener is not None:
+            await self._listener.close()
+            self._listener = None
+        await self._router.close()
+        await self._pool.close()
+
+    def _create_pool(self, connection_factory: Callable[[], AbstractDbConnect]) -> PgPool:
+        return PgPool(connection_factory,
+                      min_size=self._db_cfg.min_size,
+                      max_size=self._db_cfg.max_size,
+                      acquire_timeout=self._db_cfg.acquire_timeout,
+                      max_idle_time=self._db_cfg.max_idle_time,
+                      health_check_interval=self._db_cfg.health_check_interval)
+
+    def _create_replica(self, host: str) -> PgReplica:
+        host_, port_ = parse_host(host, self._db_cfg.port)
+        return PgReplica(f'{host_}:{port_}',
+                         self._create_pool(partial(self._create_connection, host_, port_)))
+
+    def _create_connection(self, host: Optional[str] = None,
+                           port: Optional[int] = None) -> AbstractDbConnect:
+        # unix_socket относится только к primary, реплики подключаются по своему host
+        return PgCoreConnect(host=host or self._db_cfg.host,
+                             port=port or self._db_cfg.port,
+                             db_name=self._db_cfg.db,
+                             user=self._db_cfg.user,
+                             password=self._db_cfg.password,
+                             application_name='link-cutter',
+                             statement_cache_size=self._db_cfg.statement_cache_size,
+                             unix_socket=None if host else self._db_cfg.unix_socket,
+                             socket_options=self._socket_options,
+                             query_hooks=self._query_hooks)
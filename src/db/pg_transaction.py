@@ -0,0 +1,174 @@
+import logging
+from typing import TYPE_CHECKING, Optional
+
+from db.pg_errors import CustomDbError
+from db.query_context import QueryContext
+
+if TYPE_CHECKING:
+    from db.pg_core_connect import PgCoreConnect
+
+logger = logging.getLogger(__name__)
+
+ISOLATION_LEVELS = {
+    'read_committed': 'READ COMMITTED',
+    'repeatable_read': 'REPEATABLE READ',
+    'serializable': 'SERIALIZABLE',
+}
+
+
+class PgTransaction:
+    """
+    Транзакция (или точка сохранения, если транзакция вложенная).
+    BEGIN/SAVEPOINT не отправляются отдельно, а уходят на сервер вместе с первым запросом,
+    RELEASE SAVEPOINT - со следующим запросом или COMMIT внешней транзакции.
+    COMMIT можно отправить вместе с последним запросом: run_query(..., commit=True).
+    При исключении внутри блока транзакция (точка сохранения) откатывается.
+    Внешняя транзакция держит соединение монопольно: запросы других задач ждут ее завершения
+    """
+
+    def __init__(self, connection: 'PgCoreConnect', isolation: Optional[str] = None,
+                 readonly: bool = False, deferrable: bool = False) -> None:
+        if isolation is not None and isolation not in ISOLATION_LEVELS:
+            raise ValueError(f'неизвестный уровень изоляции: {isolation}')
+
+        self._connection = connection
+        self._isolation = isolation
+        self._readonly = readonly
+        self._deferrable = deferrable
+
+        self._parent: Optional['PgTransaction'] = None
+        self._start_command = ''
+        self._finish_command = ''
+        self._rollback_command = ''
+        self._started = False
+        self._finished = False
+        # ключ монопольного режима соединения (только у внешней транзакции)
+        self._exclusive: Optional[object] = None
+
+    @property
+    def nested(self) -> bool:
+        return self._parent is not None
+
+    async def start(self) -> None:
+        if self._started:
+            raise CustomDbError('транзакция уже начата')
+
+        connection_ = self._connection
+        self._exclusive = await connection_._dispatcher.acquire()
+        try:
+            self._prepare_commands(connection_._transaction)
+        except BaseException:
+            connection_._dispatcher.release(self._exclusive)
+            raise
+
+        self._parent = connection_._transaction
+        connection_._transaction = self
+        connection_._transaction_commands.append(self._start_command)
+        self._started = True
+
+    def _prepare_commands(self, parent: Optional['PgTransaction']) -> None:
+        if parent is None:
+            command_ = ['BEGIN']
+            if self._isolation is not None:
+                command_.append(f'ISOLATION LEVEL {ISOLATION_LEVELS[self._isolation]}')
+            if self._readonly:
+                command_.append('READ ONLY')
+            if self._deferrable:
+                command_.append('DEFERRABLE')
+            self._start_command = ' '.join(command_)
+            self._finish_command = 'COMMIT'
+            self._rollback_command = 'ROLLBACK'
+        else:
+            if self._isolation is not None or self._readonly or self._deferrable:
+                raise CustomDbError('параметры задаются только для внешней транзакции')
+            savepoint_ = f'lc_savepoint_{parent._depth + 1}'
+            self._start_command = f'SAVEPOINT {savepoint_}'
+            self._finish_command = f'RELEASE SAVEPOINT {savepoint_}'
+            self._rollback_command = f'ROLLBACK TO SAVEPOINT {savepoint_}'
+
+    async def run_query(self, stmt: str, *params, commit: bool = False,
+                        timeout: Optional[float] = None) -> QueryContext:
+        """ commit=True - COMMIT (RELEASE SAVEPOINT) уходит в одном пакете с запросом """
+        self._check_active()
+        connection_ = self._connection
+        if not commit:
+            return await connection_.run_query(stmt, *params, timeout=timeout)
+
+        connection_._transaction_epilogue = self._finish_command
+        try:
+            query_context = await connection_.run_query(stmt, *params, timeout=timeout)
+        finally:
+            connection_._transaction_epilogue = None
+        self._complete()
+        return query_context
+
+    async def commit(self) -> None:
+        self._check_active()
+        connection_ = self._connection
+        if self._is_pending():
+            # на сервер ничего не отправлялось - и завершать нечего
+            self._drop_pending()
+        elif self.nested:
+            connection_._transaction_commands.append(self._finish_command)
+        else:
+            await connection_.run_simple_query(self._finish_command)
+        self._complete()
+
+    async def rollback(self) -> None:
+        self._check_active()
+        connection_ = self._connection
+        if self._is_pending():
+            self._drop_pending()
+        else:
+            # все, что стоит в очереди после начала транзакции, откатывается вместе с ней
+            connection_._transaction_commands.clear()
+            await connection_.run_simple_query(self._rollback_command)
+        self._complete()
+
+    @property
+    def _depth(self) -> int:
+        return 0 if self._parent is None else self._parent._depth + 1
+
+    def _check_active(self) -> None:
+        if not self._started or self._finished:
+            raise CustomDbError('транзакция не начата или уже завершена')
+        if self._connection._transaction is not self:
+            raise CustomDbError('сначала должна быть завершена вложенная транзакция')
+
+    def _is_pending(self) -> bool:
+        """ BEGIN/SAVEPOINT еще не отправлен на сервер """
+        return self._start_command in self._connection._transaction_commands
+
+    def _drop_pending(self) -> None:
+        commands_ = self._connection._transaction_commands
+        del commands_[commands_.index(self._start_command):]
+
+    def _complete(self) -> None:
+        self._finished = True
+        self._connection._transaction = self._parent
+        self._connection._dispatcher.release(self._exclusive)
+
+    async def __aenter__(self) -> 'PgTransaction':
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback) -> None:
+        if self._finished:
+            return
+        if exc_type is None:
+            await self.commit()
+            return
+
+        connection_ = self._connection
+        if not issubclass(exc_type, Exception) or connection_.closed:
+            # прерванный на середине обмен (отмена задачи) - состояние протокола неизвестно,
+            # откатывать нечем: пул такое соединение не переиспользует
+            connection_._transaction_commands.clear()
+            self._complete()
+            return
+
+        try:
+            await self.rollback()
+        except (OSError, CustomDbError) as e:
+            logger.warning(f'не удалось откатить транзакцию: {e}')
+            self._complete()
@@ -1,51 +1,39 @@
-from typing import Callable, Optional
+from typing import TYPE_CHECKING, Callable, Mapping, Optional
+
+if TYPE_CHECKING:
+    from db.pg_columnar import ColumnarBuilder
 
 
 class QueryContext:
+    """ Состояние выполнения одного запроса: описание результата, строки и ошибка """
+
+    __slots__ = (
+        'stmt',
+        'rows',
+        'rows_count',
+        'columns',
+        'type_converters',
+        'result_formats',
+        'record_index',
+        'row_decoder',
+        'columnar',
+        'error',
+    )
 
     def __init__(self,
                  stmt: Optional[str] = None,
                  columns: Optional[list] = None,
                  type_converters: Optional[list[Callable]] = None):
-        self._stmt = stmt
-        self._rows = None if columns is None else []
-        self._rows_count = -1
-        self._columns = columns
-        self._type_converters = [] if type_converters is None else type_converters
+        self.stmt = stmt
+        self.rows: Optional[list] = None if columns is None else []
+        self.rows_count = -1
+        self.columns = columns
+        self.type_converters: list[Callable] = [] if type_converters is None else type_converters
+        # формат значений каждой колонки результата: 0 - текст, 1 - бинарный
+        self.result_formats: tuple = ()
+        # имя колонки -> позиция, общий для всех Record результата
+        self.record_index: Optional[Mapping[str, int]] = None
+        self.row_decoder: Optional[Callable[[bytes], tuple]] = None
+        # построитель результата по колонкам (run_query(..., result_format='columnar'))
+        self.columnar: Optional['ColumnarBuilder'] = None
         self.error = None
-
-    @property
-    def stmt(self):
-        return self._stmt
-
-    @property
-    def rows(self):
-        return self._rows
-
-    @property
-    def type_converters(self) -> list[Callable]:
-        return self._type_converters
-
-    @property
-    def columns(self):
-        return self._columns
-
-    @property
-    def rows_count(self):
-        return self._rows_count
-
-    @type_converters.setter
-    def type_converters(self, value: list[Callable]):
-        self._type_converters = value
-
-    @columns.setter
-    def columns(self, values: list):
-        self._columns = values
-
-    @rows.setter
-    def rows(self, values: list):
-        self._rows = values
-
-    @rows_count.setter
-    def rows_count(self, value: int):
-        self._rows_count = value
@@ -0,0 +1,75 @@
+from collections import OrderedDict
+from itertools import count
+from typing import Callable, Mapping, Optional
+
+
+class PreparedStatement:
+    """ Именованный серверный prepared statement и описание его результата """
+
+    def __init__(self, name: bytes, stmt: str, oids: tuple = ()) -> None:
+        self.name = name
+        self.stmt = stmt
+        self.oids = oids
+        self.columns: Optional[list] = None
+        self.type_converters: list[Callable] = []
+        self.result_formats: tuple = ()
+        self.record_index: Optional[Mapping[str, int]] = None
+        self.row_decoder: Optional[Callable[[bytes], tuple]] = None
+        # описание результата получено (RowDescription или NoData)
+        self.described = False
+
+    @property
+    def key(self) -> tuple:
+        return self.stmt, self.oids
+
+
+class StatementCache:
+    """
+    LRU-кэш prepared statement'ов одного соединения.
+    Ключ - текст запроса и oid'ы параметров
+    """
+
+    def __init__(self, capacity: int = 100) -> None:
+        self._capacity = capacity
+        self._statements: OrderedDict[tuple, PreparedStatement] = OrderedDict()
+        self._names = count(1)
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def __len__(self) -> int:
+        return len(self._statements)
+
+    def get(self, stmt: str, oids: tuple = ()) -> Optional[PreparedStatement]:
+        statement = self._statements.get((stmt, oids))
+        if statement is not None:
+            self._statements.move_to_end(statement.key)
+        return statement
+
+    def add(self, stmt: str,
+            oids: tuple = ()) -> tuple[PreparedStatement, list[PreparedStatement]]:
+        """ Добавляет новый statement, возвращает его и вытесненные из кэша statement'ы """
+        statement = PreparedStatement(f'lc_stmt_{next(self._names)}'.encode('ascii'), stmt, oids)
+        self._statements[statement.key] = statement
+
+        evicted = []
+        while len(self._statements) > self._capacity:
+            _, evicted_statement = self._statements.popitem(last=False)
+            evicted.append(evicted_statement)
+
+        return statement, evicted
+
+    def remove(self, statement: PreparedStatement) -> None:
+        if self._statements.get(statement.key) is statement:
+            del self._statements[statement.key]
+
+    def reset_descriptions(self) -> None:
+        """ Декодеры результатов устарели: statement'ы будут описаны заново при выполнении """
+        for statement in self._statements.values():
+            # до нового описания результат запрашивается в текстовом формате
+            statement.result_formats = ()
+            statement.described = False
+
+    def clear(self) -> None:
+        self._statements.clear()
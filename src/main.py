@@ -8,12 +8,14 @@ import yaml
 from fastapi import FastAPI, Request, Response, status
 from fastapi.middleware import cors
 
-from api.v1.routes import router
+from api.v1.routes import db_source, router
 from core.utils import read_config
 from models.config_models import WebapiConfig
 
 logger = logging.getLogger(__name__)
 
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
 config = read_config()
 cfg = WebapiConfig(**config.get('webapi'))
 app: FastAPI = FastAPI()
@@ -38,6 +40,14 @@ async def check_client_subnet(request: Request, call_next: Callable):
     return await call_next(request)
 
 
+@app.get('/metrics', summary='Метрики запросов к БД в формате Prometheus', include_in_schema=False)
+async def metrics():
+    content_ = db_source.render_metrics()
+    if content_ is None:
+        return Response(status_code=status.HTTP_404_NOT_FOUND, content='Метрики выключены')
+    return Response(content=content_, media_type=PROMETHEUS_CONTENT_TYPE)
+
+
 if __name__ == '__main__':
 
     with open(Path.cwd() / 'src/log-config.yml', 'r') as stream:
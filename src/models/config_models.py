@@ -1,5 +1,5 @@
-from dataclasses import dataclass
-from typing import Any
+from dataclasses import dataclass, field
+from typing import Any, Optional
 
 
 @dataclass
@@ -10,6 +10,31 @@ class DbConfig:
     schema: str
     user: str
     password: str
+    min_size: int = 1
+    max_size: int = 10
+    acquire_timeout: float = 10.0
+    max_idle_time: float = 300.0
+    health_check_interval: float = 30.0
+    statement_cache_size: int = 100
+    # ограничение времени запроса при редиректе по короткой ссылке, сек. (None - без ограничения)
+    redirect_timeout: Optional[float] = None
+    # подключение через unix-сокет (каталог сокетов сервера или путь к файлу), минуя TCP
+    unix_socket: Optional[str] = None
+    # настройки TCP-сокета, None - системные значения
+    tcp_nodelay: bool = True
+    tcp_keepalive: bool = True
+    tcp_keepalive_idle: Optional[int] = None
+    tcp_keepalive_interval: Optional[int] = None
+    tcp_keepalive_count: Optional[int] = None
+    socket_send_buffer: Optional[int] = None
+    socket_receive_buffer: Optional[int] = None
+    # реплики для запросов на чтение: 'host' или 'host:port'
+    replicas: list[str] = field(default_factory=list)
+    # реплика с большим отставанием (сек.) исключается из маршрутизации до следующей проверки
+    max_replica_lag: float = 10.0
+    replica_check_interval: float = 5.0
+    # счетчики и гистограммы времени запросов для /metrics
+    metrics: bool = False
 
 
 class WebapiCorsConfig:
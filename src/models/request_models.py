@@ -3,3 +3,7 @@ from models.base_json_model import BaseOrjsonModel
 
 class CreateShortLinkModel(BaseOrjsonModel):
     original_link: str
+
+
+class BatchShortLinkModel(BaseOrjsonModel):
+    original_url: str
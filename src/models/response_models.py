@@ -4,3 +4,8 @@ from models.base_json_model import BaseOrjsonModel
 class CreatedLinkModel(BaseOrjsonModel):
     url_id: str
     link: str
+
+
+class BatchCreatedLinkModel(BaseOrjsonModel):
+    url_id: str
+    short_url: str
@@ -1,12 +1,29 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
 from core.abstract_source import AbstractSource
 from core.db_base import DbBase
+from db.pg_copy import quote_literal
 from db.pg_core_connect import CustomDbError
+from db.pg_record import Record
+
+# канал NOTIFY, в который уходят url_id измененных ссылок
+LINKS_CHANNEL = 'links_changed'
+LINKS_CACHE_SIZE = 10000
 
 
 class DbService(DbBase):
 
-    def __init__(self, db_source: AbstractSource):
+    def __init__(self, db_source: AbstractSource, redirect_timeout: Optional[float] = None):
         super().__init__(db_source=db_source)
+        # бюджет времени на поиск оригинальной ссылки при редиректе
+        self._redirect_timeout = redirect_timeout
+        # url_id -> результат get_original_by_short, работает только при активной подписке
+        # на LINKS_CHANNEL, иначе изменения с других реплик сервиса не были бы видны
+        self._links_cache: OrderedDict[str, list[Record]] = OrderedDict()
+        # счетчик уведомлений: результат запроса, за время которого ссылки менялись, не кэшируется
+        self._links_version = 0
 
     @property
     def schema(self):
@@ -26,35 +43,122 @@ class DbService(DbBase):
     async def create_link(self, url_id: str, original_url: str):
 
         stmt = f'INSERT INTO {self.schema}.links(url_id, original_url) values($1,$2)'
-        await self._execute('START TRANSACTION')
-        result = await self._execute(stmt, url_id, original_url)
-        await self._execute('COMMIT')
+        result = await self._execute(stmt, url_id, original_url, in_transaction=True)
 
         return result
 
+    async def create_links(self, links: list[tuple[str, str]]) -> int:
+        """ Пакетное создание ссылок, links - пары (url_id, original_url) """
+        stmt = f'INSERT INTO {self.schema}.links(url_id, original_url) values($1,$2)'
+        return await self._executemany(stmt, links)
+
+    async def start_links_cache(self) -> None:
+        """ Кэш ссылок в памяти, записи сбрасываются по NOTIFY от deactivate_link любой реплики """
+        await self._db_source.add_listener(LINKS_CHANNEL, self._on_link_changed,
+                                           on_lost=self._on_links_listen_lost)
+
+    def _on_link_changed(self, connection, pid: int, channel: str, url_id: str) -> None:
+        self._links_version += 1
+        self._links_cache.pop(url_id, None)
+
+    def _on_links_listen_lost(self, connection, error: BaseException) -> None:
+        # уведомления, пришедшие до переподключения, потеряны - кэш сбрасывается целиком
+        self._links_version += 1
+        self._links_cache.clear()
+
     async def get_original_by_short(self, url_id: str):
-        stmt = f'SELECT url_id, original_url, active from {self.schema}.links where url_id=$1'
-        return await self._execute(stmt, url_id)
+        if not self._db_source.is_listening(LINKS_CHANNEL):
+            result = await self._execute(self._original_by_short_stmt, url_id,
+                                         timeout=self._redirect_timeout, readonly=True)
+            if not result:
+                # ссылка могла быть создана только что и еще не дойти до реплики
+                result = await self._execute(self._original_by_short_stmt, url_id,
+                                             timeout=self._redirect_timeout)
+            return result
+
+        # кэш заполняется только с primary: NOTIFY о деактивации может прийти раньше,
+        # чем реплика применит изменение, и устаревшая запись осталась бы в кэше навсегда
+        result = self._links_cache.get(url_id)
+        if result is not None:
+            self._links_cache.move_to_end(url_id)
+            return result
+
+        version_ = self._links_version
+        result = await self._execute(self._original_by_short_stmt, url_id,
+                                     timeout=self._redirect_timeout)
+        if result and isinstance(result, list) and version_ == self._links_version:
+            self._links_cache[url_id] = result
+            if len(self._links_cache) > LINKS_CACHE_SIZE:
+                self._links_cache.popitem(last=False)
+        return result
+
+    async def get_originals_by_shorts(self, url_ids: list[str]):
+        """ Оригинальные ссылки для множества коротких одним запросом """
+        stmt = f'SELECT url_id, original_url, active from {self.schema}.links ' \
+            'where url_id = ANY($1)'
+        return await self._execute(stmt, url_ids, readonly=True)
 
     async def deactivate_link(self, url_id: str):
-        stmt = f'UPDATE {self.schema}.links SET active=0 where url_id=$1'
-        await self._execute('START TRANSACTION')
-        result = await self._execute(stmt, url_id)
-        await self._execute('COMMIT')
+        # NOTIFY уходит подписчикам только при фиксации транзакции
+        stmt = f'WITH updated AS (UPDATE {self.schema}.links SET active=0 ' \
+            'where url_id=$1 RETURNING url_id) ' \
+            f"SELECT count(*) from updated, pg_notify('{LINKS_CHANNEL}', updated.url_id)"
+        result = await self._execute(stmt, url_id, in_transaction=True)
+        self._links_cache.pop(url_id, None)
+        if result and isinstance(result, list):
+            return result[0]['count']
         return result
 
     async def add_statistic(self, url_id: str, info: str):
         stmt = f'INSERT INTO {self.schema}.stats(url_id, info) values($1,$2)'
-        await self._execute('START TRANSACTION')
-        result = await self._execute(stmt, url_id, info)
-        await self._execute('COMMIT')
+        result = await self._execute(stmt, url_id, info, in_transaction=True)
 
         return result
 
     async def get_stats_count_by_id(self, url_id: str):
-        stmt = f'SELECT count(*) from {self.schema}.stats where url_id=$1 '
-        return await self._execute(stmt, url_id)
+        return await self._execute(self._stats_count_stmt, url_id, readonly=True)
 
     async def get_stats_by_url_id(self, url_id: str, offset: int = 0, limit: int = 10):
-        stmt = f'SELECT info, happened from {self.schema}.stats where url_id=$1 limit $2 offset $3'
-        return await self._execute(stmt, url_id, limit, offset)
+        return await self._execute(self._stats_page_stmt, url_id, limit, offset, readonly=True)
+
+    async def get_stats_with_count_by_url_id(self, url_id: str, offset: int = 0, limit: int = 10):
+        """ Количество переходов и страница статистики за один round trip """
+        return await self._execute_pipeline((self._stats_count_stmt, url_id),
+                                            (self._stats_page_stmt, url_id, limit, offset),
+                                            readonly=True)
+
+    async def get_stats_timeline_by_url_id(self, url_id: str):
+        """ Моменты всех переходов по ссылке одной колонкой (timestamp) для аналитики """
+        stmt = f'SELECT happened from {self.schema}.stats where url_id=$1 order by happened'
+        result = await self._execute_columnar(stmt, url_id, readonly=True)
+        return result['happened']
+
+    def iter_stats_by_url_id(self, url_id: str, prefetch: int = 1000):
+        """ Вся статистика по ссылке построчно, в памяти не больше prefetch строк """
+        stmt = f'SELECT info, happened from {self.schema}.stats where url_id=$1 order by id'
+        return self._iterate(stmt, url_id, prefetch=prefetch, readonly=True)
+
+    def export_stats_by_url_id(self, url_id: str, since: Optional[datetime] = None,
+                               until: Optional[datetime] = None):
+        """ Статистика по ссылке в CSV потоком байт, без разбора на строки и словари """
+        conditions = [f'url_id={quote_literal(url_id)}']
+        if since is not None:
+            conditions.append(f'happened >= {quote_literal(since)}')
+        if until is not None:
+            conditions.append(f'happened < {quote_literal(until)}')
+
+        stmt = f'SELECT info, happened from {self.schema}.stats ' \
+            f'where {" and ".join(conditions)} order by id'
+        return self._copy_out(stmt, readonly=True)
+
+    @property
+    def _original_by_short_stmt(self) -> str:
+        return f'SELECT url_id, original_url, active from {self.schema}.links where url_id=$1'
+
+    @property
+    def _stats_count_stmt(self) -> str:
+        return f'SELECT count(*) from {self.schema}.stats where url_id=$1 '
+
+    @property
+    def _stats_page_stmt(self) -> str:
+        return f'SELECT info, happened from {self.schema}.stats where url_id=$1 limit $2 offset $3'
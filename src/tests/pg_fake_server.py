@@ -0,0 +1,584 @@
+import asyncio
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from hashlib import md5
+from itertools import count
+from struct import Struct
+from typing import Callable, Optional, Sequence
+
+import db.db_messages as dbm
+import db.pg_types as pt
+
+INT16 = Struct('!h')
+INT32 = Struct('!i')
+MESSAGE_HEADER = Struct('!ci')
+
+PROTOCOL_VERSION = 196608
+CANCEL_REQUEST_CODE = 80877102
+SSL_REQUEST_CODE = 80877103
+SERVER_PARAMETERS = {
+    'server_version': '16.0',
+    'server_encoding': 'UTF8',
+    'client_encoding': 'UTF8',
+    'DateStyle': 'ISO, MDY',
+    'integer_datetimes': 'on',
+    'TimeZone': 'UTC',
+}
+CANCELED_MESSAGE = 'canceling statement due to user request'
+PARAMETER_NUMBER = re.compile(r'\$(\d+)')
+COPY_TO_STDOUT_STATEMENT = re.compile(r'COPY \((.*)\) TO STDOUT \(FORMAT (\w+)(, HEADER)?\)',
+                                      re.DOTALL)
+LISTEN_STATEMENT = re.compile(r'(LISTEN|UNLISTEN)\s+("[^"]+"|\w+)', re.IGNORECASE)
+PG_EPOCH = datetime(2000, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+# значения колонок в текстовом и бинарном формате протокола
+TEXT_ENCODERS: dict[int, Callable] = {
+    pt.BOOLEAN: lambda value: b't' if value else b'f',
+    # timestamptz в тексте - в часовом поясе самого значения (как в поясе сессии у Postgres)
+    pt.TIMESTAMPTZ: lambda value: value.isoformat(' ').encode(),
+}
+BINARY_ENCODERS: dict[int, Callable] = {
+    pt.BOOLEAN: lambda value: b'\x01' if value else b'\x00',
+    pt.SMALLINT: Struct('!h').pack,
+    pt.INTEGER: Struct('!i').pack,
+    pt.BIGINT: Struct('!q').pack,
+    pt.REAL: Struct('!f').pack,
+    pt.FLOAT: Struct('!d').pack,
+    pt.TEXT: lambda value: value.encode('utf8'),
+    pt.VARCHAR: lambda value: value.encode('utf8'),
+    pt.TIMESTAMPTZ: lambda value: Struct('!q').pack((value - PG_EPOCH) // MICROSECOND),
+}
+
+
+def encode_message(code: bytes, payload: bytes = b'') -> bytes:
+    return MESSAGE_HEADER.pack(code, len(payload) + 4) + payload
+
+
+def encode_text(value) -> bytes:
+    return str(value).encode('utf8')
+
+
+def encode_copy_text(value) -> bytes:
+    return encode_text(value).replace(b'\\', b'\\\\').replace(b'\t', b'\\t') \
+        .replace(b'\n', b'\\n')
+
+
+def encode_csv(value) -> bytes:
+    value_ = encode_text(value)
+    if any(char in value_ for char in (b',', b'"', b'\n')):
+        return b'"' + value_.replace(b'"', b'""') + b'"'
+    return value_
+
+
+class FakeResult:
+    """
+    Результат запроса фейкового сервера: колонки (имя, oid типа) и строки python-значений.
+    DataRow кодируются один раз для каждого набора форматов, чтобы в замерах
+    было время драйвера, а не сервера
+    """
+
+    def __init__(self, columns: Sequence[tuple[str, int]], rows: Sequence[tuple],
+                 delay: float = 0.0, error: Optional[tuple[str, str]] = None) -> None:
+        self.columns = tuple(columns)
+        self.rows = tuple(rows)
+        # время выполнения запроса, сек. - его можно прервать CancelRequest
+        self.delay = delay
+        # (sqlstate, сообщение) - запрос завершается ошибкой при выполнении
+        self.error = error
+        self._data_rows: dict[tuple, list[bytes]] = {}
+
+    @classmethod
+    def generate(cls, rows: int, columns: Sequence[tuple[str, int]] = (
+            ('id', pt.INTEGER), ('name', pt.TEXT), ('value', pt.BIGINT))) -> 'FakeResult':
+        """ rows строк заданной формы: числа - номер строки, строки - 'row-<номер>' """
+        def value(oid: int, idx: int):
+            if oid in (pt.TEXT, pt.VARCHAR):
+                return f'row-{idx}'
+            if oid == pt.BOOLEAN:
+                return idx % 2 == 0
+            if oid in (pt.REAL, pt.FLOAT):
+                return idx / 2
+            return idx
+
+        return cls(columns, [tuple(value(oid, idx) for _, oid in columns) for idx in range(rows)])
+
+    @property
+    def command_tag(self) -> bytes:
+        return f'SELECT {len(self.rows)}'.encode() + b'\x00'
+
+    def formats(self, format_codes: Sequence[int]) -> tuple:
+        """ Форматы колонок по кодам из Bind: ни одного - все текст, один - для всех колонок """
+        if not format_codes:
+            return (0,) * len(self.columns)
+        if len(format_codes) == 1:
+            return tuple(format_codes) * len(self.columns)
+        return tuple(format_codes)
+
+    def row_description(self, formats: tuple) -> bytes:
+        payload = bytearray(INT16.pack(len(self.columns)))
+        for (name, oid), format_ in zip(self.columns, formats):
+            payload.extend(name.encode('utf8') + b'\x00')
+            payload.extend(Struct('!ihihih').pack(0, 0, oid, -1, -1, format_))
+        return encode_message(dbm.ROW_DESCRIPTION, bytes(payload))
+
+    def copy_lines(self, format_: str, header: bool = False) -> list[bytes]:
+        """ Строки результата в текстовом формате COPY или в CSV """
+        if format_ == 'csv':
+            encode, separator, null = encode_csv, b',', b''
+        else:
+            encode, separator, null = encode_copy_text, b'\t', b'\\N'
+        lines = [separator.join(name.encode('utf8') for name, _ in self.columns) + b'\n'] \
+            if header else []
+        for row in self.rows:
+            lines.append(separator.join(null if value is None else encode(value)
+                                        for value in row) + b'\n')
+        return lines
+
+    def data_rows(self, formats: tuple) -> list[bytes]:
+        data_rows = self._data_rows.get(formats)
+        if data_rows is None:
+            encoders = [BINARY_ENCODERS[oid] if format_ else TEXT_ENCODERS.get(oid, encode_text)
+                        for (_, oid), format_ in zip(self.columns, formats)]
+            data_rows = self._data_rows[formats] = [
+                self._encode_row(row, encoders) for row in self.rows]
+        return data_rows
+
+    @staticmethod
+    def _encode_row(row: tuple, encoders: list[Callable]) -> bytes:
+        payload = bytearray(INT16.pack(len(row)))
+        for value, encoder in zip(row, encoders):
+            if value is None:
+                payload.extend(INT32.pack(-1))
+            else:
+                encoded = encoder(value)
+                payload.extend(INT32.pack(len(encoded)))
+                payload.extend(encoded)
+        return encode_message(dbm.DATA_ROW, bytes(payload))
+
+
+class FakePgServer:
+    """
+    Сервер, отвечающий по протоколу Postgres v3 без настоящей БД: startup, MD5-аутентификация,
+    простые запросы, extended query (Parse/Bind/Describe/Execute/Sync, Close, Flush),
+    COPY ... FROM STDIN (данные сохраняются в copied) и COPY (...) TO STDOUT.
+    CancelRequest прерывает запрос, выполняющийся FakeResult.delay сек.,
+    LISTEN/UNLISTEN и уведомления notify().
+    На любой запрос возвращается result (или результат resolver(stmt), если он задан).
+    Сервер работает в том же event loop, что и клиент:
+
+        async with FakePgServer(FakeResult.generate(rows=100)) as server:
+            connection = PgCoreConnect(**server.connect_params)
+    """
+
+    def __init__(self, result: Optional[FakeResult] = None, user: str = 'app',
+                 password: str = 'secret', db_name: str = 'fake_db',
+                 resolver: Optional[Callable[[str], FakeResult]] = None,
+                 parameters: Optional[dict[str, str]] = None,
+                 ignore_cancel: bool = False) -> None:
+        self.result = result or FakeResult.generate(rows=1)
+        # ParameterStatus после аутентификации, например {'TimeZone': 'Europe/Moscow'}
+        self.parameters = {**SERVER_PARAMETERS, **(parameters or {})}
+        self.user = user
+        self.password = password
+        self.db_name = db_name
+        self._resolver = resolver
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.port = 0
+        # количество сообщений от клиента по типам - для проверок в тестах
+        self.received: dict[bytes, int] = {}
+        # данные завершенных COPY ... FROM STDIN: (запрос, все CopyData подряд)
+        self.copied: list[tuple[str, bytes]] = []
+        # Execute, зафиксированные Sync: (запрос, текстовые значения параметров);
+        # после ошибки все Execute до Sync откатываются вместе с неявной транзакцией
+        self.executed: list[tuple[str, tuple]] = []
+        # CancelRequest принимаются, но запрос не прерывают (зависший сервер)
+        self.ignore_cancel = ignore_cancel
+        self.cancel_requests = 0
+        # сессии по ключу из BackendKeyData - адресаты CancelRequest
+        self._sessions: dict[int, '_FakeSession'] = {}
+        self._keys = count(1)
+
+    @property
+    def connect_params(self) -> dict:
+        return {'host': '127.0.0.1', 'port': self.port, 'db_name': self.db_name,
+                'user': self.user, 'password': self.password}
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._serve, '127.0.0.1', 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self) -> 'FakePgServer':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    def resolve(self, stmt: str) -> FakeResult:
+        return self._resolver(stmt) if self._resolver is not None else self.result
+
+    async def notify(self, channel: str, payload: str = '') -> int:
+        """ NotificationResponse всем сессиям, подписанным на channel; возвращает их число """
+        sessions_ = [session for session in self._sessions.values() if channel in session.channels]
+        for session in sessions_:
+            await session.notify(channel, payload)
+        return len(sessions_)
+
+    def listening(self, channel: str) -> int:
+        return sum(channel in session.channels for session in self._sessions.values())
+
+    def drop_connections(self) -> None:
+        """ Разрыв всех клиентских соединений (рестарт БД, сбой сети) """
+        for session in self._sessions.values():
+            session.drop()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            key = await self._startup(reader, writer)
+            if key is not None:
+                session = self._sessions[key] = _FakeSession(self, reader, writer)
+                try:
+                    await session.run()
+                finally:
+                    del self._sessions[key]
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _startup(self, reader: asyncio.StreamReader,
+                       writer: asyncio.StreamWriter) -> Optional[int]:
+        """ Startup и аутентификация, возвращает ключ сессии или None """
+        length = INT32.unpack(await reader.readexactly(4))[0]
+        payload = await reader.readexactly(length - 4)
+        code = INT32.unpack(payload[:4])[0]
+        if code == SSL_REQUEST_CODE:
+            writer.write(b'N')
+            return await self._startup(reader, writer)
+        if code == CANCEL_REQUEST_CODE:
+            # ответа на CancelRequest нет - сервер просто закрывает соединение
+            self.cancel_requests += 1
+            session = self._sessions.get(INT32.unpack(payload[8:12])[0])
+            if session is not None and not self.ignore_cancel:
+                session.cancel()
+            return None
+        if code != PROTOCOL_VERSION:
+            return None
+
+        items = payload[4:].split(b'\x00')
+        params = dict(zip(items[::2], items[1::2]))
+        salt = os.urandom(4)
+        writer.write(encode_message(dbm.AUTHENTICATION_REQUEST, INT32.pack(5) + salt))
+        await writer.drain()
+
+        code, length = MESSAGE_HEADER.unpack(await reader.readexactly(5))
+        password = (await reader.readexactly(length - 4)).rstrip(b'\x00')
+        user = params.get(b'user', b'')
+        expected = md5(self.password.encode() + user).hexdigest().encode()
+        expected = b'md5' + md5(expected + salt).hexdigest().encode()
+        if code != dbm.PASSWORD or user != self.user.encode() or password != expected:
+            writer.write(error_response('28P01', 'password authentication failed'))
+            await writer.drain()
+            return None
+
+        key = next(self._keys)
+        writer.write(encode_message(dbm.AUTHENTICATION_REQUEST, INT32.pack(0)))
+        for name, value in self.parameters.items():
+            writer.write(encode_message(dbm.PARAMETER_STATUS,
+                                        name.encode() + b'\x00' + value.encode() + b'\x00'))
+        writer.write(encode_message(dbm.BACKEND_KEY_DATA, Struct('!ii').pack(os.getpid(), key)))
+        writer.write(encode_message(dbm.CONNECTION_READY, dbm.IDLE))
+        await writer.drain()
+        return key
+
+
+def error_response(code: str, message: str) -> bytes:
+    fields = f'SERROR\x00C{code}\x00M{message}\x00\x00'.encode()
+    return encode_message(dbm.ERROR_RESPONSE, fields)
+
+
+def copy_rows_count(stmt: str, data: bytes) -> int:
+    if ' (FORMAT binary)' not in stmt:
+        return data.count(b'\n')
+
+    rows, idx = 0, 19    # сигнатура, флаги и длина расширения заголовка
+    while True:
+        fields = INT16.unpack_from(data, idx)[0]
+        idx += 2
+        if fields == -1:
+            return rows
+        for _ in range(fields):
+            length = INT32.unpack_from(data, idx)[0]
+            idx += 4 + max(length, 0)
+        rows += 1
+
+
+class _FakeSession:
+    """ Обработка сообщений одного клиента после startup """
+
+    def __init__(self, server: FakePgServer, reader: asyncio.StreamReader,
+                 writer: asyncio.StreamWriter) -> None:
+        self._server = server
+        self._reader = reader
+        self._writer = writer
+        self._statements: dict[bytes, tuple[str, tuple]] = {}
+        # безымянный портал: результат, форматы колонок и позиция для Execute с max_rows
+        self._portal: Optional[tuple[FakeResult, tuple]] = None
+        self._portal_position = 0
+        self._portal_query: Optional[tuple[str, tuple]] = None
+        # выполненные Execute неявной транзакции, фиксируются Sync
+        self._pending: list[tuple[str, tuple]] = []
+        # после ошибки extended query сообщения пропускаются до Sync
+        self._failed = False
+        # COPY ... FROM STDIN: запрос и принятые CopyData до CopyDone / CopyFail
+        self._copy_in: Optional[tuple[str, bytearray]] = None
+        self._cancel_requested = asyncio.Event()
+        # каналы LISTEN
+        self.channels: set[str] = set()
+        self._handlers = {
+            dbm.QUERY: self._query,
+            dbm.PARSE: self._parse,
+            dbm.BIND: self._bind,
+            dbm.DESCRIBE: self._describe,
+            dbm.EXECUTE: self._execute,
+            dbm.CLOSE: self._close,
+            dbm.SYNC: self._sync,
+            dbm.FLUSH: self._flush,
+        }
+
+    async def run(self) -> None:
+        received = self._server.received
+        while True:
+            code, length = MESSAGE_HEADER.unpack(await self._reader.readexactly(5))
+            payload = await self._reader.readexactly(length - 4)
+            received[code] = received.get(code, 0) + 1
+            if code == dbm.TERMINATE:
+                return
+            if self._copy_in is not None:
+                self._copy_message(code, payload)
+                await self._writer.drain()
+                continue
+            if self._failed and code != dbm.SYNC:
+                continue
+            handler = self._handlers.get(code)
+            if handler is None:
+                self._fail('08P01', f'unsupported message {code!r}')
+                continue
+            outcome = handler(payload)
+            if outcome is not None:
+                await outcome
+            if code in (dbm.QUERY, dbm.SYNC, dbm.FLUSH):
+                await self._writer.drain()
+
+    def cancel(self) -> None:
+        self._cancel_requested.set()
+
+    async def notify(self, channel: str, payload: str) -> None:
+        self._write(dbm.NOTIFICATION_RESPONSE, INT32.pack(os.getpid())
+                    + channel.encode() + b'\x00' + payload.encode() + b'\x00')
+        await self._writer.drain()
+
+    def drop(self) -> None:
+        self._writer.close()
+
+    async def _run_delay(self, result: FakeResult) -> bool:
+        """ Выполнение запроса result.delay сек., True - запрос прерван CancelRequest """
+        if not result.delay:
+            return False
+        self._cancel_requested.clear()
+        try:
+            await asyncio.wait_for(self._cancel_requested.wait(), result.delay)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def _write(self, code: bytes, payload: bytes = b'') -> None:
+        self._writer.write(encode_message(code, payload))
+
+    def _fail(self, code: str, message: str) -> None:
+        self._writer.write(error_response(code, message))
+        self._failed = True
+
+    async def _query(self, payload: bytes) -> None:
+        stmt = payload.rstrip(b'\x00').decode('utf8')
+        if stmt.startswith('COPY ') and ' FROM STDIN' in stmt:
+            # формат COPY целиком, колонки не описываем
+            self._write(dbm.COPY_IN_RESPONSE, bytes([' (FORMAT binary)' in stmt]) + INT16.pack(0))
+            self._copy_in = (stmt, bytearray())
+            return
+        copy_out = COPY_TO_STDOUT_STATEMENT.fullmatch(stmt)
+        if copy_out is not None:
+            self._copy_out(*copy_out.groups())
+            return
+        listen = LISTEN_STATEMENT.fullmatch(stmt)
+        if listen is not None:
+            self._listen(listen.group(1).upper(), listen.group(2).strip('"'))
+            return
+
+        result = self._server.resolve(stmt)
+        if await self._run_delay(result):
+            self._writer.write(error_response('57014', CANCELED_MESSAGE))
+            self._write(dbm.CONNECTION_READY, dbm.IDLE)
+            return
+        if result.error is not None:
+            self._writer.write(error_response(*result.error))
+            self._write(dbm.CONNECTION_READY, dbm.IDLE)
+            return
+
+        formats = result.formats(())
+        if result.columns:
+            self._writer.write(result.row_description(formats))
+        self._writer.writelines(result.data_rows(formats))
+        self._write(dbm.COMMAND_COMPLETE, result.command_tag)
+        self._write(dbm.CONNECTION_READY, dbm.IDLE)
+
+    def _copy_out(self, query: str, format_: str, header: Optional[str]) -> None:
+        """ COPY (query) TO STDOUT: строка результата query - одно сообщение CopyData """
+        if format_ == 'binary':
+            self._writer.write(error_response('0A000', 'binary COPY is not supported'))
+        else:
+            result = self._server.resolve(query)
+            self._write(dbm.COPY_OUT_RESPONSE, b'\x00' + INT16.pack(len(result.columns))
+                        + INT16.pack(0) * len(result.columns))
+            for line in result.copy_lines(format_, header=bool(header)):
+                self._write(dbm.COPY_DATA, line)
+            self._write(dbm.COPY_DONE)
+            self._write(dbm.COMMAND_COMPLETE, f'COPY {len(result.rows)}'.encode() + b'\x00')
+        self._write(dbm.CONNECTION_READY, dbm.IDLE)
+
+    def _listen(self, command: str, channel: str) -> None:
+        if command == 'LISTEN':
+            self.channels.add(channel)
+        else:
+            self.channels.discard(channel)
+        self._write(dbm.COMMAND_COMPLETE, command.encode() + b'\x00')
+        self._write(dbm.CONNECTION_READY, dbm.IDLE)
+
+    def _copy_message(self, code: bytes, payload: bytes) -> None:
+        """ Режим COPY FROM STDIN: Flush и Sync сервер в нем игнорирует """
+        stmt, data = self._copy_in    # type: ignore
+        if code == dbm.COPY_DATA:
+            data.extend(payload)
+            return
+        if code in (dbm.FLUSH, dbm.SYNC):
+            return
+
+        self._copy_in = None
+        if code == dbm.COPY_DONE:
+            self._server.copied.append((stmt, bytes(data)))
+            tag = f'COPY {copy_rows_count(stmt, data)}'
+            self._write(dbm.COMMAND_COMPLETE, tag.encode() + b'\x00')
+        elif code == dbm.COPY_FAIL:
+            message = payload.rstrip(b'\x00').decode('utf8')
+            self._writer.write(error_response('57014', f'COPY from stdin failed: {message}'))
+        else:
+            self._writer.write(error_response('08P01', f'unexpected message {code!r} during COPY'))
+        self._write(dbm.CONNECTION_READY, dbm.IDLE)
+
+    def _parse(self, payload: bytes) -> None:
+        name, stmt, rest = payload.split(b'\x00', 2)
+        count = INT16.unpack(rest[:2])[0]
+        oids = Struct(f'!{count}i').unpack(rest[2:2 + 4 * count])
+        self._statements[name] = (stmt.decode('utf8'), oids)
+        self._write(dbm.PARSE_COMPLETE)
+
+    def _bind(self, payload: bytes) -> None:
+        portal, name, rest = payload.split(b'\x00', 2)
+        statement = self._statements.get(name)
+        if statement is None:
+            self._fail('26000', f'prepared statement "{name.decode()}" does not exist')
+            return
+
+        idx = 0
+        count = INT16.unpack_from(rest, idx)[0]
+        idx += 2 + 2 * count
+        count = INT16.unpack_from(rest, idx)[0]
+        idx += 2
+        params = []
+        for _ in range(count):
+            length = INT32.unpack_from(rest, idx)[0]
+            params.append(None if length < 0 else rest[idx + 4:idx + 4 + length].decode('utf8'))
+            idx += 4 + max(length, 0)
+        count = INT16.unpack_from(rest, idx)[0]
+        format_codes = Struct(f'!{count}h').unpack_from(rest, idx + 2)
+
+        result = self._server.resolve(statement[0])
+        self._portal = (result, result.formats(format_codes))
+        self._portal_position = 0
+        self._portal_query = (statement[0], tuple(params))
+        self._write(dbm.BIND_COMPLETE)
+
+    def _describe(self, payload: bytes) -> None:
+        if payload[:1] == dbm.STATEMENT:
+            statement = self._statements.get(payload[1:].rstrip(b'\x00'))
+            if statement is None:
+                self._fail('26000', 'prepared statement does not exist')
+                return
+            stmt, oids = statement
+            count = max((int(number) for number in PARAMETER_NUMBER.findall(stmt)), default=0)
+            oids = tuple(oids[idx] if idx < len(oids) and oids[idx] else pt.TEXT
+                         for idx in range(count))
+            self._write(dbm.PARAMETER_DESCRIPTION,
+                        INT16.pack(count) + Struct(f'!{count}i').pack(*oids))
+            result = self._server.resolve(stmt)
+            formats = result.formats(())
+        elif self._portal is not None:
+            result, formats = self._portal
+        else:
+            self._fail('34000', 'portal does not exist')
+            return
+
+        if result.columns:
+            self._writer.write(result.row_description(formats))
+        else:
+            self._write(dbm.NO_DATA)
+
+    async def _execute(self, payload: bytes) -> None:
+        if self._portal is None:
+            self._fail('34000', 'portal does not exist')
+            return
+
+        result, formats = self._portal
+        if await self._run_delay(result):
+            self._fail('57014', CANCELED_MESSAGE)
+            return
+        if result.error is not None:
+            self._fail(*result.error)
+            return
+
+        data_rows = result.data_rows(formats)
+        max_rows = INT32.unpack(payload[-4:])[0]
+        start = self._portal_position
+        end = len(data_rows) if max_rows <= 0 else min(start + max_rows, len(data_rows))
+        self._writer.writelines(data_rows[start:end] if start or end < len(data_rows)
+                                else data_rows)
+        self._portal_position = end
+        if max_rows > 0 and end < len(data_rows):
+            self._write(dbm.PORTAL_SUSPENDED)
+        else:
+            self._pending.append(self._portal_query)    # type: ignore
+            self._write(dbm.COMMAND_COMPLETE, result.command_tag)
+
+    def _close(self, payload: bytes) -> None:
+        if payload[:1] == dbm.STATEMENT:
+            self._statements.pop(payload[1:].rstrip(b'\x00'), None)
+        self._write(dbm.CLOSE_COMPLETE)
+
+    def _sync(self, payload: bytes) -> None:
+        if not self._failed:
+            self._server.executed.extend(self._pending)
+        self._pending.clear()
+        self._failed = False
+        self._portal = None
+        self._write(dbm.CONNECTION_READY, dbm.IDLE)
+
+    def _flush(self, payload: bytes) -> None:
+        pass
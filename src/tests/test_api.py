@@ -18,6 +18,10 @@ def create_link_mock(*args, **kwargs):
     return 1
 
 
+def deactivate_link_mock(*args, **kwargs):
+    return [{'count': 1}]
+
+
 def get_short_url_mock(*args, **kwargs):
     return [{'url_id': 'ab12', 'original_url': 'https://prakticum.yandex.ru', 'active': 1}]
 
@@ -30,6 +34,15 @@ def get_stats_mock(*args, **kwargs):
     return [{'ulr_id': 'ab12', 'count': 123}]
 
 
+def get_stats_full_mock(*args, **kwargs):
+    return [[{'count': 2}], [{'info': 'host: 127.0.0.1'}, {'info': 'host: 127.0.0.2'}]]
+
+
+async def export_stats_mock(*args, **kwargs):
+    yield b'info,happened\n'
+    yield b'host: 127.0.0.1,2023-01-01 00:00:00+00\n'
+
+
 class TestApi(TestCase):
 
     def test_health(self):
@@ -60,8 +73,10 @@ class TestApi(TestCase):
         with patch('api.v1.routes.DbService._execute') as db_mock:
             db_mock.side_effect = create_link_mock
             resp_ = client.post('/', json={'original_link': 'https://prakticum.yandex.ru'})
+            resp_data: dict = resp_.json()
 
             self.assertEqual(201, resp_.status_code)
+            self.assertEqual(f'http://testserver/{resp_data["url_id"]}', resp_data['link'])
 
     def test_redirect_by_short_url(self):
         with patch('api.v1.routes.DbService._execute') as db_mock:
@@ -78,7 +93,7 @@ class TestApi(TestCase):
 
     def test_deactivate_url(self):
         with patch('api.v1.routes.DbService._execute') as db_mock:
-            db_mock.side_effect = create_link_mock
+            db_mock.side_effect = deactivate_link_mock
             resp_ = client.delete('/ab12')
 
             self.assertEqual(200, resp_.status_code)
@@ -91,3 +106,45 @@ class TestApi(TestCase):
 
             self.assertEqual(200, resp_.status_code)
             self.assertEqual('ab12', resp_data.get('url_id'))
+
+    def test_statistics_full_info(self):
+        with patch('api.v1.routes.DbService._execute_pipeline') as db_mock:
+            db_mock.side_effect = get_stats_full_mock
+            resp_ = client.get('/ab12/status', params={'full-info': True})
+            resp_data: dict = resp_.json()
+
+            self.assertEqual(200, resp_.status_code)
+            self.assertEqual(2, resp_data.get('count'))
+            self.assertEqual(2, len(resp_data.get('add_info')))
+
+    def test_export_statistics(self):
+        with patch('api.v1.routes.DbService.export_stats_by_url_id') as db_mock:
+            db_mock.side_effect = export_stats_mock
+            resp_ = client.get('/ab12/export')
+
+            self.assertEqual(200, resp_.status_code)
+            self.assertTrue(resp_.headers['content-type'].startswith('text/csv'))
+            self.assertEqual(2, len(resp_.text.splitlines()))
+
+    def test_create_short_links_batch(self):
+        with patch('api.v1.routes.DbService._executemany') as db_mock:
+            db_mock.side_effect = create_link_mock
+            resp_ = client.post('/shorten',
+                                json=[{'original_url': 'https://prakticum.yandex.ru'},
+                                      {'original_url': 'https://yandex.ru'}])
+            resp_data: list = resp_.json()
+
+            self.assertEqual(201, resp_.status_code)
+            self.assertEqual(2, len(resp_data))
+            self.assertEqual(f'http://testserver/{resp_data[0]["url_id"]}',
+                             resp_data[0]['short_url'])
+
+    def test_short_url_ignores_query_string(self):
+        with patch('api.v1.routes.DbService._executemany') as db_mock:
+            db_mock.side_effect = create_link_mock
+            resp_ = client.post('/shorten?source=shorten',
+                                json=[{'original_url': 'https://yandex.ru'}])
+            resp_data: list = resp_.json()
+
+            self.assertEqual(f'http://testserver/{resp_data[0]["url_id"]}',
+                             resp_data[0]['short_url'])
@@ -0,0 +1,89 @@
+from contextlib import asynccontextmanager
+from unittest import IsolatedAsyncioTestCase
+
+from services.db import LINKS_CHANNEL, DbService
+
+
+class FakeSource:
+
+    schema = 'links'
+
+    def __init__(self) -> None:
+        self.callbacks = {}
+        self.on_lost = []
+        self.queries = 0
+
+    @asynccontextmanager
+    async def acquire(self, readonly=False):
+        yield self
+
+    async def run_query(self, stmt: str, *args, timeout=None):
+        self.queries += 1
+        return FakeResult()
+
+    async def add_listener(self, channel, callback, on_lost=None):
+        self.callbacks[channel] = callback
+        if on_lost is not None:
+            self.on_lost.append(on_lost)
+
+    def is_listening(self, channel: str) -> bool:
+        return channel in self.callbacks
+
+    def notify(self, payload: str):
+        self.callbacks[LINKS_CHANNEL](None, 1, LINKS_CHANNEL, payload)
+
+    def lose(self):
+        callbacks, self.callbacks = self.callbacks, {}
+        for on_lost in self.on_lost:
+            on_lost(None, EOFError())
+        return callbacks
+
+    def restore(self, callbacks):
+        self.callbacks = callbacks
+
+
+class FakeResult:
+    rows = [{'url_id': 'ab12', 'original_url': 'https://yandex.ru', 'active': 1}]
+    columns = ['url_id', 'original_url', 'active']
+    rows_count = 1
+
+
+class TestLinksCache(IsolatedAsyncioTestCase):
+
+    async def test_no_cache_without_listener(self):
+        source = FakeSource()
+        srv = DbService(source)
+
+        await srv.get_original_by_short('ab12')
+        await srv.get_original_by_short('ab12')
+
+        self.assertEqual(2, source.queries)
+
+    async def test_cache_invalidated_by_notify(self):
+        source = FakeSource()
+        srv = DbService(source)
+        await srv.start_links_cache()
+
+        await srv.get_original_by_short('ab12')
+        await srv.get_original_by_short('ab12')
+        self.assertEqual(1, source.queries)
+
+        source.notify('ab12')
+        await srv.get_original_by_short('ab12')
+        self.assertEqual(2, source.queries)
+
+    async def test_cache_cleared_once_when_listening_lost(self):
+        source = FakeSource()
+        srv = DbService(source)
+        await srv.start_links_cache()
+        await srv.get_original_by_short('ab12')
+
+        # пока подписки нет, уведомления теряются: кэш не используется и не заполняется
+        callbacks = source.lose()
+        await srv.get_original_by_short('ab12')
+        self.assertEqual(2, source.queries)
+
+        source.restore(callbacks)
+        await srv.get_original_by_short('ab12')
+        await srv.get_original_by_short('ab12')
+        self.assertEqual(3, source.queries)
@@ -0,0 +1,150 @@
+import asyncio
+import os
+import time
+from timeit import repeat
+from typing import NamedTuple
+from unittest import IsolatedAsyncioTestCase, TestCase, skipUnless
+
+import db.pg_types as pt
+from db.pg_converters import PG_TYPES
+from db.pg_core_connect import PgCoreConnect
+from db.pg_metrics import QueryMetrics
+from tests.pg_fake_server import FakePgServer, FakeResult
+from tests.test_pg_converters import LEGACY_TYPES, TEXT_SAMPLES
+
+# замеры зависят от загрузки машины, поэтому в обычном прогоне тестов не участвуют:
+# PG_BENCHMARK_SCALE=1 python -m pytest -s tests/test_pg_benchmark.py (10 - полный объем)
+SCALE = float(os.environ.get('PG_BENCHMARK_SCALE') or '0')
+QUERIES = int(500 * SCALE)
+ROWS = int(10000 * SCALE)
+COLUMNS = (('id', pt.INTEGER), ('name', pt.TEXT), ('value', pt.BIGINT), ('ratio', pt.FLOAT),
+           ('active', pt.BOOLEAN))
+# одновременные запросы через одно соединение (конвейер) должны быть заметно быстрее
+# последовательных, которые ждут ответа перед отправкой следующего запроса
+PIPELINE_SPEEDUP = 1.1
+# заголовок DataRow (тип, длина, число колонок) и длина каждого значения
+DATA_ROW_OVERHEAD = 1 + 4 + 2 + 4 * len(COLUMNS)
+
+
+def best_time(converter, samples, number=2000) -> float:
+    return min(repeat(lambda: [converter(sample) for sample in samples], number=number, repeat=5))
+
+
+class LatencyStats(NamedTuple):
+    queries_per_sec: float
+    p50: float
+    p99: float
+
+    def __str__(self) -> str:
+        return f'{self.queries_per_sec:10.0f} q/s   p50 {self.p50 * 1e6:7.1f} us   ' \
+            f'p99 {self.p99 * 1e6:7.1f} us'
+
+
+async def measure_latency(connection: PgCoreConnect, stmt: str, *params) -> LatencyStats:
+    await connection.run_query(stmt, *params)    # прогрев: prepare и описание результата
+    durations = []
+    started = time.perf_counter()
+    for _ in range(QUERIES):
+        query_started = time.perf_counter()
+        await connection.run_query(stmt, *params)
+        durations.append(time.perf_counter() - query_started)
+    total = time.perf_counter() - started
+
+    durations.sort()
+    return LatencyStats(QUERIES / total, durations[len(durations) // 2],
+                        durations[int((len(durations) - 1) * 0.99)])
+
+
+@skipUnless(SCALE, 'замеры производительности: задайте PG_BENCHMARK_SCALE')
+class TestProtocolBenchmark(IsolatedAsyncioTestCase):
+    """
+    Производительность PgCoreConnect на фейковом сервере в том же процессе: сервер отдает
+    заранее закодированные сообщения, так что замеры - это в основном время драйвера
+    """
+
+    async def asyncSetUp(self):
+        # отладочный режим цикла событий, включенный IsolatedAsyncioTestCase, искажает замеры
+        asyncio.get_running_loop().set_debug(False)
+        self.rows = FakeResult.generate(ROWS, COLUMNS)
+        self.server = FakePgServer(resolver=self._resolve)
+        await self.server.start()
+        self.connection = PgCoreConnect(**self.server.connect_params)
+        await self.connection.connect()
+
+    async def asyncTearDown(self):
+        await self.connection.close()
+        await self.server.close()
+
+    def _resolve(self, stmt: str) -> FakeResult:
+        if 'from rows' in stmt:
+            return self.rows
+        return FakeResult([('value', pt.INTEGER)], [(1,)])
+
+    async def test_query_latency(self):
+        simple = await measure_latency(self.connection, 'select 1')
+        parameterized = await measure_latency(self.connection, 'select $1::int', 1)
+        print(f'\nsimple query        {simple}\nparameterized query {parameterized}')
+        self.assertLessEqual(simple.p50, simple.p99)
+
+    async def test_concurrent_queries(self):
+        stmt = 'select $1::int'
+        await self.connection.run_query(stmt, 1)
+
+        started = time.perf_counter()
+        for _ in range(QUERIES):
+            await self.connection.run_query(stmt, 1)
+        sequential = time.perf_counter() - started
+
+        started = time.perf_counter()
+        await asyncio.gather(*(self.connection.run_query(stmt, 1) for _ in range(QUERIES)))
+        concurrent = time.perf_counter() - started
+
+        self.assertGreater(sequential / concurrent, PIPELINE_SPEEDUP,
+                           f'sequential {sequential:.3f} s, concurrent {concurrent:.3f} s')
+
+    async def test_rows_decoding(self):
+        metrics = QueryMetrics()
+        stmt = 'select * from rows where id >= $1'
+        await self.connection.run_query(stmt, 0)
+        self.connection.add_query_hook(metrics)
+
+        started = time.perf_counter()
+        result = await self.connection.run_query(stmt, 0)
+        duration = time.perf_counter() - started
+
+        self.assertEqual(ROWS, len(result.rows))
+        self.assertEqual((ROWS - 1, f'row-{ROWS - 1}', ROWS - 1, (ROWS - 1) / 2, False),
+                         tuple(result.rows[-1]))
+
+        stats = metrics[stmt]
+        # все уже описано - запрос и ответ укладываются в один round trip
+        self.assertEqual(1, stats.round_trips)
+        self.assertEqual(ROWS, stats.rows)
+
+        bytes_per_row = stats.bytes_received / ROWS
+        # числа и bool после первого выполнения приходят в бинарном формате
+        payload_per_row = sum(
+            len(data_row) - DATA_ROW_OVERHEAD
+            for data_row in self.rows.data_rows((1, 0, 1, 1, 1))) / ROWS
+        overhead = bytes_per_row - payload_per_row
+        print(f'\n{ROWS} rows: {ROWS / duration:10.0f} rows/s, '
+              f'decoding {ROWS / stats.decode_time:10.0f} rows/s, '
+              f'{bytes_per_row:.1f} bytes/row ({overhead:.1f} bytes/row protocol overhead)')
+        # накладные расходы - заголовок DataRow и длины значений, плюс заголовки ответа
+        self.assertLess(overhead, DATA_ROW_OVERHEAD + 1)
+
+
+@skipUnless(SCALE, 'замеры производительности: задайте PG_BENCHMARK_SCALE')
+class TestConvertersBenchmark(TestCase):
+
+    def test_faster_than_legacy(self):
+        """ Заменённые текстовые конвертеры быстрее прежних на тех же данных """
+        number = int(2000 * SCALE)
+        for oid, legacy in LEGACY_TYPES.items():
+            converter = PG_TYPES[oid]
+            samples = [sample for sample in TEXT_SAMPLES[oid] if 'infinity' not in sample]
+            current, previous = best_time(converter, samples, number), \
+                best_time(legacy, samples, number)
+            print(f'\n{oid:5}: {current / previous:.2f} of legacy time')
+            with self.subTest(oid=oid):
+                self.assertLess(current, previous)
@@ -0,0 +1,80 @@
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+import db.pg_types as pt
+from db.pg_core_connect import PgCoreConnect
+from db.pg_errors import PgServerError, QueryTimeoutError
+from db.pg_pool import PgPool
+from tests.pg_fake_server import FakePgServer, FakeResult
+
+SLOW_QUERY_DELAY = 0.5
+TIMEOUT = 0.05
+
+
+class TestQueryTimeout(IsolatedAsyncioTestCase):
+    """ run_query(..., timeout=...): CancelRequest по отдельному соединению """
+
+    async def asyncSetUp(self):
+        self.server = FakePgServer(resolver=self._resolve)
+        await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    @staticmethod
+    def _resolve(stmt: str) -> FakeResult:
+        delay = SLOW_QUERY_DELAY if 'pg_sleep' in stmt else 0.0
+        return FakeResult([('value', pt.INTEGER)], [(1, )], delay=delay)
+
+    async def _connect(self) -> PgCoreConnect:
+        connection = PgCoreConnect(**self.server.connect_params)
+        await connection.connect()
+        self.addAsyncCleanup(connection.close)
+        return connection
+
+    async def test_cancel_and_reuse(self):
+        connection = await self._connect()
+        queries = (('simple', 'select pg_sleep(1)', ()),
+                   ('extended', 'select pg_sleep($1)', (1, )))
+        for name, stmt, params in queries:
+            with self.subTest(name):
+                with self.assertRaises(QueryTimeoutError) as raised:
+                    await connection.run_query(stmt, *params, timeout=TIMEOUT)
+                self.assertIsInstance(raised.exception.__cause__, PgServerError)
+                self.assertEqual('57014', raised.exception.__cause__.sqlstate)
+
+                # ответ на отмененный запрос дочитан - соединение пригодно для запросов
+                self.assertFalse(connection.closed)
+                result = await connection.run_query('select 1')
+                self.assertEqual([(1, )], [tuple(row) for row in result.rows])
+
+        self.assertEqual(2, self.server.cancel_requests)
+        self.assertTrue(connection.idle)
+
+    async def test_fast_query_not_cancelled(self):
+        connection = await self._connect()
+        result = await connection.run_query('select $1::int', 1, timeout=1.0)
+
+        self.assertEqual([(1, )], [tuple(row) for row in result.rows])
+        self.assertEqual(0, self.server.cancel_requests)
+
+    @patch('db.pg_core_connect.CANCEL_GRACE_PERIOD', 0.1)
+    async def test_grace_period_expired(self):
+        # сервер принимает CancelRequest, но запрос продолжает выполняться
+        self.server.ignore_cancel = True
+        pool = PgPool(lambda: PgCoreConnect(**self.server.connect_params), min_size=0,
+                      max_size=1)
+        self.addAsyncCleanup(pool.close)
+
+        with self.assertRaises(QueryTimeoutError):
+            async with pool.acquire() as first:
+                await first.run_query('select pg_sleep(1)', timeout=TIMEOUT)
+
+        self.assertTrue(first.closed)
+        self.assertEqual(1, self.server.cancel_requests)
+        # закрытое соединение не возвращается в пул
+        self.assertEqual(0, pool.size)
+        async with pool.acquire() as second:
+            self.assertIsNot(first, second)
+            result = await second.run_query('select 1')
+        self.assertEqual([(1, )], [tuple(row) for row in result.rows])
@@ -0,0 +1,57 @@
+from datetime import datetime, timezone
+from struct import pack
+from unittest import TestCase
+
+import db.pg_types as pt
+from db.pg_columnar import ColumnarBuilder
+from db.pg_converters import PG_BINARY_TYPES, PG_TYPES
+from db.pg_record import PgColumn
+
+
+def data_row(*values) -> bytes:
+    row = pack('!h', len(values))
+    for value in values:
+        row += pack('!i', -1) if value is None else pack('!i', len(value)) + value
+    return row
+
+
+class TestColumnarBuilder(TestCase):
+
+    def setUp(self) -> None:
+        columns = [
+            PgColumn('id', 0, 0, pt.BIGINT, 8, -1, 1),
+            PgColumn('happened', 0, 0, pt.TIMESTAMP, 8, -1, 1),
+            PgColumn('info', 0, 0, pt.TEXT, -1, -1, 0),
+        ]
+        self.builder = ColumnarBuilder(
+            columns,
+            [PG_BINARY_TYPES[pt.BIGINT], PG_BINARY_TYPES[pt.TIMESTAMP], PG_TYPES[pt.TEXT]],
+            (1, 1, 0),
+            use_numpy=False)
+
+    def test_fixed_width_columns(self):
+        # 2000-01-01 + 1 секунда
+        self.builder.add_row(data_row(pack('!q', 7), pack('!q', 1000000), b'ok'))
+        self.builder.add_row(data_row(pack('!q', -1), None, None))
+        result = self.builder.result()
+
+        self.assertEqual(2, result.rows_count)
+        self.assertEqual([7, -1], list(result['id'].values))
+        self.assertEqual([0, 0], list(result[0].nulls))
+        self.assertEqual(datetime(2000, 1, 1, 0, 0, 1, tzinfo=timezone.utc).timestamp() * 1000000,
+                         result['happened'].values[0])
+        self.assertEqual([0, 1], list(result['happened'].nulls))
+
+    def test_variable_width_columns(self):
+        self.builder.add_row(data_row(pack('!q', 1), None, 'привет'.encode()))
+        self.builder.add_row(data_row(pack('!q', 2), None, None))
+        result = self.builder.result()
+
+        self.assertEqual(['привет', None], result['info'].values)
+        self.assertEqual([0, 1], list(result['info'].nulls))
+
+    def test_empty_result(self):
+        result = self.builder.result()
+
+        self.assertEqual(0, result.rows_count)
+        self.assertEqual(0, len(result['id'].values))
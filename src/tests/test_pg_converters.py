@@ -0,0 +1,298 @@
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from enum import Enum, IntEnum
+from struct import pack
+from unittest import IsolatedAsyncioTestCase, TestCase
+from uuid import UUID
+from zoneinfo import ZoneInfo
+
+from dateutil.parser import parse
+
+import db.pg_converters as pc
+import db.pg_types as pt
+from db.pg_core_connect import PgCoreConnect
+from db.pg_converters import (PG_BINARY_ENCODERS, PG_BINARY_TYPES, PG_TYPES, array_recv,
+                              make_param, python_types_convert_to_pg_params,
+                              register_param_encoder)
+from tests.pg_fake_server import FakePgServer, FakeResult
+
+
+def legacy_date_in(data):
+    if data in ('infinity', '-infinity'):
+        return data
+    return datetime.strptime(data, '%Y-%m-%d').date()
+
+
+def legacy_time_in(data):
+    pattern = '%H:%M:%S.%f' if '.' in data else '%H:%M:%S'
+    return datetime.strptime(data, pattern).time()
+
+
+def legacy_timestamp_in(data):
+    if data in ('infinity', '-infinity'):
+        return data
+    try:
+        pattern = '%Y-%m-%d %H:%M:%S.%f' if '.' in data else '%Y-%m-%d %H:%M:%S'
+        return datetime.strptime(data, pattern)
+    except ValueError:
+        return parse(data)
+
+
+def legacy_timestamptz_in(data):
+    if data in ('infinity', '-infinity'):
+        return data
+    try:
+        pattern = '%Y-%m-%d %H:%M:%S.%f%z' if '.' in data else '%Y-%m-%d %H:%M:%S%z'
+        return datetime.strptime(f'{data}00', pattern)
+    except ValueError:
+        return parse(data)
+
+
+# прежние реализации конвертеров, которые заменены быстрыми
+LEGACY_TYPES = {
+    pt.DATE: legacy_date_in,
+    pt.TIME: legacy_time_in,
+    pt.TIMESTAMP: legacy_timestamp_in,
+    pt.TIMESTAMPTZ: legacy_timestamptz_in,
+}
+
+# текстовый вывод Postgres для каждого типа из PG_TYPES
+TEXT_SAMPLES = {
+    pt.BIGINT: ['-9223372036854775808', '42'],
+    pt.BOOLEAN: ['t', 'f'],
+    pt.BYTES: ['\\xdeadbeef'],
+    pt.CHAR: ['a'],
+    pt.CSTRING: ['cstring'],
+    pt.DATE: ['2022-12-31', '0001-01-01', 'infinity'],
+    pt.FLOAT: ['1.5', '-1e+300', 'NaN'],
+    pt.INET: ['192.168.0.1', '10.0.0.0/8'],
+    pt.INTEGER: ['2147483647'],
+    pt.JSON: ['{"a": [1, 2]}'],
+    pt.JSONB: ['{"a": null}'],
+    pt.MACADDR: ['08:00:2b:01:02:03'],
+    pt.MONEY: ['$1,000.00'],
+    pt.NAME: ['links'],
+    pt.NUMERIC: ['12345.6700', '-0.000120', 'NaN'],
+    pt.OID: ['16384'],
+    pt.REAL: ['0.1'],
+    pt.SMALLINT: ['-32768'],
+    pt.SMALLINT_VECTOR: ['1 2 3'],
+    pt.TEXT: ['https://yandex.ru'],
+    pt.TIME: ['10:11:12', '10:11:12.5', '23:59:59.999999'],
+    pt.TIMESTAMP: ['2022-12-31 10:11:12', '2022-12-31 10:11:12.95081', '-infinity'],
+    pt.TIMESTAMPTZ: [
+        '2022-12-31 10:11:12+00',
+        '2022-12-31 10:11:12.123456+03',
+        '2022-12-31 10:11:12.1-04:30',
+        'infinity',
+    ],
+    pt.UNKNOWN: ['unknown'],
+    pt.UUID_TYPE: ['a0eebc99-9c0b-4ef8-bb6d-6bb9bd380a11'],
+    pt.VARCHAR: ['varchar'],
+    pt.XID: ['731'],
+    pt.BIGINT_ARRAY: ['{1,NULL,3}'],
+    pt.BOOLEAN_ARRAY: ['{t,f}'],
+    pt.BYTES_ARRAY: ['{"\\\\xdead"}'],
+    pt.CHAR_ARRAY: ['{a,b}'],
+    pt.DATE_ARRAY: ['{2022-12-31,infinity}'],
+    pt.FLOAT_ARRAY: ['{{1.5,2},{3,4}}'],
+    pt.INET_ARRAY: ['{10.0.0.1}'],
+    pt.INTEGER_ARRAY: ['{}', '[0:1]={1,2}'],
+    pt.JSON_ARRAY: ['{"{\\"a\\": 1}"}'],
+    pt.JSONB_ARRAY: ['{"{\\"a\\": 1}"}'],
+    pt.NAME_ARRAY: ['{links}'],
+    pt.NUMERIC_ARRAY: ['{1.50,-0.000120}'],
+    pt.REAL_ARRAY: ['{0.1}'],
+    pt.SMALLINT_ARRAY: ['{1,2}'],
+    pt.TEXT_ARRAY: ['{a,"b c","d\\"e",NULL,"NULL"}'],
+    pt.TIME_ARRAY: ['{10:11:12.5}'],
+    pt.TIMESTAMP_ARRAY: ['{"2022-12-31 10:11:12"}'],
+    pt.TIMESTAMPTZ_ARRAY: ['{"2022-12-31 10:11:12+03"}'],
+    pt.UUID_ARRAY: ['{a0eebc99-9c0b-4ef8-bb6d-6bb9bd380a11}'],
+    pt.VARCHAR_ARRAY: ['{x}'],
+}
+
+
+def comparable(value):
+    """ Значение вместе с типом и смещением часового пояса, NaN равен NaN """
+    if isinstance(value, (float, Decimal)) and value != value:
+        return type(value), 'NaN'
+    if isinstance(value, datetime):
+        return type(value), value, value.utcoffset()
+    return type(value), value
+
+
+def numeric_bin(ndigits, weight, sign, dscale, *digits):
+    return pack(f'!hhHH{len(digits)}H', ndigits, weight, sign, dscale, *digits)
+
+
+class TestBinaryConverters(TestCase):
+
+    def test_integers(self):
+        self.assertEqual(-2, PG_BINARY_TYPES[pt.SMALLINT](pack('!h', -2)))
+        self.assertEqual(2**31 - 1, PG_BINARY_TYPES[pt.INTEGER](pack('!i', 2**31 - 1)))
+        self.assertEqual(-2**40, PG_BINARY_TYPES[pt.BIGINT](pack('!q', -2**40)))
+
+    def test_floats(self):
+        self.assertEqual(1.5, PG_BINARY_TYPES[pt.REAL](pack('!f', 1.5)))
+        self.assertEqual(0.1, PG_BINARY_TYPES[pt.FLOAT](pack('!d', 0.1)))
+
+    def test_bool_bytes_uuid(self):
+        uuid_ = UUID('a0eebc99-9c0b-4ef8-bb6d-6bb9bd380a11')
+
+        self.assertTrue(PG_BINARY_TYPES[pt.BOOLEAN](b'\x01'))
+        self.assertFalse(PG_BINARY_TYPES[pt.BOOLEAN](b'\x00'))
+        self.assertEqual(b'\xde\xad', PG_BINARY_TYPES[pt.BYTES](b'\xde\xad'))
+        self.assertEqual(uuid_, PG_BINARY_TYPES[pt.UUID_TYPE](uuid_.bytes))
+
+    def test_timestamps(self):
+        self.assertEqual(datetime(2000, 1, 1, 0, 0, 1, 5),
+                         PG_BINARY_TYPES[pt.TIMESTAMP](pack('!q', 1000005)))
+        self.assertEqual(datetime(1999, 12, 31, 23, 59, 59, tzinfo=timezone.utc),
+                         PG_BINARY_TYPES[pt.TIMESTAMPTZ](pack('!q', -1000000)))
+        self.assertEqual('infinity', PG_BINARY_TYPES[pt.TIMESTAMP](pack('!q', 2**63 - 1)))
+
+    def test_date(self):
+        self.assertEqual(date(2000, 1, 31), PG_BINARY_TYPES[pt.DATE](pack('!i', 30)))
+        self.assertEqual('-infinity', PG_BINARY_TYPES[pt.DATE](pack('!i', -2**31)))
+
+    def test_numeric(self):
+        numeric_recv = PG_BINARY_TYPES[pt.NUMERIC]
+
+        self.assertEqual('12345.6700', str(numeric_recv(numeric_bin(3, 1, 0, 4, 1, 2345, 6700))))
+        self.assertEqual('-0.000120', str(numeric_recv(numeric_bin(2, -1, 0x4000, 6, 1, 2000))))
+        self.assertEqual('10000', str(numeric_recv(numeric_bin(1, 1, 0, 0, 1))))
+        self.assertEqual('0', str(numeric_recv(numeric_bin(0, 0, 0, 0))))
+        self.assertTrue(numeric_recv(numeric_bin(0, 0, 0xC000, 0)).is_nan())
+        self.assertEqual(Decimal('-Infinity'), numeric_recv(numeric_bin(0, 0, 0xF000, 0)))
+
+
+class TestTextConverters(TestCase):
+
+    def test_samples_for_every_type(self):
+        self.assertEqual(set(PG_TYPES), set(TEXT_SAMPLES))
+
+    def test_same_result_as_legacy(self):
+        for oid, converter in PG_TYPES.items():
+            legacy = LEGACY_TYPES.get(oid, converter)
+            for sample in TEXT_SAMPLES[oid]:
+                with self.subTest(oid=oid, sample=sample):
+                    self.assertEqual(comparable(legacy(sample)), comparable(converter(sample)))
+
+    def test_timestamptz_offsets(self):
+        converter = PG_TYPES[pt.TIMESTAMPTZ]
+        first = converter('2022-12-31 10:11:12+03')
+        second = converter('2023-01-01 00:00:00+03')
+
+        self.assertEqual(timedelta(hours=3), first.utcoffset())
+        self.assertIs(first.tzinfo, second.tzinfo)
+        self.assertIs(timezone.utc, converter('2022-12-31 10:11:12.5+00').tzinfo)
+        # до 1901 г. пояса бывают со смещением до секунд
+        self.assertEqual(timedelta(hours=2, minutes=30, seconds=17),
+                         converter('1900-01-01 00:00:00+02:30:17').utcoffset())
+
+
+class Point:
+
+    def __init__(self, x: int, y: int) -> None:
+        self.x = x
+        self.y = y
+
+
+class Point3D(Point):
+    pass
+
+
+class Status(IntEnum):
+    ACTIVE = 1
+
+
+class Color(str, Enum):
+    RED = 'red'
+
+
+class MyDatetime(datetime):
+    pass
+
+
+class TestParamEncoders(TestCase):
+
+    def test_builtin_types(self):
+        self.assertEqual(('1', 'true', None, 'abc', '\\xdead', '1.5'),
+                         python_types_convert_to_pg_params((1, True, None, 'abc', b'\xde\xad',
+                                                            Decimal('1.5'))))
+
+    def test_subclasses_resolved_by_mro(self):
+        value = MyDatetime(2022, 12, 31, 10, 11, 12)
+
+        self.assertEqual('2022-12-31T10:11:12', make_param(value))
+        self.assertEqual('1', make_param(Status.ACTIVE))
+        self.assertEqual('red', make_param(Color.RED))
+
+    def test_unknown_type(self):
+        self.assertEqual('(1+2j)', make_param(1 + 2j))
+
+    def test_register_encoder(self):
+        # таблица кодировщиков общая для всех тестов - восстанавливаем ее после теста
+        self.addCleanup(pc._param_encoders.clear)
+        self.addCleanup(pc.PY_TYPES.pop, Point, None)
+        register_param_encoder(Point, lambda value: f'({value.x},{value.y})')
+
+        self.assertEqual('(1,2)', make_param(Point(1, 2)))
+        self.assertEqual('(3,4)', make_param(Point3D(3, 4)))
+
+
+class TestArrayConverters(TestCase):
+
+    def test_array_param(self):
+        self.assertEqual('{"a,b","c\\"d",NULL,"NULL"}', make_param(['a,b', 'c"d', None, 'NULL']))
+        self.assertEqual('{{"1","2"},{"3",NULL}}', make_param(((1, 2), (3, None))))
+        self.assertEqual('{}', make_param([]))
+
+    def test_text_array(self):
+        self.assertEqual(['a', 'b c', 'd"e', None, 'NULL'],
+                         PG_TYPES[pt.TEXT_ARRAY]('{a,"b c","d\\"e",NULL,"NULL"}'))
+        self.assertEqual([[1, 2], [3, None]], PG_TYPES[pt.INTEGER_ARRAY]('{{1,2},{3,NULL}}'))
+        self.assertEqual([UUID('a0eebc99-9c0b-4ef8-bb6d-6bb9bd380a11')],
+                         PG_TYPES[pt.UUID_ARRAY]('{a0eebc99-9c0b-4ef8-bb6d-6bb9bd380a11}'))
+
+    def test_binary_array_roundtrip(self):
+        values = [[1, None], [3, 4]]
+        encoded = PG_BINARY_ENCODERS[pt.BIGINT_ARRAY](values)
+
+        self.assertEqual(values, PG_BINARY_TYPES[pt.BIGINT_ARRAY](encoded))
+        self.assertEqual([], PG_BINARY_TYPES[pt.BIGINT_ARRAY](
+            PG_BINARY_ENCODERS[pt.BIGINT_ARRAY]([])))
+        self.assertEqual(['x', None], array_recv(
+            pack('!iiIii', 1, 1, pt.TEXT, 2, 1) + pack('!i', 1) + b'x' + pack('!i', -1)))
+
+    def test_ragged_array(self):
+        with self.assertRaises(ValueError):
+            PG_BINARY_ENCODERS[pt.INTEGER_ARRAY]([[1, 2], [3]])
+
+
+class TestSessionTimezone(IsolatedAsyncioTestCase):
+    """ timestamptz одинаков при первом (текстовом) и следующих (бинарных) выполнениях """
+
+    async def test_same_rows_text_and_binary(self):
+        moscow = ZoneInfo('Europe/Moscow')
+        values = [datetime(2024, 6, 1, 15, 0, tzinfo=moscow),
+                  datetime(1900, 6, 1, 14, 30, 17, tzinfo=moscow)]
+        # сервер в поясе сессии отдает значения с фиксированным смещением
+        rows = [(value.replace(tzinfo=timezone(value.utcoffset())), ) for value in values]
+        result = FakeResult([('happened', pt.TIMESTAMPTZ)], rows)
+
+        async with FakePgServer(result, parameters={'TimeZone': 'Europe/Moscow'}) as server:
+            connection = PgCoreConnect(**server.connect_params)
+            await connection.connect()
+            try:
+                first = await connection.run_query('select happened from t where id > $1', 0)
+                second = await connection.run_query('select happened from t where id > $1', 0)
+            finally:
+                await connection.close()
+
+        self.assertEqual((0, ), first.result_formats)
+        self.assertEqual((1, ), second.result_formats)
+        self.assertEqual([tuple(row) for row in first.rows], [tuple(row) for row in second.rows])
+        self.assertEqual([value.utcoffset() for value in values],
+                         [row[0].utcoffset() for row in second.rows])
@@ -0,0 +1,144 @@
+from io import BytesIO
+from struct import pack
+from unittest import IsolatedAsyncioTestCase
+
+import db.db_messages as dbm
+import db.pg_types as pt
+from db.pg_copy import COPY_BINARY_HEADER, COPY_BINARY_TRAILER
+from db.pg_core_connect import PgCoreConnect
+from db.pg_errors import PgServerError
+from tests.pg_fake_server import FakePgServer, FakeResult
+
+
+class TestCopyRecordsToTable(IsolatedAsyncioTestCase):
+    """ COPY ... FROM STDIN на фейковом сервере: что именно уходит на сервер """
+
+    async def asyncSetUp(self):
+        self.server = FakePgServer(resolver=self._resolve)
+        await self.server.start()
+        self.connection = PgCoreConnect(**self.server.connect_params)
+        await self.connection.connect()
+
+    async def asyncTearDown(self):
+        await self.connection.close()
+        await self.server.close()
+
+    @staticmethod
+    def _resolve(stmt: str) -> FakeResult:
+        if 'pg_attribute' in stmt:
+            return FakeResult([('attname', pt.TEXT), ('atttypid', pt.BIGINT)],
+                              [('id', pt.INTEGER), ('name', pt.TEXT)])
+        return FakeResult([('value', pt.INTEGER)], [(1, )])
+
+    async def test_text_escaping(self):
+        records = [(1, 'tab\there'), (2, 'line\nbreak'), (3, 'back\\slash'), (4, None)]
+        count = await self.connection.copy_records_to_table('items', records,
+                                                            columns=('id', 'name'))
+
+        self.assertEqual(4, count)
+        stmt, data = self.server.copied[0]
+        self.assertEqual('COPY "items" ("id", "name") FROM STDIN (FORMAT text)', stmt)
+        self.assertEqual(b'1\ttab\\there\n2\tline\\nbreak\n3\tback\\\\slash\n4\t\\N\n', data)
+
+    async def test_binary(self):
+        count = await self.connection.copy_records_to_table(
+            'items', [(1, 'a'), (2, None)], format_='binary')
+
+        self.assertEqual(2, count)
+        self.assertEqual(
+            COPY_BINARY_HEADER
+            + pack('!hii', 2, 4, 1) + pack('!i', 1) + b'a'
+            + pack('!hii', 2, 4, 2) + pack('!i', -1)
+            + COPY_BINARY_TRAILER,
+            self.server.copied[0][1])
+
+    async def test_error_sends_copy_fail(self):
+        # ValueError - ошибка в данных (CopyFail сразу), RuntimeError - прерывание (abort запроса)
+        for error in (ValueError, RuntimeError):
+            def records():
+                yield 1, 'a'
+                yield 2, 'b'
+                raise error('broken source')
+
+            with self.subTest(error=error.__name__):
+                with self.assertRaises(error):
+                    # маленькие порции: часть данных уже на сервере до ошибки
+                    await self.connection.copy_records_to_table('items', records(),
+                                                                chunk_size=1)
+                # соединение пригодно для следующих запросов
+                result = await self.connection.run_query('select 1')
+                self.assertEqual([(1, )], [tuple(row) for row in result.rows])
+
+        self.assertEqual(2, self.server.received[dbm.COPY_FAIL])
+        self.assertEqual(4, self.server.received[dbm.COPY_DATA])
+        self.assertEqual([], self.server.copied)
+        self.assertTrue(self.connection.idle)
+
+
+class TestCopyOut(IsolatedAsyncioTestCase):
+    """ COPY (...) TO STDOUT на фейковом сервере: итератор порций и выгрузка в sink """
+
+    async def asyncSetUp(self):
+        self.server = FakePgServer(resolver=self._resolve)
+        await self.server.start()
+        self.connection = PgCoreConnect(**self.server.connect_params)
+        await self.connection.connect()
+
+    async def asyncTearDown(self):
+        await self.connection.close()
+        await self.server.close()
+
+    @staticmethod
+    def _resolve(stmt: str) -> FakeResult:
+        if 'big' in stmt:
+            return FakeResult.generate(rows=20000)
+        return FakeResult([('id', pt.INTEGER), ('name', pt.TEXT)],
+                          [(1, 'a,"b"'), (2, None), (3, 'tab\there')])
+
+    async def _assert_reusable(self):
+        result = await self.connection.run_query('select * from items')
+        self.assertEqual(3, len(result.rows))
+        self.assertTrue(self.connection.idle)
+
+    async def test_copy_out_iter(self):
+        chunks = []
+        async with self.connection.copy_out_iter('select * from items') as copy_:
+            async for chunk in copy_:
+                chunks.append(chunk)
+
+        self.assertEqual(b'1\ta,"b"\n2\t\\N\n3\ttab\\there\n', b''.join(chunks))
+        self.assertEqual(3, copy_.rows_count)
+        await self._assert_reusable()
+
+    async def test_copy_out_sink(self):
+        expected = b'id,name\n1,"a,""b"""\n2,\n3,tab\there\n'
+        chunks = []
+        file_ = BytesIO()
+
+        async def write(chunk: bytes) -> None:
+            chunks.append(chunk)
+
+        for sink in (chunks.append, file_, write):
+            with self.subTest(sink=sink):
+                chunks.clear()
+                count = await self.connection.copy_out('select * from items', sink,
+                                                       format_='csv', header=True)
+                self.assertEqual(3, count)
+        self.assertEqual(expected, b''.join(chunks))
+        self.assertEqual(expected, file_.getvalue())
+        await self._assert_reusable()
+
+    async def test_copy_out_iter_break(self):
+        async with self.connection.copy_out_iter('select * from big') as copy_:
+            async for chunk in copy_:
+                self.assertTrue(chunk.startswith(b'0\trow-0\t0\n'))
+                break
+        # остаток выгрузки дочитан при выходе из контекста
+        await self._assert_reusable()
+
+    async def test_copy_out_error(self):
+        with self.assertRaises(PgServerError) as raised:
+            await self.connection.copy_out('select * from items', bytearray().extend,
+                                           format_='binary')
+        self.assertEqual('0A000', raised.exception.sqlstate)
+        await self._assert_reusable()
@@ -0,0 +1,67 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+
+import db.db_messages as dbm
+import db.pg_types as pt
+from db.pg_core_connect import PgCoreConnect
+from tests.pg_fake_server import FakePgServer, FakeResult
+
+ROWS = 10
+PREFETCH = 3
+
+
+class TestPgCursor(IsolatedAsyncioTestCase):
+    """ Курсор на фейковом сервере: порции по prefetch строк (Execute max_rows + Flush) """
+
+    async def asyncSetUp(self):
+        self.server = FakePgServer(FakeResult.generate(ROWS, (('id', pt.INTEGER), )))
+        await self.server.start()
+        self.connection = PgCoreConnect(**self.server.connect_params)
+        await self.connection.connect()
+
+    async def asyncTearDown(self):
+        await self.connection.close()
+        await self.server.close()
+
+    async def test_prefetch_batches(self):
+        batches = []
+        async with self.connection.cursor('select id from t', prefetch=PREFETCH) as cursor_:
+            while True:
+                rows = await cursor_.fetch()
+                if not rows:
+                    break
+                batches.append([row[0] for row in rows])
+
+        self.assertEqual([[0, 1, 2], [3, 4, 5], [6, 7, 8], [9]], batches)
+        received = self.server.received
+        # первая порция - вместе с Parse/Bind, следующие - Execute + Flush после PortalSuspended
+        self.assertEqual(4, received[dbm.EXECUTE])
+        self.assertEqual(4, received[dbm.FLUSH])
+        # Sync - только при закрытии курсора
+        self.assertEqual(1, received[dbm.SYNC])
+        self.assertTrue(self.connection.idle)
+
+    async def test_break_and_reuse(self):
+        cursor_opened = asyncio.Event()
+
+        async def other_query():
+            await cursor_opened.wait()
+            return await self.connection.run_query('select id from t')
+
+        # задача создана до открытия курсора: монопольный режим курсора ей не передается
+        other = asyncio.create_task(other_query())
+        async with self.connection.cursor('select id from t', prefetch=PREFETCH) as cursor_:
+            async for row in cursor_:
+                if not cursor_opened.is_set():
+                    cursor_opened.set()
+                    await asyncio.sleep(0.01)
+                    # запрос другой задачи ждет закрытия курсора
+                    self.assertFalse(other.done())
+                if row[0] == 1:
+                    break
+
+        # остаток результата не запрашивался: портал закрыт Sync
+        self.assertEqual(1, self.server.received[dbm.EXECUTE])
+        result = await asyncio.wait_for(other, 1.0)
+        self.assertEqual(ROWS, len(result.rows))
+        self.assertTrue(self.connection.idle)
@@ -0,0 +1,70 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+
+import db.pg_types as pt
+from db.pg_core_connect import PgCoreConnect
+from tests.pg_fake_server import FakePgServer, FakeResult
+
+QUERIES = 200
+
+
+class TestDispatcher(IsolatedAsyncioTestCase):
+    """ Одновременные запросы разных задач через одно соединение """
+
+    async def asyncSetUp(self):
+        self.server = FakePgServer(resolver=self._resolve)
+        await self.server.start()
+        self.connection = PgCoreConnect(**self.server.connect_params)
+        await self.connection.connect()
+
+    async def asyncTearDown(self):
+        await self.connection.close()
+        await self.server.close()
+
+    @staticmethod
+    def _resolve(stmt: str) -> FakeResult:
+        # select <n> - каждый запрос получает свое значение, по нему проверяется маршрутизация
+        return FakeResult([('value', pt.INTEGER)], [(int(stmt.split()[-1]), )])
+
+    async def _value(self, number: int) -> int:
+        result_ = await self.connection.run_query(f'select {number}')
+        return result_.rows[0][0]
+
+    async def test_concurrent_queries(self):
+        values = await asyncio.gather(*(self._value(i) for i in range(QUERIES)))
+        self.assertEqual(list(range(QUERIES)), values)
+        self.assertTrue(self.connection.idle)
+
+    async def test_exclusive_blocks_other_tasks(self):
+        acquired, finish = asyncio.Event(), asyncio.Event()
+
+        async def owner():
+            # монопольный режим принадлежит задаче owner и задачам, созданным внутри нее
+            token = await self.connection._dispatcher.acquire()
+            try:
+                self.assertEqual(1, await self._value(1))
+                acquired.set()
+                await finish.wait()
+            finally:
+                self.connection._dispatcher.release(token)
+
+        owner_task = asyncio.create_task(owner())
+        await acquired.wait()
+        other = asyncio.create_task(self._value(2))
+        await asyncio.sleep(0.05)
+        self.assertFalse(other.done())
+
+        finish.set()
+        await owner_task
+        self.assertEqual(2, await other)
+
+    async def test_cancelled_query_keeps_order(self):
+        first = asyncio.create_task(self._value(1))
+        second = asyncio.create_task(self._value(2))
+        await asyncio.sleep(0)
+        first.cancel()
+
+        self.assertEqual(2, await second)
+        self.assertEqual(3, await self._value(3))
+        with self.assertRaises(asyncio.CancelledError):
+            await first
@@ -0,0 +1,61 @@
+from unittest import IsolatedAsyncioTestCase
+
+import db.db_messages as dbm
+import db.pg_types as pt
+from db.pg_core_connect import PgCoreConnect
+from db.pg_errors import PgServerError
+from tests.pg_fake_server import FakePgServer, FakeResult
+
+STMT = 'insert into t(id) values($1)'
+PARAMS = [(idx, ) for idx in range(5)]
+BATCH_SIZE = 2
+
+
+class TestExecutemany(IsolatedAsyncioTestCase):
+    """ executemany на фейковом сервере: порции Bind/Execute и один Sync на весь пакет """
+
+    async def asyncSetUp(self):
+        # номер Bind (с 1), на котором запрос завершается ошибкой
+        self.failing_bind = None
+        self.binds = 0
+        self.server = FakePgServer(resolver=self._resolve)
+        await self.server.start()
+        self.connection = PgCoreConnect(**self.server.connect_params)
+        await self.connection.connect()
+
+    async def asyncTearDown(self):
+        await self.connection.close()
+        await self.server.close()
+
+    def _resolve(self, stmt: str) -> FakeResult:
+        # сервер обращается к resolver на каждый Bind
+        self.binds += 1
+        error = ('23505', 'duplicate key value') if self.binds == self.failing_bind else None
+        return FakeResult([('id', pt.INTEGER)], [], error=error)
+
+    async def test_batches(self):
+        await self.connection.executemany(STMT, PARAMS, batch_size=BATCH_SIZE)
+
+        received = self.server.received
+        self.assertEqual(1, received[dbm.PARSE])
+        self.assertEqual((5, 5), (received[dbm.BIND], received[dbm.EXECUTE]))
+        # каждая порция завершается Flush, весь пакет - одним Sync
+        self.assertEqual(3, received[dbm.FLUSH])
+        self.assertEqual(1, received[dbm.SYNC])
+        self.assertEqual([(STMT, (str(idx), )) for idx in range(5)], self.server.executed)
+        self.assertTrue(self.connection.idle)
+
+    async def test_error_in_middle_batch(self):
+        self.failing_bind = 3
+
+        with self.assertRaises(PgServerError) as raised:
+            await self.connection.executemany(STMT, PARAMS, batch_size=BATCH_SIZE)
+
+        self.assertEqual('23505', raised.exception.sqlstate)
+        # строки первой порции откатываются вместе со всем пакетом
+        self.assertEqual([], self.server.executed)
+        self.assertTrue(self.connection.idle)
+
+        await self.connection.executemany(STMT, PARAMS, batch_size=BATCH_SIZE)
+        self.assertEqual(5, len(self.server.executed))
+        self.assertTrue(self.connection.idle)
@@ -0,0 +1,83 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+from db.pg_core_connect import PgCoreConnect
+from db.pg_errors import CustomDbError
+from db.pg_source import PgDbSource
+from models.config_models import DbConfig
+from tests.pg_fake_server import FakePgServer
+
+WAIT_TIMEOUT = 2.0
+
+
+async def wait_for_condition(condition, timeout: float = WAIT_TIMEOUT) -> None:
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.01)
+    await asyncio.wait_for(poll(), timeout)
+
+
+class TestListen(IsolatedAsyncioTestCase):
+    """ LISTEN/NOTIFY на фейковом сервере """
+
+    async def asyncSetUp(self):
+        self.server = FakePgServer()
+        await self.server.start()
+        self.addAsyncCleanup(self.server.close)
+
+    async def test_notification_callback(self):
+        connection = PgCoreConnect(**self.server.connect_params)
+        await connection.connect()
+        self.addAsyncCleanup(connection.close)
+        received = asyncio.Queue()
+
+        await connection.add_listener('links', lambda *args: received.put_nowait(args))
+        self.assertEqual(1, await self.server.notify('links', 'ab12'))
+        self.assertEqual(0, await self.server.notify('other', 'cd34'))
+
+        conn, pid, channel, payload = await asyncio.wait_for(received.get(), WAIT_TIMEOUT)
+        self.assertIs(connection, conn)
+        self.assertEqual(('links', 'ab12'), (channel, payload))
+        self.assertTrue(received.empty())
+
+    async def test_connection_lost(self):
+        connection = PgCoreConnect(**self.server.connect_params)
+        await connection.connect()
+        self.addAsyncCleanup(connection.close)
+        lost = asyncio.Queue()
+
+        await connection.add_listener('links', lambda *args: None,
+                                      on_lost=lambda *args: lost.put_nowait(args))
+        self.server.drop_connections()
+
+        conn, error = await asyncio.wait_for(lost.get(), WAIT_TIMEOUT)
+        self.assertIs(connection, conn)
+        self.assertIsInstance(error, CustomDbError)
+        self.assertTrue(connection.closed)
+
+    @patch('db.pg_source.LISTEN_RECONNECT_DELAYS', (0.0, 0.05))
+    async def test_source_relisten(self):
+        source = PgDbSource(DbConfig(host='127.0.0.1', port=self.server.port,
+                                     db=self.server.db_name, schema='links',
+                                     user=self.server.user, password=self.server.password,
+                                     min_size=0))
+        self.addAsyncCleanup(source.close)
+        received = asyncio.Queue()
+        # состояние подписки в момент вызова on_lost
+        lost = []
+
+        await source.add_listener('links', lambda *args: received.put_nowait(args[2:]),
+                                  on_lost=lambda *args: lost.append(source.is_listening('links')))
+        self.assertTrue(source.is_listening('links'))
+
+        self.server.drop_connections()
+        await wait_for_condition(lambda: lost)
+        self.assertEqual([False], lost)
+
+        # подписка повторяется на новом соединении
+        await wait_for_condition(lambda: source.is_listening('links'))
+        self.assertEqual(1, self.server.listening('links'))
+        await self.server.notify('links', 'ab12')
+        self.assertEqual(('links', 'ab12'), await asyncio.wait_for(received.get(), WAIT_TIMEOUT))
+        self.assertEqual([False], lost)
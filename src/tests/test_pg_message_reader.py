@@ -0,0 +1,66 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+from db.pg_errors import CustomDbError
+from db.pg_message_reader import PgMessageReader
+from tests.pg_fake_server import encode_message
+
+CHUNK_SIZE = 16
+
+
+class TestPgMessageReader(IsolatedAsyncioTestCase):
+    """ Нарезка сообщений протокола из кусков, прочитанных из сокета """
+
+    def setUp(self):
+        self.stream = asyncio.StreamReader()
+        self.reader = PgMessageReader(self.stream, chunk_size=CHUNK_SIZE)
+
+    async def _read(self) -> tuple[bytes, bytes]:
+        code, data = await asyncio.wait_for(self.reader.read_message(), 1.0)
+        return code, bytes(data)
+
+    async def test_many_messages_per_read(self):
+        self.stream.feed_data(encode_message(b'D', b'ab') + encode_message(b'C', b'cd'))
+
+        self.assertEqual((b'D', b'ab'), await self._read())
+        # второе сообщение уже в буфере - без обращения к сокету
+        self.assertEqual(b'C', self.reader.next_message()[0])
+        self.assertIsNone(self.reader.next_message())
+        self.assertEqual(14, self.reader.bytes_consumed)
+
+    async def test_message_split_across_reads(self):
+        first, second = encode_message(b'D', b'0123456'), encode_message(b'Z', b'I')
+        data = first + second
+        # разрез внутри заголовка, затем внутри тела следующего сообщения
+        for cut in (3, len(first) + 6):
+            with self.subTest(cut=cut):
+                self.setUp()
+                self.stream.feed_data(data[:cut])
+                task = asyncio.create_task(self._read())
+                await asyncio.sleep(0)
+                self.assertFalse(task.done())
+
+                self.stream.feed_data(data[cut:])
+                self.assertEqual((b'D', b'0123456'), await task)
+                self.assertEqual((b'Z', b'I'), await self._read())
+                self.assertEqual(len(data), self.reader.bytes_consumed)
+
+    async def test_oversized_message(self):
+        message = encode_message(b'D', bytes(range(256)) * 4)
+
+        with patch.object(self.stream, 'readexactly', wraps=self.stream.readexactly) as spy:
+            self.stream.feed_data(message[:CHUNK_SIZE])
+            task = asyncio.create_task(self._read())
+            await asyncio.sleep(0.01)
+            self.stream.feed_data(message[CHUNK_SIZE:])
+            self.assertEqual((b'D', message[5:]), await task)
+        # остаток сообщения больше chunk_size - дочитан одним readexactly
+        spy.assert_called_once_with(len(message) - CHUNK_SIZE)
+
+    async def test_connection_closed(self):
+        self.stream.feed_data(encode_message(b'D', b'ab')[:4])
+        self.stream.feed_eof()
+
+        with self.assertRaises(CustomDbError):
+            await self._read()
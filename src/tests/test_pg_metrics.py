@@ -0,0 +1,194 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+import db.pg_types as pt
+from db.pg_core_connect import PgCoreConnect
+from db.pg_errors import CustomDbError
+from db.pg_metrics import (Histogram, QueryEvent, QueryHook, QueryMetrics, current_query_event,
+                           normalize_sql)
+from tests.pg_fake_server import FakePgServer, FakeResult
+
+
+class RecordingHook(QueryHook):
+
+    def __init__(self) -> None:
+        self.started: list[str] = []
+        self.events: list[QueryEvent] = []
+
+    def before_query(self, connection, stmt):
+        self.started.append(stmt)
+
+    def after_query(self, connection, event):
+        self.events.append(event)
+
+
+class BrokenHook(QueryHook):
+
+    def after_query(self, connection, event):
+        raise ValueError('hook error')
+
+
+class TestQueryMetrics(TestCase):
+
+    def test_normalize_sql(self):
+        self.assertEqual(
+            "select * from t1 where id = $1 and name = ? limit ?",
+            normalize_sql("select *\n  from t1 where id = $1 and name = 'it''s'   limit 10"))
+
+    def test_histogram(self):
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value)
+        self.assertEqual([('0.1', 2), ('1.0', 3), ('+Inf', 4)], list(histogram.cumulative()))
+        self.assertEqual(4, histogram.count)
+
+    def test_render(self):
+        metrics = QueryMetrics()
+        for stmt in ('select 1', 'select 2'):
+            event = QueryEvent(stmt)
+            event.duration = 0.002
+            event.rows = 1
+            metrics.after_query(None, event)
+
+        self.assertEqual(2, metrics['select 3'].latency.count)
+        text = metrics.render()
+        self.assertIn('pg_client_rows_total{query="select ?"} 2', text)
+        self.assertIn('pg_client_query_duration_seconds_bucket{query="select ?",le="+Inf"} 2',
+                      text)
+        self.assertIn('# TYPE pg_client_query_duration_seconds histogram', text)
+
+
+class TestConnectionHooks(IsolatedAsyncioTestCase):
+
+    async def test_hooks(self):
+        hook = RecordingHook()
+        connection = PgCoreConnect('localhost', 5432, 'db', 'user', 'password',
+                                   query_hooks=[BrokenHook(), hook])
+
+        async def query():
+            # запись и чтение запроса копятся в событии текущего контекста
+            current_query_event.get().bytes_sent += 20
+            return 'result'
+
+        self.assertEqual('result', await connection._run_with_hooks('select 1', query()))
+        self.assertEqual(['select 1'], hook.started)
+        event = hook.events[0]
+        self.assertEqual(20, event.bytes_sent)
+        self.assertIsNone(event.error)
+        self.assertIsNone(current_query_event.get())
+
+    async def test_hook_gets_error(self):
+        hook = RecordingHook()
+        connection = PgCoreConnect('localhost', 5432, 'db', 'user', 'password')
+        connection.add_query_hook(hook)
+
+        async def query():
+            raise CustomDbError('error')
+
+        with self.assertRaises(CustomDbError):
+            await connection._run_with_hooks('select 1', query())
+        self.assertIsInstance(hook.events[0].error, CustomDbError)
+        connection.remove_query_hook(hook)
+        self.assertEqual([], connection._query_hooks)
+
+
+class TestConcurrentQueryEvents(IsolatedAsyncioTestCase):
+    """ Счетчики запроса не включают одновременные запросы других задач на том же соединении """
+
+    async def asyncSetUp(self):
+        self.server = FakePgServer(resolver=self._resolve)
+        await self.server.start()
+        self.hook = RecordingHook()
+        self.connection = PgCoreConnect(**self.server.connect_params, query_hooks=[self.hook])
+        await self.connection.connect()
+
+    async def asyncTearDown(self):
+        await self.connection.close()
+        await self.server.close()
+
+    @staticmethod
+    def _resolve(stmt: str) -> FakeResult:
+        # select <n> - n строк
+        return FakeResult.generate(int(stmt.split()[-1]), (('id', pt.INTEGER), ))
+
+    async def test_concurrent_queries(self):
+        stmts = ('select 1', 'select 100', 'select 1000')
+        for stmt in stmts:
+            await self.connection.run_query(stmt)
+        sequential = {event.stmt: event for event in self.hook.events}
+        self.hook.events.clear()
+
+        await asyncio.gather(*(self.connection.run_query(stmt) for stmt in stmts))
+
+        for event in self.hook.events:
+            expected = sequential[event.stmt]
+            self.assertEqual(int(event.stmt.split()[-1]), event.rows)
+            self.assertEqual(1, event.round_trips)
+            self.assertEqual((expected.bytes_sent, expected.bytes_received),
+                             (event.bytes_sent, event.bytes_received))
+            self.assertGreater(event.bytes_received, event.rows * 9)
+
+
+class TestInstrumentedPaths(IsolatedAsyncioTestCase):
+    """ Какие способы выполнения запроса видны QueryHook """
+
+    async def asyncSetUp(self):
+        self.server = FakePgServer(resolver=self._resolve)
+        await self.server.start()
+        self.hook = RecordingHook()
+        self.connection = PgCoreConnect(**self.server.connect_params, query_hooks=[self.hook])
+        await self.connection.connect()
+
+    async def asyncTearDown(self):
+        await self.connection.close()
+        await self.server.close()
+
+    @staticmethod
+    def _resolve(stmt: str) -> FakeResult:
+        if 'pg_attribute' in stmt:
+            return FakeResult([('attname', pt.TEXT), ('atttypid', pt.BIGINT)],
+                              [('id', pt.INTEGER)])
+        return FakeResult.generate(rows=5, columns=(('id', pt.INTEGER), ))
+
+    def _single_event(self, stmt: str, round_trips: int = 1) -> QueryEvent:
+        self.assertEqual([stmt], self.hook.started)
+        self.assertEqual(1, len(self.hook.events))
+        event = self.hook.events[0]
+        self.assertEqual(stmt, event.stmt)
+        self.assertIsNone(event.error)
+        self.assertGreater(event.bytes_sent, 0)
+        self.assertGreater(event.bytes_received, 0)
+        self.assertEqual(round_trips, event.round_trips)
+        return event
+
+    async def test_run_query_with_params(self):
+        await self.connection.run_query_with_params('select * from t where id=$1', (1, ))
+
+        self.assertEqual(5, self._single_event('select * from t where id=$1').rows)
+
+    async def test_copy_records_to_table(self):
+        for format_ in ('text', 'binary'):
+            with self.subTest(format_=format_):
+                self.hook.started.clear()
+                self.hook.events.clear()
+                await self.connection.copy_records_to_table('t', [(1, ), (2, )],
+                                                            format_=format_)
+                # служебный запрос колонок таблицы для binary - часть того же события
+                self._single_event(f'COPY "t" FROM STDIN (FORMAT {format_})',
+                                   round_trips=2 if format_ == 'binary' else 1)
+
+    async def test_copy_out(self):
+        await self.connection.copy_out('select id from t', bytearray().extend)
+
+        self._single_event('COPY (select id from t) TO STDOUT (FORMAT text)')
+
+    async def test_not_instrumented(self):
+        async with self.connection.pipeline() as pipeline_:
+            pipeline_.run('select * from t where id=$1', 1)
+        async with self.connection.cursor('select * from t') as cursor_:
+            [row async for row in cursor_]
+        async with self.connection.copy_out_iter('select id from t') as copy_:
+            [chunk async for chunk in copy_]
+
+        self.assertEqual([], self.hook.started)
+        self.assertEqual([], self.hook.events)
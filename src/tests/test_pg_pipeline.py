@@ -0,0 +1,47 @@
+from unittest import IsolatedAsyncioTestCase
+
+import db.pg_types as pt
+from db.pg_core_connect import PgCoreConnect
+from db.pg_errors import PgServerError
+from tests.pg_fake_server import FakePgServer, FakeResult
+
+
+class TestPgPipeline(IsolatedAsyncioTestCase):
+    """ Пакет запросов на фейковом сервере: у каждого запроса свой Sync """
+
+    async def asyncSetUp(self):
+        self.server = FakePgServer(resolver=self._resolve)
+        await self.server.start()
+        self.connection = PgCoreConnect(**self.server.connect_params)
+        await self.connection.connect()
+
+    async def asyncTearDown(self):
+        await self.connection.close()
+        await self.server.close()
+
+    @staticmethod
+    def _resolve(stmt: str) -> FakeResult:
+        if '1/0' in stmt:
+            return FakeResult([('value', pt.INTEGER)], [], error=('22012', 'division by zero'))
+        # select <n> ... - n строк
+        return FakeResult.generate(int(stmt.split()[1]), (('id', pt.INTEGER), ))
+
+    async def test_error_isolated(self):
+        queries = (('simple', ()), ('extended', (1, )))
+        for name, params in queries:
+            with self.subTest(name):
+                async with self.connection.pipeline() as pipeline_:
+                    first = pipeline_.run('select 2 from t', *params)
+                    failed = pipeline_.run('select 1/0 from t', *params)
+                    third = pipeline_.run('select 3 from t', *params)
+
+                self.assertEqual([(0, ), (1, )], [tuple(row) for row in first.result().rows])
+                with self.assertRaises(PgServerError) as raised:
+                    failed.result()
+                self.assertEqual('22012', raised.exception.sqlstate)
+                self.assertEqual([(0, ), (1, ), (2, )],
+                                 [tuple(row) for row in third.result().rows])
+                self.assertTrue(self.connection.idle)
+
+        result = await self.connection.run_query('select 1 from t')
+        self.assertEqual([(0, )], [tuple(row) for row in result.rows])
@@ -0,0 +1,194 @@
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+
+from db.pg_core_connect import CustomDbError
+from db.pg_errors import PgServerError, QueryTimeoutError
+from db.pg_pool import PgPool, PoolTimeoutError
+
+
+class FakeConnect:
+
+    def __init__(self) -> None:
+        self.is_closed = True
+        self.queries = 0
+        self.healthy = True
+        # исключение, которым завершится проверка соединения (run_simple_query)
+        self.check_error = None
+        self.in_transaction = False
+
+    @property
+    def closed(self) -> bool:
+        return self.is_closed
+
+    @property
+    def idle(self) -> bool:
+        return not self.is_closed and not self.in_transaction
+
+    async def connect(self):
+        self.is_closed = False
+
+    async def run_simple_query(self, stmt: str):
+        if not self.healthy:
+            raise CustomDbError('connection is closed')
+        if self.check_error is not None:
+            raise self.check_error
+        self.queries += 1
+
+    async def close(self):
+        self.is_closed = True
+
+
+class TestPgPool(IsolatedAsyncioTestCase):
+
+    async def test_open_min_size(self):
+        pool = PgPool(FakeConnect, min_size=2, max_size=4)
+        await pool.open()
+
+        self.assertEqual(2, pool.size)
+        self.assertEqual(2, pool.idle_count)
+
+    async def test_reuse_connection(self):
+        pool = PgPool(FakeConnect, min_size=0, max_size=4)
+
+        async with pool.acquire() as first:
+            pass
+        async with pool.acquire() as second:
+            pass
+
+        self.assertIs(first, second)
+        self.assertEqual(1, pool.size)
+
+    async def test_concurrent_acquire_uses_different_connections(self):
+        pool = PgPool(FakeConnect, min_size=0, max_size=4)
+        seen = []
+
+        async def worker():
+            async with pool.acquire() as conn:
+                seen.append(conn)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(worker() for _ in range(4)))
+
+        self.assertEqual(4, len(set(map(id, seen))))
+        self.assertEqual(4, pool.size)
+
+    async def test_acquire_timeout(self):
+        pool = PgPool(FakeConnect, min_size=0, max_size=1, acquire_timeout=0.01)
+
+        async with pool.acquire():
+            with self.assertRaises(PoolTimeoutError):
+                async with pool.acquire():
+                    pass
+
+    async def test_acquire_without_waiting(self):
+        pool = PgPool(FakeConnect, min_size=0, max_size=1, acquire_timeout=10)
+
+        async with pool.acquire(timeout=0) as first:
+            with self.assertRaises(PoolTimeoutError):
+                async with pool.acquire(timeout=0):
+                    pass
+        async with pool.acquire(timeout=0) as second:
+            self.assertIs(first, second)
+
+    async def test_waiter_gets_released_connection(self):
+        pool = PgPool(FakeConnect, min_size=0, max_size=1, acquire_timeout=1)
+
+        async def hold():
+            async with pool.acquire() as conn:
+                await asyncio.sleep(0.01)
+                return conn
+
+        async def wait():
+            await asyncio.sleep(0)
+            async with pool.acquire() as conn:
+                return conn
+
+        first, second = await asyncio.gather(hold(), wait())
+
+        self.assertIs(first, second)
+
+    async def test_discard_on_error(self):
+        pool = PgPool(FakeConnect, min_size=0, max_size=1)
+
+        with self.assertRaises(CustomDbError):
+            async with pool.acquire() as conn:
+                raise CustomDbError('hoho')
+
+        self.assertTrue(conn.closed)
+        self.assertEqual(0, pool.size)
+
+    async def test_keep_connection_after_query_error(self):
+        pool = PgPool(FakeConnect, min_size=0, max_size=1)
+
+        with self.assertRaises(QueryTimeoutError):
+            async with pool.acquire() as conn:
+                raise QueryTimeoutError('timeout')
+        with self.assertRaises(PgServerError):
+            async with pool.acquire() as same_conn:
+                raise PgServerError({'C': '23505', 'M': 'duplicate key'})
+
+        self.assertIs(conn, same_conn)
+        self.assertFalse(conn.closed)
+        self.assertEqual(1, pool.idle_count)
+
+    async def test_discard_on_query_error_in_transaction(self):
+        pool = PgPool(FakeConnect, min_size=0, max_size=1)
+
+        with self.assertRaises(PgServerError):
+            async with pool.acquire() as conn:
+                conn.in_transaction = True
+                raise PgServerError({'C': '23505', 'M': 'duplicate key'})
+
+        self.assertTrue(conn.closed)
+        self.assertEqual(0, pool.size)
+
+    async def test_idle_recycling(self):
+        pool = PgPool(FakeConnect, min_size=0, max_size=2, max_idle_time=0)
+
+        async with pool.acquire() as first:
+            pass
+        await asyncio.sleep(0.01)
+        async with pool.acquire() as second:
+            pass
+
+        self.assertIsNot(first, second)
+        self.assertTrue(first.closed)
+
+    async def test_health_check(self):
+        pool = PgPool(FakeConnect, min_size=0, max_size=2, health_check_interval=0)
+
+        async with pool.acquire() as first:
+            first.healthy = False
+        await asyncio.sleep(0.01)
+        async with pool.acquire() as second:
+            pass
+
+        self.assertIsNot(first, second)
+        self.assertEqual(1, pool.size)
+
+    async def test_health_check_peer_closed(self):
+        pool = PgPool(FakeConnect, min_size=0, max_size=1, health_check_interval=0)
+
+        async with pool.acquire() as first:
+            first.check_error = asyncio.IncompleteReadError(b'', 5)
+        async with pool.acquire() as second:
+            pass
+
+        self.assertIsNot(first, second)
+        self.assertTrue(first.closed)
+        self.assertEqual(1, pool.size)
+
+    async def test_health_check_cancelled(self):
+        pool = PgPool(FakeConnect, min_size=0, max_size=1, health_check_interval=0)
+
+        async with pool.acquire() as first:
+            first.check_error = asyncio.CancelledError()
+        with self.assertRaises(asyncio.CancelledError):
+            async with pool.acquire():
+                pass
+
+        self.assertTrue(first.closed)
+        self.assertEqual(0, pool.size)
+        async with pool.acquire() as second:
+            self.assertIsNot(first, second)
+        self.assertEqual(1, pool.size)
@@ -0,0 +1,40 @@
+from unittest import TestCase
+
+from db.pg_record import PgColumn, Record, make_record_index
+
+
+def make_columns(*names):
+    return [PgColumn(name, 0, 0, 25, -1, -1, 0) for name in names]
+
+
+class TestRecord(TestCase):
+
+    def setUp(self) -> None:
+        self.index = make_record_index(make_columns('url_id', 'original_url', 'active'))
+        self.record = Record(('abc', 'https://yandex.ru', True), self.index)
+
+    def test_access_by_name_and_position(self):
+        self.assertEqual('abc', self.record['url_id'])
+        self.assertEqual('https://yandex.ru', self.record[1])
+        self.assertEqual(('abc', 'https://yandex.ru'), self.record[:2])
+        self.assertIsNone(self.record.get('nope'))
+        with self.assertRaises(KeyError):
+            self.record['nope']
+
+    def test_iteration_and_dict(self):
+        self.assertEqual(['abc', 'https://yandex.ru', True], list(self.record))
+        self.assertEqual({'url_id': 'abc', 'original_url': 'https://yandex.ru', 'active': True},
+                         dict(self.record))
+
+    def test_shared_index(self):
+        other = Record(('def', 'https://ya.ru', False), self.index)
+
+        self.assertIs(self.record._index, other._index)
+        self.assertFalse(hasattr(self.record, '__dict__'))
+        with self.assertRaises(TypeError):
+            self.index['url_id'] = 1    # type: ignore
+
+    def test_duplicate_column_names(self):
+        index = make_record_index(make_columns('count', 'count'))
+
+        self.assertEqual(1, Record((1, 2), index)['count'])
@@ -0,0 +1,139 @@
+import asyncio
+from contextlib import asynccontextmanager
+from decimal import Decimal
+from typing import Optional
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+from db.pg_errors import CustomDbError
+from db.pg_pool import PoolTimeoutError
+from db.pg_replicas import PgReplica, PgReplicaRouter, parse_host
+from db.pg_source import PgDbSource
+from db.query_context import QueryContext
+from models.config_models import DbConfig
+
+
+class FakeConnect:
+
+    def __init__(self, lag=0) -> None:
+        self.lag = lag
+
+    async def run_query(self, stmt: str, *args, **kwargs):
+        if isinstance(self.lag, Exception):
+            raise self.lag
+        query_context = QueryContext(stmt)
+        query_context.rows = [{'lag': Decimal(self.lag)}]
+        return query_context
+
+
+class FakePool:
+
+    def __init__(self, lag=0) -> None:
+        self.connection = FakeConnect(lag)
+        self.acquired = 0
+        self.acquire_error: Optional[Exception] = None
+        self.timeouts: list[Optional[float]] = []
+
+    @asynccontextmanager
+    async def acquire(self, timeout: Optional[float] = None):
+        self.timeouts.append(timeout)
+        if isinstance(self.connection.lag, OSError):
+            raise self.connection.lag
+        if self.acquire_error is not None:
+            raise self.acquire_error
+        self.acquired += 1
+        yield self.connection
+
+    async def close(self):
+        pass
+
+
+class TestParseHost(TestCase):
+
+    def test_parse_host(self):
+        self.assertEqual(('replica', 5432), parse_host('replica', 5432))
+        self.assertEqual(('replica', 6432), parse_host('replica:6432', 5432))
+
+
+class TestPgReplicaRouter(IsolatedAsyncioTestCase):
+
+    async def _router(self, *lags, max_lag=10.0) -> PgReplicaRouter:
+        router = PgReplicaRouter([PgReplica(f'r{idx}', FakePool(lag))    # type: ignore
+                                  for idx, lag in enumerate(lags)], max_lag=max_lag)
+        # до первой проверки отставания реплики не используются
+        self.assertIsNone(router.choose())
+        await asyncio.sleep(0)
+        return router
+
+    async def test_least_outstanding_requests(self):
+        router = await self._router(0, 0)
+        first = router.choose()
+        first.in_flight += 1
+        second = router.choose()
+
+        self.assertIsNot(first, second)
+        second.in_flight += 2
+        self.assertIs(first, router.choose())
+
+    async def test_round_robin_on_tie(self):
+        router = await self._router(0, 0, 0)
+        names = [router.choose().name for _ in range(6)]
+        self.assertEqual(['r0', 'r1', 'r2'], sorted(names[:3]))
+        self.assertEqual(names[:3], names[3:])
+
+    async def test_lag_and_failures_excluded(self):
+        router = await self._router(30, CustomDbError('down'), 1)
+        self.assertEqual({'r2'}, {router.choose().name for _ in range(3)})
+
+        router.replicas[2].pool.connection.lag = 20
+        await router.check(router.replicas[2])
+        self.assertIsNone(router.choose())
+
+
+class TestPgDbSourceRouting(IsolatedAsyncioTestCase):
+
+    async def test_fallback_to_primary(self):
+        source = PgDbSource(DbConfig(host='primary', port=5432, db='db', schema='s', user='u',
+                                     password='p', replicas=['replica:6432']))
+        primary, replica = FakePool(), source._router.replicas[0]
+        source._pool = primary
+        replica.pool = FakePool()
+        await source._router.check(replica)
+
+        async with source.acquire(readonly=True) as conn:
+            self.assertIs(replica.pool.connection, conn)
+            self.assertEqual(1, replica.in_flight)
+        self.assertEqual(0, replica.in_flight)
+
+        replica.pool.connection.lag = OSError('connection refused')
+        async with source.acquire(readonly=True) as conn:
+            self.assertIs(primary.connection, conn)
+        self.assertFalse(replica.available)
+
+        async with source.acquire() as conn:
+            self.assertIs(primary.connection, conn)
+        self.assertEqual(2, primary.acquired)
+
+    async def test_busy_replica_not_excluded(self):
+        source = PgDbSource(DbConfig(host='primary', port=5432, db='db', schema='s', user='u',
+                                     password='p', replicas=['replica:6432']))
+        primary, replica = FakePool(), source._router.replicas[0]
+        source._pool = primary
+        replica.pool = FakePool()
+        await source._router.check(replica)
+
+        # пул реплики занят: запрос на primary без ожидания, реплика остается в работе
+        replica.pool.acquire_error = PoolTimeoutError('busy')
+        async with source.acquire(readonly=True) as conn:
+            self.assertIs(primary.connection, conn)
+        self.assertEqual(0, replica.pool.timeouts[-1])
+        self.assertTrue(replica.available)
+        self.assertEqual(0, replica.in_flight)
+
+        # любая другая ошибка подключения исключает реплику
+        for error in (CustomDbError('password authentication failed'), EOFError()):
+            with self.subTest(error=repr(error)):
+                replica.available = True
+                replica.pool.acquire_error = error
+                async with source.acquire(readonly=True) as conn:
+                    self.assertIs(primary.connection, conn)
+                self.assertFalse(replica.available)
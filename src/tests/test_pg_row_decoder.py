@@ -0,0 +1,58 @@
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from struct import pack
+from unittest import TestCase
+from uuid import UUID
+
+from db.pg_converters import (bool_recv, date_recv, float8_recv, int4_recv, int8_recv,
+                              numeric_in, string_in, timestamptz_recv, uuid_recv)
+from db.pg_row_decoder import make_row_decoder
+
+
+def data_row(*values) -> memoryview:
+    row = pack('!h', len(values))
+    for value in values:
+        row += pack('!i', -1) if value is None else pack('!i', len(value)) + value
+    return memoryview(row)
+
+
+class TestRowDecoder(TestCase):
+
+    def test_fixed_width_row(self):
+        decode = make_row_decoder([int4_recv, int8_recv, timestamptz_recv, date_recv],
+                                  (1, 1, 1, 1))
+
+        self.assertEqual(
+            (7, -1, datetime(2000, 1, 1, 0, 0, 1, tzinfo=timezone.utc), date(2000, 1, 3)),
+            decode(data_row(pack('!i', 7), pack('!q', -1), pack('!q', 1000000), pack('!i', 2))))
+        self.assertEqual((None, 5, None, 'infinity'),
+                         decode(data_row(None, pack('!q', 5), None, pack('!i', 2 ** 31 - 1))))
+
+    def test_fixed_width_row_without_conversion(self):
+        decode = make_row_decoder([int4_recv, float8_recv, bool_recv], (1, 1, 1))
+
+        self.assertEqual((7, 1.5, True),
+                         decode(data_row(pack('!i', 7), pack('!d', 1.5), b'\x01')))
+        self.assertEqual((7, None, False), decode(data_row(pack('!i', 7), None, b'\x00')))
+
+    def test_mixed_row(self):
+        decode = make_row_decoder([string_in, int4_recv, numeric_in], (0, 1, 0))
+
+        self.assertEqual(('ссылка', 3, Decimal('1.50')),
+                         decode(data_row('ссылка'.encode(), pack('!i', 3), b'1.50')))
+        self.assertEqual((None, None, None), decode(data_row(None, None, None)))
+
+    def test_binary_variable_width(self):
+        uuid = UUID('a0eebc99-9c0b-4ef8-bb6d-6bb9bd380a11')
+        decode = make_row_decoder([uuid_recv, string_in], (1, 0))
+
+        self.assertEqual((uuid, 'x'), decode(data_row(uuid.bytes, b'x')))
+
+    def test_decoder_is_shared(self):
+        first = make_row_decoder([string_in, int4_recv], (0, 1))
+        second = make_row_decoder((string_in, int4_recv), [0, 1])
+
+        self.assertIs(first, second)
+
+    def test_empty_row(self):
+        self.assertEqual((), make_row_decoder([], ())(data_row()))
@@ -0,0 +1,51 @@
+from unittest import TestCase
+
+from db.pg_errors import CustomDbError
+from db.pg_scram import ScramClient, derive_keys, saslprep
+
+# пример обмена из RFC 7677
+CLIENT_NONCE = b'rOprNGfwEbeRWgbNEkqO'
+SERVER_FIRST = b'r=rOprNGfwEbeRWgbNEkqO%hvYDpWUa2RaTCAfuxFIlj)hNlF$k0,' \
+    b's=W22ZaJ0SNY7soEsUEjb6gQ==,i=4096'
+CLIENT_FINAL = b'c=biws,r=rOprNGfwEbeRWgbNEkqO%hvYDpWUa2RaTCAfuxFIlj)hNlF$k0,' \
+    b'p=dHzbZapWIk4jUhN+Ute9ytag9zjfMHgsqmmiz7AndVQ='
+SERVER_FINAL = b'v=6rriTRBi23WpRR/wtup+mMhUZUn/dB5nLTJRsjl95G4='
+
+
+class TestScram(TestCase):
+
+    def _client(self) -> ScramClient:
+        return ScramClient(b'pencil', user=b'user', nonce=CLIENT_NONCE)
+
+    def test_rfc7677_exchange(self):
+        client = self._client()
+        self.assertEqual(b'n,,n=user,r=rOprNGfwEbeRWgbNEkqO', client.client_first())
+        self.assertEqual(CLIENT_FINAL, client.client_final(SERVER_FIRST))
+        client.verify_server_final(SERVER_FINAL)
+
+    def test_wrong_server_signature(self):
+        client = self._client()
+        client.client_final(SERVER_FIRST)
+        with self.assertRaises(CustomDbError):
+            client.verify_server_final(b'v=' + b'A' * 44)
+        with self.assertRaises(CustomDbError):
+            client.verify_server_final(b'e=invalid-proof')
+
+    def test_foreign_nonce(self):
+        with self.assertRaises(CustomDbError):
+            self._client().client_final(b'r=other,s=W22ZaJ0SNY7soEsUEjb6gQ==,i=4096')
+
+    def test_derived_keys_cached(self):
+        derive_keys.cache_clear()
+        for _ in range(3):
+            self._client().client_final(SERVER_FIRST)
+        self.assertEqual(1, derive_keys.cache_info().misses)
+        self.assertEqual(2, derive_keys.cache_info().hits)
+
+    def test_saslprep(self):
+        self.assertEqual(b'pencil', saslprep('pencil'))
+        # неразрывный пробел -> пробел, мягкий перенос удаляется, NFKC
+        self.assertEqual(b'I X', saslprep('I\u00a0\u00adX'))
+        self.assertEqual(b'IV', saslprep('\u2163'))
+        # запрещенные символы - пароль используется как есть
+        self.assertEqual(b'a\x07', saslprep('a\u0007'))
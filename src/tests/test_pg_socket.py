@@ -0,0 +1,73 @@
+import asyncio
+import os
+import socket
+import tempfile
+import time
+from unittest import IsolatedAsyncioTestCase, TestCase, skipUnless
+
+from db.pg_core_connect import PgCoreConnect
+from db.pg_socket import SocketOptions, unix_socket_path
+
+
+# бенчмарк транспорта запускается только на настоящем сервере:
+# PG_BENCHMARK_DB=cutter_db PG_BENCHMARK_USER=app PG_BENCHMARK_PASSWORD=123qwe \
+# PG_BENCHMARK_SOCKET_DIR=/var/run/postgresql python -m pytest -s tests/test_pg_socket.py
+BENCHMARK_ENV = {
+    'host': os.environ.get('PG_BENCHMARK_HOST', '127.0.0.1'),
+    'port': int(os.environ.get('PG_BENCHMARK_PORT', '5432')),
+    'db_name': os.environ.get('PG_BENCHMARK_DB'),
+    'user': os.environ.get('PG_BENCHMARK_USER'),
+    'password': os.environ.get('PG_BENCHMARK_PASSWORD'),
+}
+BENCHMARK_SOCKET_DIR = os.environ.get('PG_BENCHMARK_SOCKET_DIR')
+
+
+async def query_latency(connection: PgCoreConnect, number: int = 2000) -> float:
+    """ Лучшее из 3 повторов среднее время запроса с параметром (один round trip), сек. """
+    await connection.connect()
+    results = []
+    for _ in range(3):
+        started = time.perf_counter()
+        for _ in range(number):
+            await connection.run_query('select $1::int', 1)
+        results.append((time.perf_counter() - started) / number)
+    await connection.close()
+    return min(results)
+
+
+class TestSocketOptions(TestCase):
+
+    def test_apply(self):
+        options = SocketOptions(nodelay=True, keepalive=True, keepalive_idle=30,
+                                receive_buffer_size=1 << 16)
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            options.apply(sock)
+            self.assertTrue(sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+            self.assertTrue(sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE))
+            if hasattr(socket, 'TCP_KEEPIDLE'):
+                self.assertEqual(30, sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE))
+            self.assertGreaterEqual(sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF), 1 << 16)
+
+    def test_unix_socket_path(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertEqual(os.path.join(directory, '.s.PGSQL.5433'),
+                             unix_socket_path(directory, 5433))
+            self.assertEqual('/run/pg.sock', unix_socket_path('/run/pg.sock', 5433))
+
+
+@skipUnless(BENCHMARK_ENV['db_name'] and BENCHMARK_SOCKET_DIR, 'нужен сервер PostgreSQL')
+class TestTransportBenchmark(IsolatedAsyncioTestCase):
+
+    async def test_query_latency(self):
+        # отладочный режим цикла событий, включенный IsolatedAsyncioTestCase, искажает замеры
+        asyncio.get_running_loop().set_debug(False)
+        nodelay = await query_latency(PgCoreConnect(**BENCHMARK_ENV))
+        # без TCP_NODELAY сообщения запроса ждут подтверждения (алгоритм Нейгла) - десятки мс
+        delayed = await query_latency(PgCoreConnect(
+            **BENCHMARK_ENV, socket_options=SocketOptions(nodelay=False)), number=20)
+        unix = await query_latency(PgCoreConnect(**BENCHMARK_ENV,
+                                                 unix_socket=BENCHMARK_SOCKET_DIR))
+
+        print(f'\nquery latency: tcp {nodelay * 1e6:.1f} us, '
+              f'tcp without TCP_NODELAY {delayed * 1e6:.1f} us, unix socket {unix * 1e6:.1f} us')
+        self.assertGreater(nodelay, 0)
@@ -0,0 +1,131 @@
+from unittest import IsolatedAsyncioTestCase
+
+import db.pg_types as pt
+from db.pg_core_connect import PgCoreConnect
+from db.pg_dispatcher import PgDispatcher
+from db.pg_errors import CustomDbError, PgServerError
+from db.pg_transaction import PgTransaction
+from tests.pg_fake_server import FakePgServer, FakeResult
+
+
+class FakeConnect:
+    """ Записывает пакеты, которые ушли бы на сервер, вместе с отложенными командами """
+
+    def __init__(self) -> None:
+        self.closed = False
+        self.sent: list[list[str]] = []
+        self._transaction = None
+        self._transaction_commands: list[str] = []
+        self._transaction_epilogue = None
+        self._round_trips = 0
+        self._dispatcher = PgDispatcher(self)    # type: ignore
+
+    def transaction(self, **kwargs) -> PgTransaction:
+        return PgTransaction(self, **kwargs)    # type: ignore
+
+    async def run_query(self, stmt: str, *params, timeout=None):
+        packet = self._transaction_commands + [stmt]
+        if self._transaction_epilogue is not None:
+            packet.append(self._transaction_epilogue)
+        self._transaction_commands, self._transaction_epilogue = [], None
+        self.sent.append(packet)
+        if stmt == 'fail':
+            raise PgServerError({'C': '22000', 'M': 'fail'})
+
+    async def run_simple_query(self, stmt: str):
+        return await self.run_query(stmt)
+
+
+class TestPgTransaction(IsolatedAsyncioTestCase):
+
+    async def test_begin_and_commit_with_statements(self):
+        conn = FakeConnect()
+        async with conn.transaction(isolation='serializable', readonly=True) as tr:
+            await conn.run_query('select 1')
+            await tr.run_query('select 2', commit=True)
+
+        self.assertEqual([['BEGIN ISOLATION LEVEL SERIALIZABLE READ ONLY', 'select 1'],
+                          ['select 2', 'COMMIT']], conn.sent)
+        self.assertIsNone(conn._transaction)
+
+    async def test_empty_transaction_is_not_sent(self):
+        conn = FakeConnect()
+        async with conn.transaction():
+            async with conn.transaction():
+                pass
+
+        self.assertEqual([], conn.sent)
+        self.assertEqual([], conn._transaction_commands)
+
+    async def test_savepoints(self):
+        conn = FakeConnect()
+        async with conn.transaction():
+            with self.assertRaises(PgServerError):
+                async with conn.transaction():
+                    await conn.run_query('fail')
+            async with conn.transaction():
+                await conn.run_query('select 1')
+            await conn.run_query('select 2')
+
+        self.assertEqual([
+            ['BEGIN', 'SAVEPOINT lc_savepoint_1', 'fail'],
+            ['ROLLBACK TO SAVEPOINT lc_savepoint_1'],
+            ['SAVEPOINT lc_savepoint_1', 'select 1'],
+            ['RELEASE SAVEPOINT lc_savepoint_1', 'select 2'],
+            ['COMMIT'],
+        ], conn.sent)
+
+    async def test_rollback_on_error(self):
+        conn = FakeConnect()
+        with self.assertRaises(PgServerError):
+            async with conn.transaction() as tr:
+                await tr.run_query('fail', commit=True)
+
+        self.assertEqual([['BEGIN', 'fail', 'COMMIT'], ['ROLLBACK']], conn.sent)
+        self.assertIsNone(conn._transaction)
+
+    async def test_invalid_options(self):
+        conn = FakeConnect()
+        with self.assertRaises(ValueError):
+            conn.transaction(isolation='dirty_read')
+
+        async with conn.transaction():
+            with self.assertRaises(CustomDbError):
+                async with conn.transaction(readonly=True):
+                    pass
+
+
+class TestTransactionCommands(IsolatedAsyncioTestCase):
+    """ Отложенные BEGIN / SAVEPOINT уходят на сервер ровно один раз """
+
+    async def asyncSetUp(self):
+        self.statements: list[str] = []
+        self.server = FakePgServer(resolver=self._resolve)
+        await self.server.start()
+        self.connection = PgCoreConnect(**self.server.connect_params)
+        await self.connection.connect()
+
+    async def asyncTearDown(self):
+        await self.connection.close()
+        await self.server.close()
+
+    def _resolve(self, stmt: str) -> FakeResult:
+        self.statements.extend(command_.strip() for command_ in stmt.split(';'))
+        return FakeResult([('value', pt.INTEGER)], [(1, ), (2, )])
+
+    def assert_sent_once(self, *commands: str):
+        for command_ in commands:
+            self.assertEqual(1, self.statements.count(command_), self.statements)
+
+    async def test_executemany(self):
+        async with self.connection.transaction():
+            async with self.connection.transaction():
+                await self.connection.executemany('select $1::int', [(1, ), (2, )])
+        self.assert_sent_once('BEGIN', 'SAVEPOINT lc_savepoint_1')
+
+    async def test_cursor(self):
+        async with self.connection.transaction():
+            async with self.connection.transaction():
+                async with self.connection.cursor('select 1') as cursor:
+                    self.assertEqual(2, len(await cursor.fetch()))
+        self.assert_sent_once('BEGIN', 'SAVEPOINT lc_savepoint_1')
@@ -0,0 +1,39 @@
+from unittest import TestCase
+
+from db.statement_cache import StatementCache
+
+
+class TestStatementCache(TestCase):
+
+    def test_get_returns_added_statement(self):
+        cache = StatementCache(2)
+        statement, evicted = cache.add('select $1', (23, ))
+
+        self.assertIs(statement, cache.get('select $1', (23, )))
+        self.assertIsNone(cache.get('select $1'))
+        self.assertEqual([], evicted)
+
+    def test_unique_names(self):
+        cache = StatementCache(2)
+        first, _ = cache.add('select 1')
+        second, _ = cache.add('select 2')
+
+        self.assertNotEqual(first.name, second.name)
+
+    def test_lru_eviction(self):
+        cache = StatementCache(2)
+        first, _ = cache.add('select 1')
+        cache.add('select 2')
+        cache.get('select 1')
+        _, evicted = cache.add('select 3')
+
+        self.assertEqual(['select 2'], [statement.stmt for statement in evicted])
+        self.assertIs(first, cache.get('select 1'))
+        self.assertEqual(2, len(cache))
+
+    def test_remove(self):
+        cache = StatementCache(2)
+        statement, _ = cache.add('select 1')
+        cache.remove(statement)
+
+        self.assertIsNone(cache.get('select 1'))